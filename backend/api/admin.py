@@ -21,3 +21,7 @@ admin.site.register(models.Notification)
 admin.site.register(models.Coupon)
 admin.site.register(models.Whishlist)
 admin.site.register(models.Country)
+admin.site.register(models.StripeEvent)
+admin.site.register(models.IdempotencyKey)
+admin.site.register(models.StudentStats)
+admin.site.register(models.ReferenceVersion)
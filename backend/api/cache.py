@@ -0,0 +1,77 @@
+"""
+Tag-versioned response caching on top of Django's cache framework.
+
+Each tag (e.g. "course:12") has a version token in the cache. A cached entry
+records the versions of its tags when it was built and is only served while
+all of them are still current, so invalidating a tag is a single delete and
+never has to find the entries that depend on it.
+"""
+import hashlib
+import uuid
+
+from django.core.cache import cache
+
+TAG_PREFIX = "tag:"
+CATEGORIES_TAG = "categories"
+COURSE_LIST_TAG = "course-list"
+
+
+def course_tag(course_id):
+    return f"course:{course_id}"
+
+
+def teacher_tag(teacher_id):
+    return f"teacher:{teacher_id}"
+
+
+def tag_versions(tags):
+    keys = [TAG_PREFIX + tag for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return {key[len(TAG_PREFIX):]: versions[key] for key in keys}
+
+
+def invalidate_tags(*tags):
+    cache.delete_many([TAG_PREFIX + tag for tag in tags if tag])
+
+
+def get_tagged(key):
+    entry = cache.get(key)
+    if entry is None:
+        return None
+
+    current = cache.get_many([TAG_PREFIX + tag for tag in entry["versions"]])
+    for tag, version in entry["versions"].items():
+        if current.get(TAG_PREFIX + tag) != version:
+            return None
+    return entry
+
+
+def set_tagged(key, data, versions, timeout):
+    # `versions` must be read before `data` was built, otherwise a write that
+    # lands in between would be cached as current.
+    entry = {"data": data, "versions": versions}
+    cache.set(key, entry, timeout)
+    return entry
+
+
+def etag_for(versions, *parts):
+    # Versions are random tokens, so a flushed cache never reissues an old ETag
+    digest = hashlib.sha1()
+    for tag, version in sorted(versions.items()):
+        digest.update(f"{tag}={version};".encode())
+    for part in parts:
+        digest.update(part.encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(request, etag):
+    header = request.META.get("HTTP_IF_NONE_MATCH")
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    return "*" in candidates or etag in [candidate.removeprefix("W/") for candidate in candidates]
@@ -0,0 +1,93 @@
+import json
+import secrets
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from django.core.management.base import BaseCommand
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Just enough of the PayPal and Stripe APIs for api.payments: PayPal OAuth
+    tokens and order lookups, Stripe checkout session create and retrieve.
+    Every order is COMPLETED and every session is paid.
+    """
+
+    # Keep-alive, so pooled clients reuse their connections like in production
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+    token_ttl = 32400
+    quiet = False
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode()
+        if self.path == "/v1/oauth2/token":
+            return self.reply({"access_token": secrets.token_hex(16), "token_type": "Bearer", "expires_in": self.token_ttl})
+        if self.path == "/v1/checkout/sessions":
+            params = parse_qs(body)
+            session_id = f"cs_test_{secrets.token_hex(12)}"
+            return self.reply(self.session(session_id, "unpaid", params.get("customer_email", [None])[0], params.get("client_reference_id", [None])[0]))
+        self.reply({"error": {"message": f"No stub for POST {self.path}"}}, status=404)
+
+    def do_GET(self):
+        if self.path.startswith("/v2/checkout/orders/"):
+            if not self.headers.get("Authorization", "").startswith("Bearer "):
+                return self.reply({"error": "invalid_token"}, status=401)
+            return self.reply({"id": self.path.rsplit("/", 1)[-1], "status": "COMPLETED"})
+        if self.path.startswith("/v1/checkout/sessions/"):
+            return self.reply(self.session(self.path.rsplit("/", 1)[-1], "paid"))
+        self.reply({"error": {"message": f"No stub for GET {self.path}"}}, status=404)
+
+    def session(self, session_id, payment_status, email=None, reference=None):
+        host = self.headers.get("Host", "localhost")
+        return {
+            "id": session_id,
+            "object": "checkout.session",
+            "payment_status": payment_status,
+            "customer_email": email,
+            "client_reference_id": reference,
+            "url": f"http://{host}/checkout/{session_id}",
+        }
+
+    def reply(self, data, status=200):
+        if self.latency:
+            time.sleep(self.latency)
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+class Command(BaseCommand):
+    help = "Serve a local stub of the PayPal and Stripe endpoints used at checkout, for offline benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--latency", type=float, default=0, help="Milliseconds added to every response")
+        parser.add_argument("--token-ttl", type=int, default=32400, help="expires_in of issued PayPal tokens")
+        parser.add_argument("--quiet", action="store_true", help="Don't log requests")
+
+    def handle(self, *args, **options):
+        handler = type("Handler", (StubHandler,), {
+            "latency": options["latency"] / 1000,
+            "token_ttl": options["token_ttl"],
+            "quiet": options["quiet"],
+        })
+        server = ThreadingHTTPServer((options["host"], options["port"]), handler)
+        base = f"http://{options['host']}:{options['port']}"
+        self.stdout.write(f"Payment stub on {base}; run the API with PAYPAL_API_BASE={base} STRIPE_API_BASE={base}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,77 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from api import media
+from api import models as api_models
+
+
+class Command(BaseCommand):
+    help = "Probe new or changed lecture videos for duration, poster frame and thumbnail strip"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None, help="Probe processes (default: CPU count)")
+        parser.add_argument("--batch", type=int, default=50, help="Lectures claimed per round")
+        parser.add_argument("--loop", action="store_true", help="Keep polling for pending lectures")
+        parser.add_argument("--interval", type=float, default=30, help="Seconds to sleep between polls with --loop")
+        parser.add_argument("--retry-failed", action="store_true", help="Queue lectures that failed before for another probe")
+
+    def handle(self, *args, **options):
+        if options["retry_failed"]:
+            api_models.VariantItem.objects.filter(probe_status="Failed").update(probe_status="Pending")
+
+        # Workers are forked; don't let them inherit an open DB connection
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            while True:
+                done, failed = self.run_batch(pool, options["batch"])
+                if done or failed:
+                    self.stdout.write(f"Probed {done} lectures, {failed} failed")
+                if not options["loop"]:
+                    break
+                if not (done or failed):
+                    time.sleep(options["interval"])
+
+    def run_batch(self, pool, size):
+        pending = list(
+            api_models.VariantItem.objects.filter(probe_status="Pending")
+            .exclude(url__isnull=True).exclude(url="")
+            .order_by("id").values_list("id", "url")[:size]
+        )
+        futures = {pool.submit(media.probe_lecture, url): (pk, url) for pk, url in pending}
+
+        done = failed = 0
+        for future in as_completed(futures):
+            pk, url = futures[future]
+            try:
+                result = future.result()
+            except Exception as error:
+                self.stderr.write(f"Lecture {pk}: {str(error).splitlines()[0] if str(error) else repr(error)}")
+                self.store(pk, url, None)
+                failed += 1
+            else:
+                self.store(pk, url, result)
+                done += 1
+        return done, failed
+
+    def store(self, pk, url, result):
+        item = api_models.VariantItem.objects.filter(pk=pk, url=url).first()
+        if item is None:
+            # Deleted or given a new URL while probing; the new URL is already pending
+            return
+
+        item.probed_at = timezone.now()
+        if result is None:
+            item.probe_status = "Failed"
+        else:
+            item.probe_status = "Done"
+            item.duration = item.content_duration = api_models.seconds_to_duration(result["duration"])
+            item.poster.save(f"{item.variant_item_id}.jpg", ContentFile(result["poster"]), save=False)
+            item.thumbnails.save(f"{item.variant_item_id}.jpg", ContentFile(result["thumbnails"]), save=False)
+
+        # A regular save, so the stats and cache signals pick up the new duration
+        item.save()
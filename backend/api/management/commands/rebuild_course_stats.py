@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api import cache as api_cache
+from api import models as api_models
+from api import reference
+from api import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized rating, enrollment, lecture and duration counters on courses and categories, and Q&A reply counts"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            stats.rebuild_course_stats()
+        # Detail payloads carry the rebuilt counters too
+        course_tags = [api_cache.course_tag(pk) for pk in api_models.Course.objects.values_list("pk", flat=True)]
+        api_cache.invalidate_tags(api_cache.COURSE_LIST_TAG, api_cache.CATEGORIES_TAG, *course_tags)
+        reference.categories.invalidate()
+        self.stdout.write(self.style.SUCCESS("Course stats rebuilt"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute enrollment progress and the per-student dashboard counters (courses, completed courses, lessons, certificates)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("user_ids", nargs="*", type=int, help="Only these users (default: everyone)")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            stats.rebuild_progress(options["user_ids"] or None)
+            stats.rebuild_student_stats(options["user_ids"] or None)
+        self.stdout.write(self.style.SUCCESS("Student stats rebuilt"))
@@ -0,0 +1,65 @@
+"""
+Lecture media probing, run by `manage.py probe_media` in worker processes.
+
+Nothing here touches the ORM: workers get a URL and hand back plain bytes
+and integers, so they can be pickled across a process pool.
+"""
+
+import io
+
+POSTER_AT = 0.1  # fraction of the clip the poster frame is taken from
+POSTER_WIDTH = 1280
+STRIP_FRAMES = 10
+STRIP_HEIGHT = 90
+JPEG_QUALITY = 80
+
+
+def _jpeg(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def _resize(image, width=None, height=None):
+    if width:
+        height = max(1, round(image.height * width / image.width))
+    else:
+        width = max(1, round(image.width * height / image.height))
+    return image.resize((width, height))
+
+
+def probe_lecture(url):
+    """
+    Returns {"duration": seconds, "poster": jpeg bytes, "thumbnails": jpeg bytes}
+    where thumbnails is a horizontal strip of STRIP_FRAMES evenly spaced frames.
+    """
+    # Heavy imports stay in the worker, see core startup_profile
+    from moviepy.editor import VideoFileClip
+    from PIL import Image
+
+    clip = VideoFileClip(url, audio=False)
+    try:
+        duration = clip.duration or 0
+        poster = Image.fromarray(clip.get_frame(duration * POSTER_AT))
+
+        frames = [
+            _resize(Image.fromarray(clip.get_frame(duration * (index + 0.5) / STRIP_FRAMES)), height=STRIP_HEIGHT)
+            for index in range(STRIP_FRAMES)
+        ]
+    finally:
+        clip.close()
+
+    strip = Image.new("RGB", (sum(frame.width for frame in frames), STRIP_HEIGHT))
+    offset = 0
+    for frame in frames:
+        strip.paste(frame, (offset, 0))
+        offset += frame.width
+
+    if poster.width > POSTER_WIDTH:
+        poster = _resize(poster, width=POSTER_WIDTH)
+
+    return {
+        "duration": int(round(duration)),
+        "poster": _jpeg(poster),
+        "thumbnails": _jpeg(strip),
+    }
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_remove_variantitem_file_variantitem_url_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['cart_id', '-date', '-id'], name='cart_cart_id_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['platform_status', 'teacher_course_status', '-date', '-id'], name='course_published_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrolledcourse',
+            index=models.Index(fields=['user', '-date', '-id'], name='enrolled_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question_answer',
+            index=models.Index(fields=['course', '-date', '-id'], name='qa_course_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='whishlist',
+            index=models.Index(fields=['user', '-id'], name='whishlist_user_id_idx'),
+        ),
+    ]
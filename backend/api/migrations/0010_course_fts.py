@@ -0,0 +1,39 @@
+# Full-text index over published courses, maintained by api.signals
+
+from django.db import migrations
+
+
+def create_course_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS api_course_fts "
+        "USING fts5(title, description, category, teacher, tokenize='porter unicode61')"
+    )
+
+    Course = apps.get_model("api", "Course")
+    courses = Course.objects.filter(platform_status="Published", teacher_course_status="Published").select_related("category", "teacher")
+    for course in courses:
+        schema_editor.execute(
+            "INSERT INTO api_course_fts(rowid, title, description, category, teacher) VALUES (%s, %s, %s, %s, %s)",
+            [course.pk, course.title, course.description or "", course.category.title if course.category else "", course.teacher.full_name],
+        )
+
+
+def drop_course_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+
+    schema_editor.execute("DROP TABLE IF EXISTS api_course_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_list_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_course_fts, drop_course_fts),
+    ]
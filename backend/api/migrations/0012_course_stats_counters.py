@@ -0,0 +1,132 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:46
+
+import re
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+# Frozen copies of api.models.RATING and duration_to_seconds as of this
+# migration, so later changes to the app code can't change what it does
+RATINGS = (1, 2, 3, 4, 5)
+
+
+def duration_to_seconds(value):
+    if not value:
+        return 0
+    value = str(value).strip().lower()
+    if re.fullmatch(r"\d+(:\d{1,2}){0,2}", value):
+        seconds = 0
+        for part in value.split(":"):
+            seconds = seconds * 60 + int(part)
+        return seconds
+
+    units = {"h": 3600, "m": 60, "s": 1}
+    parts = re.findall(r"(\d+(?:\.\d+)?)\s*(h|m|s)", value)
+    return int(sum(float(amount) * units[unit] for amount, unit in parts))
+
+
+def backfill_course_stats(apps, schema_editor):
+    Category = apps.get_model("api", "Category")
+    Course = apps.get_model("api", "Course")
+    EnrolledCourse = apps.get_model("api", "EnrolledCourse")
+    Review = apps.get_model("api", "Review")
+    VariantItem = apps.get_model("api", "VariantItem")
+
+    # Later migrations (0013, 0017) build on these counters, so fill them here
+    lectures = []
+    for lecture in VariantItem.objects.only("id", "duration").iterator(chunk_size=2000):
+        lecture.duration_seconds = duration_to_seconds(lecture.duration)
+        if lecture.duration_seconds:
+            lectures.append(lecture)
+    VariantItem.objects.bulk_update(lectures, ["duration_seconds"], batch_size=1000)
+
+    def total(queryset, group_by, value=None):
+        aggregate = Sum(value) if value else Count("id")
+        return Coalesce(Subquery(queryset.order_by().values(group_by).annotate(total=aggregate).values("total")[:1]), 0)
+
+    reviews = Review.objects.filter(course=OuterRef("pk"), active=True, rating__in=RATINGS)
+    course_lectures = VariantItem.objects.filter(variant__course=OuterRef("pk"))
+    updates = {
+        "rating_sum": total(reviews, "course", "rating"),
+        "rating_count": total(reviews, "course"),
+        "enrollment_count": total(EnrolledCourse.objects.filter(course=OuterRef("pk")), "course"),
+        "lecture_count": total(course_lectures, "variant__course"),
+        "duration_total": total(course_lectures, "variant__course", "duration_seconds"),
+    }
+    for rating in RATINGS:
+        updates[f"rating_{rating}"] = total(reviews.filter(rating=rating), "course")
+    Course.objects.update(**updates)
+
+    Category.objects.update(course_count=total(Course.objects.filter(category=OuterRef("pk")), "category"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_course_facet_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='course_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='duration_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='enrollment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='lecture_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='variantitem',
+            name='duration_seconds',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_course_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:51
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_lecture_media(apps, schema_editor):
+    Variant = apps.get_model("api", "Variant")
+    VariantItem = apps.get_model("api", "VariantItem")
+
+    VariantItem.objects.exclude(url__isnull=True).exclude(url="").update(probe_status="Pending")
+
+    totals = VariantItem.objects.filter(variant=OuterRef("pk")).order_by().values("variant").annotate(total=Sum("duration_seconds")).values("total")
+    Variant.objects.update(duration_total=Coalesce(Subquery(totals), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_course_stats_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='variant',
+            name='duration_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='variantitem',
+            name='poster',
+            field=models.FileField(blank=True, null=True, upload_to='course-file/posters'),
+        ),
+        migrations.AddField(
+            model_name='variantitem',
+            name='probe_status',
+            field=models.CharField(blank=True, choices=[('Pending', 'Pending'), ('Done', 'Done'), ('Failed', 'Failed')], max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='variantitem',
+            name='probed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='variantitem',
+            name='thumbnails',
+            field=models.FileField(blank=True, null=True, upload_to='course-file/thumbnails'),
+        ),
+        migrations.AddIndex(
+            model_name='variantitem',
+            index=models.Index(fields=['probe_status', 'id'], name='variantitem_probe_idx'),
+        ),
+        migrations.RunPython(backfill_lecture_media, migrations.RunPython.noop),
+    ]
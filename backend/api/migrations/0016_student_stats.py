@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userauths', '0003_user_refresh_token'),
+        ('api', '0015_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='student_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_courses', models.PositiveIntegerField(default=0)),
+                ('completed_courses', models.PositiveIntegerField(default=0)),
+                ('completed_lessons', models.PositiveIntegerField(default=0)),
+                ('achieved_certificates', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
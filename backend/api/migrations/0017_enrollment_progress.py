@@ -0,0 +1,94 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_progress(apps, schema_editor):
+    Course = apps.get_model("api", "Course")
+    VariantItem = apps.get_model("api", "VariantItem")
+    EnrolledCourse = apps.get_model("api", "EnrolledCourse")
+    CompletedLesson = apps.get_model("api", "CompletedLesson")
+
+    # Number lectures per course in curriculum order
+    seqs, positions = {}, {}
+    lectures = []
+    for lecture in VariantItem.objects.select_related("variant").order_by("variant__course_id", "variant_id", "id"):
+        course_id = lecture.variant.course_id
+        lecture.position = positions[lecture.pk] = seqs.get(course_id, 0)
+        seqs[course_id] = lecture.position + 1
+        lectures.append(lecture)
+    VariantItem.objects.bulk_update(lectures, ["position"], batch_size=1000)
+    Course.objects.bulk_update([Course(pk=pk, lecture_seq=seq) for pk, seq in seqs.items()], ["lecture_seq"], batch_size=1000)
+
+    progress = {}
+    for lesson in CompletedLesson.objects.filter(user__isnull=False).order_by("date", "id"):
+        entry = progress.setdefault((lesson.user_id, lesson.course_id), {"positions": set()})
+        entry["positions"].add(positions[lesson.variant_item_id])
+        entry["last_lesson"], entry["last_activity"] = lesson.variant_item_id, lesson.date
+
+    enrollments = []
+    for enrollment in EnrolledCourse.objects.filter(user__isnull=False).select_related("course"):
+        entry = progress.get((enrollment.user_id, enrollment.course_id))
+        if entry is None:
+            continue
+        bits = bytearray((max(entry["positions"]) // 8) + 1)
+        for position in entry["positions"]:
+            bits[position // 8] |= 1 << (position % 8)
+        enrollment.completed_lessons = len(entry["positions"])
+        enrollment.completed_bits = bytes(bits)
+        enrollment.last_lesson_id = entry["last_lesson"]
+        enrollment.last_activity = entry["last_activity"]
+        lecture_count = enrollment.course.lecture_count
+        if lecture_count and enrollment.completed_lessons >= lecture_count:
+            enrollment.completed_at = entry["last_activity"]
+        enrollments.append(enrollment)
+    EnrolledCourse.objects.bulk_update(
+        enrollments, ["completed_lessons", "completed_bits", "last_lesson", "last_activity", "completed_at"], batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_student_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='lecture_seq',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='enrolledcourse',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='enrolledcourse',
+            name='completed_bits',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.AddField(
+            model_name='enrolledcourse',
+            name='completed_lessons',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='enrolledcourse',
+            name='last_activity',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='enrolledcourse',
+            name='last_lesson',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.variantitem'),
+        ),
+        migrations.AddField(
+            model_name='variantitem',
+            name='position',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_progress, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:10
+
+from django.db import migrations, models
+import django.utils.timezone
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_threads(apps, schema_editor):
+    Question_Answer = apps.get_model("api", "Question_Answer")
+    Question_Answer_Message = apps.get_model("api", "Question_Answer_Message")
+
+    messages = Question_Answer_Message.objects.filter(question=OuterRef("pk")).order_by()
+    replies = messages.values("question").annotate(total=Count("id")).values("total")
+    latest = messages.order_by("-date").values("date")[:1]
+    Question_Answer.objects.update(
+        reply_count=Coalesce(Subquery(replies), 0),
+        last_activity=Coalesce(Subquery(latest), F("date")),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_enrollment_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question_answer',
+            name='last_activity',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='question_answer',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='question_answer',
+            index=models.Index(fields=['course', '-last_activity', '-id'], name='qa_course_activity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question_answer_message',
+            index=models.Index(fields=['question', '-date', '-id'], name='qa_message_question_date_idx'),
+        ),
+        migrations.RunPython(backfill_threads, migrations.RunPython.noop),
+    ]
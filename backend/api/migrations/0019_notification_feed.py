@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:15
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_unseen(apps, schema_editor):
+    Notification = apps.get_model("api", "Notification")
+    StudentStats = apps.get_model("api", "StudentStats")
+    Teacher = apps.get_model("api", "Teacher")
+
+    def unseen(field):
+        rows = Notification.objects.filter(seen=False, **{field: OuterRef("pk")}).order_by()
+        return Coalesce(Subquery(rows.values(field).annotate(total=Count("id")).values("total")), 0)
+
+    StudentStats.objects.update(unseen_notifications=unseen("user"))
+    Teacher.objects.update(unseen_notifications=unseen("teacher"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_qa_thread_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentstats',
+            name='unseen_notifications',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='teacher',
+            name='unseen_notifications',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-date', '-id'], name='notification_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'seen', '-date', '-id'], name='notification_user_seen_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['teacher', '-date', '-id'], name='notification_teacher_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['teacher', 'seen', '-date', '-id'], name='notification_teacher_seen_idx'),
+        ),
+        migrations.RunPython(backfill_unseen, migrations.RunPython.noop),
+    ]
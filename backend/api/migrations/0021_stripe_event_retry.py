@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:44
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_stripe_event_error'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stripeevent',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='stripeevent',
+            name='retry_after',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
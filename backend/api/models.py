@@ -1,12 +1,16 @@
 import math
+import re
+from decimal import Decimal
+from django.conf import settings
 from django.db import models
+from django.db.models.functions import Coalesce, Least
 from django.utils.text import slugify
 from django.utils import timezone
 
 
+from api import search
 from userauths.models import User, Profile
 from shortuuid.django_fields import ShortUUIDField
-from moviepy.editor import VideoFileClip
 
 LANGUAGE = (
     ("English", "English"),
@@ -48,6 +52,12 @@ RATING = (
     (5, "5 Star"),
 )
 
+PROBE_STATUS = (
+    ("Pending", "Pending"),
+    ("Done", "Done"),
+    ("Failed", "Failed"),
+)
+
 NOTI_TYPE = (
     ("New Order", "New Order"),
     ("New Review", "New Review"),
@@ -57,7 +67,47 @@ NOTI_TYPE = (
     ("Course Enrollment Completed", "Course Enrollment Completed"),
 )
 
-class Teacher(models.Model):
+def duration_to_seconds(value):
+    # Lecture durations are typed in by hand as "MM:SS", "HH:MM:SS" or
+    # "1h 5m 30s"; anything unparseable counts as 0.
+    if not value:
+        return 0
+    value = str(value).strip().lower()
+    if re.fullmatch(r"\d+(:\d{1,2}){0,2}", value):
+        seconds = 0
+        for part in value.split(":"):
+            seconds = seconds * 60 + int(part)
+        return seconds
+
+    units = {"h": 3600, "m": 60, "s": 1}
+    parts = re.findall(r"(\d+(?:\.\d+)?)\s*(h|m|s)", value)
+    return int(sum(float(amount) * units[unit] for amount, unit in parts))
+
+def seconds_to_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+class CounterFieldsMixin:
+    """
+    For models with columns kept current by F() updates in api.stats. A plain
+    save() of a row loaded earlier would write its stale copies of those
+    columns back over the counts, so they are only written on insert or when
+    named in update_fields.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not args and not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+class Teacher(CounterFieldsMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     image = models.FileField(upload_to="course-file", blank=True, null=True, default="default.jpg")
     full_name = models.CharField(max_length=100)
@@ -68,6 +118,10 @@ class Teacher(models.Model):
     about = models.TextField(null=True, blank=True)
     country = models.CharField(max_length=100, null=True, blank=True)
 
+    # Maintained by api.stats and rebuilt by `manage.py rebuild_course_stats`
+    unseen_notifications = models.PositiveIntegerField(default=0, editable=False)
+    counter_fields = ("unseen_notifications",)
+
     def __str__(self):
         return self.full_name
     
@@ -80,11 +134,13 @@ class Teacher(models.Model):
     def review(self):
         return Course.objects.filter(teacher=self).count()
 
-class Category(models.Model):
+class Category(CounterFieldsMixin, models.Model):
     title = models.CharField(max_length=100)
     image  = models.FileField(upload_to="course-file", default="category.jpg", null=True, blank=True)
     active = models.BooleanField(default=True)
     slug = models.SlugField(unique=True, null=True, blank=True)
+    course_count = models.PositiveIntegerField(default=0, editable=False)
+    counter_fields = ("course_count",)
 
     class Meta:
         verbose_name_plural = "Category"
@@ -93,15 +149,58 @@ class Category(models.Model):
     def __str__(self):
         return self.title
     
-    def course_count(self):
-        return Course.objects.filter(category=self).count()
-    
     def save(self, *args, **kwargs):
         if self.slug == "" or self.slug == None:
             self.slug = slugify(self.title)
         super(Category, self).save(*args, **kwargs)
 
-class Course(models.Model):
+class CourseQuerySet(models.QuerySet):
+    def published(self):
+        return self.filter(platform_status="Published", teacher_course_status="Published")
+
+    def with_card_stats(self):
+        # Card stats are denormalized columns on Course (see api.stats), so
+        # only the teacher name needs a join.
+        return self.select_related("teacher")
+
+    def filter_catalog(self, query=None, category=None, level=None, language=None, price_min=None, price_max=None, featured=None, rating_min=None):
+        queryset = self
+        if query and re.search(r"\w", query):
+            queryset = queryset.filter(search.matching(query))
+
+        filters = {}
+        if category:
+            filters["category__slug"] = category
+        if level:
+            filters["level"] = level
+        if language:
+            filters["language"] = language
+        if price_min is not None:
+            filters["price__gte"] = price_min
+        if price_max is not None:
+            filters["price__lte"] = price_max
+        if featured is not None:
+            filters["featured"] = featured
+
+        if rating_min is not None:
+            # rating_sum / rating_count >= rating_min, without the division
+            filters["rating_count__gt"] = 0
+            filters["rating_sum__gte"] = models.F("rating_count") * rating_min
+
+        return queryset.filter(**filters)
+
+    def facet_counts(self):
+        # One GROUP BY over every facet column at once; the per-facet totals
+        # are summed from those few rows instead of running a query per facet.
+        facets = {"category": {}, "level": {}, "language": {}, "featured": {}}
+        rows = self.order_by().values("category__slug", "level", "language", "featured").annotate(total=models.Count("id"))
+        for row in rows:
+            for facet, value in (("category", row["category__slug"]), ("level", row["level"]), ("language", row["language"]), ("featured", row["featured"])):
+                if value is not None:
+                    facets[facet][value] = facets[facet].get(value, 0) + row["total"]
+        return facets
+
+class Course(CounterFieldsMixin, models.Model):
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
     teacher = models.ForeignKey(Teacher, on_delete=models.CASCADE)
     file = models.FileField(upload_to="course-file", blank=True, null=True)
@@ -118,6 +217,35 @@ class Course(models.Model):
     slug = models.SlugField(unique=True, null=True, blank=True)
     date = models.DateTimeField(default=timezone.now)
 
+    # Denormalized stats, maintained by api.stats and rebuilt by `manage.py rebuild_course_stats`
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
+    enrollment_count = models.PositiveIntegerField(default=0, editable=False)
+    lecture_count = models.PositiveIntegerField(default=0, editable=False)
+    duration_total = models.PositiveIntegerField(default=0, editable=False)  # seconds
+    lecture_seq = models.PositiveIntegerField(default=0, editable=False)  # positions handed out to lectures, never reused
+    counter_fields = (
+        "rating_sum", "rating_count", "rating_1", "rating_2", "rating_3", "rating_4", "rating_5",
+        "enrollment_count", "lecture_count", "duration_total", "lecture_seq",
+    )
+
+    objects = CourseQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["platform_status", "teacher_course_status", "-date", "-id"], name="course_published_date_idx"),
+            models.Index(fields=["platform_status", "teacher_course_status", "category", "level", "language"], name="course_pub_category_idx"),
+            models.Index(fields=["platform_status", "teacher_course_status", "level", "language"], name="course_pub_level_idx"),
+            models.Index(fields=["platform_status", "teacher_course_status", "language"], name="course_pub_language_idx"),
+            models.Index(fields=["platform_status", "teacher_course_status", "price"], name="course_pub_price_idx"),
+            models.Index(fields=["platform_status", "teacher_course_status", "featured", "-date"], name="course_pub_featured_idx"),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -136,20 +264,23 @@ class Course(models.Model):
         return VariantItem.objects.filter(variant__course=self)
     
     def average_rating(self):
-        average_rating = Review.objects.filter(course=self, active=True).aggregate(avg_rating=models.Avg('rating'))
-        return average_rating['avg_rating']
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
 
-    def rating_count(self):
-        return Review.objects.filter(course=self, active=True).count()
+    def rating_histogram(self):
+        return {1: self.rating_1, 2: self.rating_2, 3: self.rating_3, 4: self.rating_4, 5: self.rating_5}
     
     def reviews(self):
         return Review.objects.filter(course=self, active=True)
         
-class Variant(models.Model):
+class Variant(CounterFieldsMixin, models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     title = models.CharField(max_length=1000)
     variant_id = ShortUUIDField(unique=True, length=6, max_length=20, alphabet="1234567890")
     date = models.DateTimeField(default=timezone.now)
+    duration_total = models.PositiveIntegerField(default=0, editable=False)  # seconds, see api.stats
+    counter_fields = ("duration_total",)
 
     def __str__(self):
         return self.title
@@ -163,33 +294,74 @@ class VariantItem(models.Model):
     description = models.TextField(null=True, blank=True)
     url = models.URLField(max_length=2000, null=True, blank=True)  # External video URL
     duration = models.CharField(max_length=100, null=True, blank=True)  # Pre-calculated duration
+    duration_seconds = models.PositiveIntegerField(default=0, editable=False)
     content_duration = models.CharField(max_length=1000, null=True, blank=True)
     preview = models.BooleanField(default=False)
     variant_item_id = ShortUUIDField(unique=True, length=6, max_length=20, alphabet="1234567890")
     date = models.DateTimeField(default=timezone.now)
+    # Stable index within the course, the bit of this lecture in EnrolledCourse.completed_bits
+    position = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
+    # Filled in offline by `manage.py probe_media`
+    poster = models.FileField(upload_to="course-file/posters", blank=True, null=True)
+    thumbnails = models.FileField(upload_to="course-file/thumbnails", blank=True, null=True)
+    probe_status = models.CharField(choices=PROBE_STATUS, max_length=20, blank=True, null=True)
+    probed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["probe_status", "id"], name="variantitem_probe_idx"),
+        ]
 
     def __str__(self):
         return f"{self.variant.title} - {self.title}"
+
+    def save(self, *args, **kwargs):
+        self.duration_seconds = duration_to_seconds(self.duration)
+        super(VariantItem, self).save(*args, **kwargs)
     
 
-class Question_Answer(models.Model):
+class QuestionAnswerQuerySet(models.QuerySet):
+    def threads(self):
+        # Askers' profiles are joined in, and the latest messages of every
+        # thread on the page come from one windowed query, authors joined too
+        recent = Question_Answer_Message.objects.select_related("user__profile").order_by("-date", "-id")
+        return self.select_related("user__profile").prefetch_related(
+            models.Prefetch("question_answer_message_set", queryset=recent[:settings.QA_THREAD_MESSAGES], to_attr="recent_messages"),
+        )
+
+class Question_Answer(CounterFieldsMixin, models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     title = models.CharField(max_length=1000, null=True, blank=True)
     qa_id = ShortUUIDField(unique=True, length=6, max_length=20, alphabet="1234567890")
     date = models.DateTimeField(default=timezone.now)
 
+    # Maintained by api.stats and rebuilt by `manage.py rebuild_course_stats`
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
+    last_activity = models.DateTimeField(default=timezone.now, editable=False)
+    counter_fields = ("reply_count", "last_activity")
+
+    objects = QuestionAnswerQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.user.username} - {self.course.title}"
     
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=["course", "-date", "-id"], name="qa_course_date_idx"),
+            models.Index(fields=["course", "-last_activity", "-id"], name="qa_course_activity_idx"),
+        ]
 
     def messages(self):
+        if hasattr(self, "recent_messages"):
+            # Prefetched newest first by threads()
+            return self.recent_messages[::-1]
         return Question_Answer_Message.objects.filter(question=self)
     
     def profile(self):
-        return Profile.objects.get(user=self.user)
+        return self.user.profile if self.user_id else None
     
 class Question_Answer_Message(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
@@ -205,10 +377,24 @@ class Question_Answer_Message(models.Model):
     
     class Meta:
         ordering = ['date']
+        indexes = [
+            models.Index(fields=["question", "-date", "-id"], name="qa_message_question_date_idx"),
+        ]
 
     def profile(self):
-        return Profile.objects.get(user=self.user)
-    
+        return self.user.profile if self.user_id else None
+    
+class CartQuerySet(models.QuerySet):
+    def totals(self):
+        # Summed in SQL as Decimal, in one query, so no float rounding creeps in
+        zero = models.Value(Decimal("0.00"), output_field=models.DecimalField(max_digits=12, decimal_places=2))
+        return self.order_by().aggregate(
+            price=Coalesce(models.Sum("price"), zero),
+            tax=Coalesce(models.Sum("tax_fee"), zero),
+            total=Coalesce(models.Sum("total"), zero),
+            items_count=models.Count("id"),
+        )
+
 class Cart(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE)    
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
@@ -219,6 +405,13 @@ class Cart(models.Model):
     cart_id = ShortUUIDField(length=6, max_length=20, alphabet="1234567890")
     date = models.DateTimeField(default=timezone.now)
 
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["cart_id", "-date", "-id"], name="cart_cart_id_date_idx"),
+        ]
+
     def __str__(self):
         return self.course.title
     
@@ -241,6 +434,9 @@ class CartOrder(models.Model):
 
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=["stripe_session_id"], name="order_stripe_session_idx"),
+        ]
 
     def order_items(self):
         return CartOrderItem.objects.filter(order=self)
@@ -293,7 +489,35 @@ class CompletedLesson(models.Model):
     def __str__(self):
         return self.course.title
     
-class EnrolledCourse(models.Model):
+class StudentStats(models.Model):
+    # Dashboard counters, maintained by api.signals and rebuilt by `manage.py rebuild_student_stats`
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="student_stats")
+    total_courses = models.PositiveIntegerField(default=0)
+    completed_courses = models.PositiveIntegerField(default=0)
+    completed_lessons = models.PositiveIntegerField(default=0)
+    achieved_certificates = models.PositiveIntegerField(default=0)
+    unseen_notifications = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user} stats"
+
+    def in_progress_courses(self):
+        return max(self.total_courses - self.completed_courses, 0)
+
+class EnrolledCourseQuerySet(models.QuerySet):
+    def with_progress(self):
+        # Both sides are counters already stored on the rows, so no lesson is counted
+        return self.annotate(
+            progress=models.Case(
+                models.When(course__lecture_count__gt=0, then=Least(
+                    models.F("completed_lessons") * 100.0 / models.F("course__lecture_count"), 100.0,
+                )),
+                default=0.0,
+                output_field=models.FloatField(),
+            ),
+        )
+
+class EnrolledCourse(CounterFieldsMixin, models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     teacher = models.ForeignKey(Teacher, on_delete=models.SET_NULL, null=True, blank=True)
@@ -301,6 +525,21 @@ class EnrolledCourse(models.Model):
     enrollment_id = ShortUUIDField(unique=True, length=6, max_length=20, alphabet="1234567890")
     date = models.DateTimeField(default=timezone.now)   
 
+    # Progress, maintained by api.stats.mark_lesson and rebuilt by `manage.py rebuild_student_stats`
+    completed_lessons = models.PositiveIntegerField(default=0, editable=False)
+    completed_bits = models.BinaryField(default=b"", editable=False)  # bit n set: lecture at position n is done
+    last_lesson = models.ForeignKey(VariantItem, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name="+")
+    last_activity = models.DateTimeField(null=True, blank=True, editable=False)
+    completed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    counter_fields = ("completed_lessons", "completed_bits", "last_lesson", "last_activity", "completed_at")
+
+    objects = EnrolledCourseQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-date", "-id"], name="enrolled_user_date_idx"),
+        ]
+
     def __str__(self):
         return self.course.title
     
@@ -317,7 +556,7 @@ class EnrolledCourse(models.Model):
         return Note.objects.filter(course=self.course, user=self.user)
     
     def question_answer(self):
-        return Question_Answer.objects.filter(course=self.course)
+        return Question_Answer.objects.filter(course=self.course).threads()
     
     def review(self):
         return Review.objects.filter(course=self.course, user=self.user).first()
@@ -358,6 +597,16 @@ class Notification(models.Model):
     seen = models.BooleanField(default=False)
     date = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # Feeds page by (date, id) per recipient; the seen variants serve
+            # the unseen filter and the mark-all-seen UPDATE
+            models.Index(fields=["user", "-date", "-id"], name="notification_user_date_idx"),
+            models.Index(fields=["user", "seen", "-date", "-id"], name="notification_user_seen_idx"),
+            models.Index(fields=["teacher", "-date", "-id"], name="notification_teacher_date_idx"),
+            models.Index(fields=["teacher", "seen", "-date", "-id"], name="notification_teacher_seen_idx"),
+        ]
+
     def __str__(self):
         return self.type
 
@@ -376,6 +625,11 @@ class Whishlist(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-id"], name="whishlist_user_id_idx"),
+        ]
+
     def __str__(self):
         return self.course.title
     
@@ -388,3 +642,48 @@ class Country(models.Model):
         return self.name
 
 
+class StripeEvent(models.Model):
+    # Webhook inbox: stored raw on receipt, processed by api.tasks.drain_stripe_inbox
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=255)
+    payload = models.TextField()
+    processed_at = models.DateTimeField(null=True, blank=True)  # also set when the event was given up on
+    attempts = models.PositiveIntegerField(default=0)
+    retry_after = models.DateTimeField(default=timezone.now)  # pushed back after each failed attempt
+    last_error = models.TextField(null=True, blank=True)
+    date = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["processed_at", "id"], name="stripe_event_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.event_id}"
+
+
+class IdempotencyKey(models.Model):
+    # Stored responses for retried POSTs, see IdempotentMixin in api.views
+    key = models.CharField(max_length=255)
+    scope = models.CharField(max_length=255)  # request path and caller, see IdempotentMixin.get_idempotency_scope
+    fingerprint = models.CharField(max_length=64)  # sha256 of the request body
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # null while the first request runs
+    response = models.JSONField(null=True, blank=True)
+    date = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["scope", "key"], name="idempotency_scope_key_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key}"
+
+
+class ReferenceVersion(models.Model):
+    # Bumped on every write to a table cached by api.reference, so all processes see it
+    name = models.CharField(max_length=100, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
@@ -0,0 +1,28 @@
+from django.conf import settings
+
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class DateCursorPagination(CursorPagination):
+    # Keyset pagination: every page is a range scan on (date, id), so deep
+    # pages cost the same as the first one.
+    ordering = ("-date", "-id")
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+
+class IdCursorPagination(DateCursorPagination):
+    ordering = ("-id",)
+
+
+class ActivityCursorPagination(DateCursorPagination):
+    # Most recently active threads first, off the denormalized Question_Answer.last_activity
+    ordering = ("-last_activity", "-id")
+
+
+class SearchResultPagination(LimitOffsetPagination):
+    # Relevance order has no stable key to seek on, so search results page by
+    # offset into the ranked index lookup instead of by cursor.
+    default_limit = settings.API_PAGE_SIZE
+    max_limit = settings.API_MAX_PAGE_SIZE
@@ -0,0 +1,126 @@
+"""
+Payment provider clients.
+
+One pooled HTTP session per provider per process, strict (connect, read)
+timeouts on every call, and a PayPal OAuth token that is reused until shortly
+before it expires. API bases come from settings, so `manage.py payment_stub`
+can stand in for both providers when benchmarking checkout offline.
+"""
+
+import json
+import threading
+import time
+
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+TOKEN_REFRESH_MARGIN = 60  # seconds before expiry that a token is renewed
+
+
+class PaymentGatewayError(Exception):
+    pass
+
+
+def pooled_session():
+    session = requests.Session()
+    # Retry only failed connects; a POST that reached the provider is not replayed
+    retries = Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.2, allowed_methods=False)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.PAYMENT_POOL_SIZE, max_retries=retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def timeout():
+    return (settings.PAYMENT_CONNECT_TIMEOUT, settings.PAYMENT_READ_TIMEOUT)
+
+
+class PayPalClient:
+    def __init__(self, api_base, client_id, secret):
+        self.api_base = api_base.rstrip("/")
+        self.auth = (client_id, secret)
+        self.session = pooled_session()
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0.0
+
+    def access_token(self, refresh=False):
+        with self._lock:
+            if refresh or self._token is None or time.monotonic() >= self._expires_at - TOKEN_REFRESH_MARGIN:
+                self._token, self._expires_at = self._fetch_token()
+            return self._token
+
+    def _fetch_token(self):
+        response = self._send("post", "/v1/oauth2/token", data={"grant_type": "client_credentials"}, auth=self.auth)
+        if response.status_code != 200:
+            raise PaymentGatewayError(f"Failed to get access token from paypal {response.status_code}")
+        data = response.json()
+        return data["access_token"], time.monotonic() + int(data.get("expires_in", 0))
+
+    def get_order(self, paypal_order_id):
+        response = self._authorized("get", f"/v2/checkout/orders/{paypal_order_id}")
+        if response.status_code != 200:
+            raise PaymentGatewayError(f"Paypal Error Occured. Error: {response.status_code}")
+        return response.json()
+
+    def _authorized(self, method, path, **kwargs):
+        response = self._send(method, path, headers={"Authorization": f"Bearer {self.access_token()}"}, **kwargs)
+        if response.status_code == 401:
+            # Revoked or rotated early; one retry with a fresh token
+            response = self._send(method, path, headers={"Authorization": f"Bearer {self.access_token(refresh=True)}"}, **kwargs)
+        return response
+
+    def _send(self, method, path, **kwargs):
+        try:
+            return self.session.request(method, self.api_base + path, timeout=timeout(), **kwargs)
+        except requests.RequestException as e:
+            raise PaymentGatewayError(f"Paypal is unreachable. Error: {e}") from e
+
+
+class StripeClient:
+    def __init__(self, api_base, api_key):
+        self.api_key = api_key
+        # stripe-python 7 keeps its transport in module globals
+        stripe.api_base = api_base.rstrip("/")
+        stripe.default_http_client = stripe.http_client.RequestsClient(session=pooled_session(), timeout=timeout())
+        stripe.max_network_retries = 0
+
+    def create_checkout_session(self, **params):
+        return stripe.checkout.Session.create(api_key=self.api_key, **params)
+
+    def retrieve_checkout_session(self, session_id):
+        return stripe.checkout.Session.retrieve(session_id, api_key=self.api_key)
+
+
+def verify_stripe_webhook(payload, signature):
+    """Check the Stripe-Signature header against the raw body and return the event as a dict."""
+    if not settings.STRIPE_WEBHOOK_SECRET:
+        raise PaymentGatewayError("Stripe webhooks are not configured")
+    try:
+        stripe.WebhookSignature.verify_header(payload.decode(), signature or "", settings.STRIPE_WEBHOOK_SECRET, stripe.Webhook.DEFAULT_TOLERANCE)
+        return json.loads(payload)
+    except (stripe.error.SignatureVerificationError, UnicodeDecodeError, ValueError) as e:
+        raise PaymentGatewayError(f"Invalid webhook. Error: {e}") from e
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _client(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name) or _clients.setdefault(name, factory())
+    return client
+
+
+def paypal():
+    return _client("paypal", lambda: PayPalClient(settings.PAYPAL_API_BASE, settings.PAYPAL_CLIENT_ID, settings.PAYPAL_SECRET_ID))
+
+
+def stripe_client():
+    return _client("stripe", lambda: StripeClient(settings.STRIPE_API_BASE, settings.STRIPE_SECRET_KEY))
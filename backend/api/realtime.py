@@ -0,0 +1,87 @@
+"""
+Events pushed to browsers over the event stream (see api.views.event_stream).
+
+Each event is a small delta, the new row serialized as the REST API would,
+published through core.pubsub once the writing transaction commits. Clients
+apply deltas to what they already loaded instead of polling.
+"""
+
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from api import serializer as api_serializer
+from core import pubsub
+
+RECONNECT_DELAY = 3000  # ms, sent to EventSource as `retry`
+
+
+def course_channel(course_id):
+    return f"course:{course_id}"
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+def teacher_channel(teacher_id):
+    return f"teacher:{teacher_id}"
+
+
+def publish(channel, event, data):
+    message = {"event": event, "data": data}
+    transaction.on_commit(lambda: pubsub.publish(channel, message))
+
+
+def question_created(question):
+    data = api_serializer.Question_AnswerSerializer(question).data
+    publish(course_channel(question.course_id), "qa.question", data)
+
+
+def message_created(message):
+    data = {
+        "qa_id": message.question.qa_id,
+        "message": api_serializer.Question_Answer_MessageSerializer(message).data,
+    }
+    publish(course_channel(message.course_id), "qa.message", data)
+
+
+def notifications_created(notifications):
+    for notification in notifications:
+        data = api_serializer.NotificationSerializer(notification).data
+        if notification.user_id:
+            publish(user_channel(notification.user_id), "notification", data)
+        if notification.teacher_id:
+            publish(teacher_channel(notification.teacher_id), "notification", data)
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def stream(channels):
+    """
+    Server-Sent Events for the given channels. Comments keep idle proxies
+    from closing the connection, and the stream ends after
+    EVENT_STREAM_MAX_AGE so EventSource reconnects on a fresh request.
+    A `reset` event means deltas were dropped and the client should refetch.
+    """
+    broker = pubsub.broker()
+    subscription = broker.subscribe(channels)
+    deadline = subscription.loop.time() + settings.EVENT_STREAM_MAX_AGE
+    try:
+        yield f"retry: {RECONNECT_DELAY}\n\n"
+        while subscription.loop.time() < deadline:
+            item = await subscription.get(timeout=settings.EVENT_STREAM_HEARTBEAT)
+            if subscription.overflowed:
+                subscription.overflowed = False
+                yield format_event("reset", {})
+            if item is None:
+                yield ": keep-alive\n\n"
+                continue
+            channel, message = item
+            yield format_event(message["event"], message["data"])
+    finally:
+        broker.unsubscribe(subscription)
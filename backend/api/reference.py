@@ -0,0 +1,93 @@
+"""
+Process-local copies of small, rarely written reference tables.
+
+Each table is loaded once per process and served from memory. Writes bump
+the table's ReferenceVersion row, and every process compares that row with
+the version it loaded at most every CHECK_INTERVAL seconds, so a save in any
+process is picked up by the others without needing a shared cache. Writes in
+this process expire the local copy straight away.
+
+Callers get shared objects back and must treat them as read-only.
+"""
+
+import threading
+import time
+
+from django.db import DatabaseError
+from django.db.models import F
+
+from api import cache as api_cache
+from api import models as api_models
+
+COUNTRIES_TAG = "countries"
+CHECK_INTERVAL = 1.0
+
+
+class ReferenceTable:
+    def __init__(self, tag, load):
+        self.tag = tag
+        self._load = load
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        # Read _data once; other threads replace it while we check
+        data = self._data
+        if data is not None and now - self._checked_at < CHECK_INTERVAL:
+            return data
+
+        with self._lock:
+            data = self._data
+            if data is None or now - self._checked_at >= CHECK_INTERVAL:
+                # Read the version before the rows, so a write in between
+                # leaves us with a stale version and we reload next time
+                version = self._shared_version()
+                if data is None or self._version is None or version != self._version:
+                    data = self._load()
+                    self._data = data
+                    self._version = version
+                self._checked_at = now
+            return data
+
+    def _shared_version(self):
+        version = api_models.ReferenceVersion.objects.filter(name=self.tag).values_list("version", flat=True).first()
+        return version or 0
+
+    def invalidate(self):
+        """Call on every write to the table. Runs in the writer's transaction."""
+        versions = api_models.ReferenceVersion.objects
+        if not versions.filter(name=self.tag).update(version=F("version") + 1):
+            versions.bulk_create([api_models.ReferenceVersion(name=self.tag, version=1)], ignore_conflicts=True)
+        # Expire the copy rather than dropping it: readers keep the old rows
+        # until the next get() reloads them
+        with self._lock:
+            self._checked_at = 0.0
+            self._version = None
+
+
+def load_countries():
+    countries = {}
+    for country in api_models.Country.objects.order_by("id"):
+        # Matches the old filter(name=...).first() when names repeat
+        countries.setdefault(country.name, country)
+    return countries
+
+
+def load_categories():
+    return list(api_models.Category.objects.filter(active=True))
+
+
+countries = ReferenceTable(COUNTRIES_TAG, load_countries)
+categories = ReferenceTable(api_cache.CATEGORIES_TAG, load_categories)
+
+
+def preload():
+    try:
+        countries.get()
+        categories.get()
+    except DatabaseError:
+        # Not migrated yet (first deploy, runserver before migrate); load lazily
+        pass
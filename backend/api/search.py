@@ -0,0 +1,115 @@
+import re
+
+from django.db import connection, models
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "api_course_fts"
+
+# bm25 column weights, in table order: title, description, category, teacher
+RANK = f"bm25({FTS_TABLE}, 10.0, 1.0, 4.0, 4.0)"
+
+
+def fts_enabled():
+    return connection.vendor == "sqlite"
+
+
+def match_expression(query):
+    # Every word becomes a quoted prefix term, so "pyth djan" matches
+    # "Python for Django" and user input can't inject FTS5 syntax.
+    terms = re.findall(r"\w+", query or "")
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def matching(query):
+    """
+    Q() for the courses matching query, to combine with other filters. Rows
+    come back in whatever order the queryset asks for, not by rank.
+    """
+    if fts_enabled():
+        return models.Q(id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match_expression(query)]))
+
+    # Other backends get a plain substring scan over the same fields.
+    condition = models.Q()
+    for term in re.findall(r"\w+", query or ""):
+        condition &= (
+            models.Q(title__icontains=term)
+            | models.Q(description__icontains=term)
+            | models.Q(category__title__icontains=term)
+            | models.Q(teacher__full_name__icontains=term)
+        )
+    return condition
+
+
+def is_searchable(course):
+    return course.platform_status == "Published" and course.teacher_course_status == "Published"
+
+
+def index_course(course):
+    if not fts_enabled():
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [course.pk])
+        if is_searchable(course):
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}(rowid, title, description, category, teacher) VALUES (%s, %s, %s, %s, %s)",
+                [
+                    course.pk,
+                    course.title,
+                    course.description or "",
+                    course.category.title if course.category else "",
+                    course.teacher.full_name,
+                ],
+            )
+
+
+def unindex_course(course_id):
+    if not fts_enabled():
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [course_id])
+
+
+class CourseSearchResults:
+    """
+    Lazy, sliceable result set for a search query. Slicing runs one ranked
+    index lookup for just that window plus one query for the matching rows,
+    so it can be handed straight to LimitOffsetPagination.
+    """
+
+    def __init__(self, query, queryset):
+        self.expression = match_expression(query)
+        self.queryset = queryset
+
+        if not fts_enabled():
+            self.queryset = queryset.filter(matching(query)).order_by("-date", "-id")
+
+    def count(self):
+        if not self.expression:
+            return 0
+        if not fts_enabled():
+            return self.queryset.count()
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [self.expression])
+            return cursor.fetchone()[0]
+
+    def __getitem__(self, window):
+        if not isinstance(window, slice):
+            return self[window:window + 1][0]
+        if not self.expression:
+            return []
+        if not fts_enabled():
+            return list(self.queryset[window])
+
+        offset = window.start or 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY {RANK} LIMIT %s OFFSET %s",
+                [self.expression, window.stop - offset, offset],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+
+        courses = self.queryset.in_bulk(ids)
+        return [courses[pk] for pk in ids if pk in courses]
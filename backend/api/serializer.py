@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.contrib.auth.password_validation import validate_password
+from django.db.models import Prefetch
 from api import models as api_models
 
 from rest_framework import serializers
@@ -7,6 +9,107 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from userauths.models import Profile, User
 
 
+def parse_paths(value):
+    # "id,course.title,course.slug" -> {"id": {}, "course": {"title": {}, "slug": {}}}
+    tree = {}
+    for path in (value or "").split(","):
+        node = tree
+        for part in path.strip().split("."):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+class ExpandableFieldsMixin:
+    """
+    Sparse fieldsets and explicit expansion, driven by `?fields=` and `?expand=`.
+
+    Relations stay primary keys unless expanded. `Meta.expandable` maps a field
+    name to the name of the nested serializer in this module and its options,
+    `Meta.default_expand` is what safe requests get when they don't ask, and
+    `get_query_plan()` turns the requested shape into select_related and
+    prefetch_related lookups for the view's queryset.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if fields is None and expand is None and request is not None:
+            fields, expand = self.requested_shape(request)
+
+        for name, subtree in (expand or {}).items():
+            nested = self.nested_serializer(name)
+            if nested is not None:
+                serializer_class, options = nested
+                self.fields[name] = serializer_class(read_only=True, fields=(fields or {}).get(name) or None, expand=subtree, **options)
+
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def requested_shape(cls, request):
+        fields = parse_paths(request.query_params.get("fields"))
+        if "expand" in request.query_params:
+            expand = parse_paths(request.query_params["expand"])
+        elif request.method in ("GET", "HEAD", "OPTIONS"):
+            expand = parse_paths(",".join(getattr(cls.Meta, "default_expand", [])))
+        else:
+            expand = {}
+        return fields, expand
+
+    @classmethod
+    def nested_serializer(cls, name):
+        spec = getattr(cls.Meta, "expandable", {}).get(name)
+        if spec is None:
+            return None
+        serializer_name, options = spec
+        return globals()[serializer_name], options
+
+    @classmethod
+    def get_query_plan(cls, expand):
+        model = cls.Meta.model
+        select_related = list(getattr(cls.Meta, "select_related", []))
+        prefetch_related = []
+
+        for name, subtree in expand.items():
+            nested = cls.nested_serializer(name)
+            if nested is None:
+                continue
+            serializer_class, options = nested
+            source = options.get("source", name)
+            field = model._meta.get_field(source)
+            nested_select, nested_prefetch = serializer_class.get_query_plan(subtree)
+
+            if field.many_to_many or field.one_to_many:
+                queryset = field.related_model._default_manager.select_related(*nested_select).prefetch_related(*nested_prefetch)
+                prefetch_related.append(Prefetch(source, queryset=queryset))
+            else:
+                select_related.append(source)
+                select_related += [f"{source}__{lookup}" for lookup in nested_select]
+                prefetch_related += [Prefetch(f"{source}__{lookup.prefetch_through}", queryset=lookup.queryset) for lookup in nested_prefetch]
+
+        # Unexpanded to-many relations still render as primary key lists, but
+        # only the ones this serializer declares (User.groups isn't rendered)
+        declared = cls.Meta.fields
+        to_many = {field.name for field in model._meta.many_to_many if declared == "__all__" or field.name in declared}
+        to_many |= {
+            options.get("source", name)
+            for name, (_, options) in getattr(cls.Meta, "expandable", {}).items()
+            if options.get("many") and (declared == "__all__" or name in declared)
+        }
+        expanded = {lookup.prefetch_through for lookup in prefetch_related}
+        prefetch_related += [Prefetch(name) for name in sorted(to_many - expanded)]
+
+        return select_related, prefetch_related
+
+    @classmethod
+    def setup_queryset(cls, queryset, request):
+        _, expand = cls.requested_shape(request)
+        select_related, prefetch_related = cls.get_query_plan(expand)
+        return queryset.select_related(*select_related).prefetch_related(*prefetch_related)
+
+
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
@@ -47,6 +150,13 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = '__all__'
 
+class UserSummarySerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    # Safe to nest anywhere: no password, otp or token fields
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'full_name']
+
 class ProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
@@ -58,6 +168,12 @@ class CategorySerializer(serializers.ModelSerializer):
         model = api_models.Category
         fields = ['title', 'image', 'slug', 'course_count']
 
+class TeacherSummarySerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+
+    class Meta:
+        model = api_models.Teacher
+        fields = ["id", "image", "full_name", "bio", "country"]
+
 class TeacherSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -110,48 +226,43 @@ class Question_AnswerSerializer(serializers.ModelSerializer):
         model = api_models.Question_Answer
         fields = "__all__"
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = api_models.Cart
         fields = "__all__"
+        default_expand = ["course"]
+        expandable = {
+            "course": ("CourseCardSerializer", {}),
+            "user": ("UserSummarySerializer", {}),
+        }
 
-    def __init__(self, *args, **kwargs):
-        super(CartSerializer, self ).__init__(*args, **kwargs)
-        request = self.context.get("request")
-        if request and request.method == "POST":
-            self.Meta.depth = 0
-        else:
-            self.Meta.depth = 3
-
-class CartOrderItemSerializer(serializers.ModelSerializer):
+class CartOrderItemSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = api_models.CartOrderItem
         fields = "__all__"
+        default_expand = ["course"]
+        expandable = {
+            "course": ("CourseCardSerializer", {}),
+            "teacher": ("TeacherSummarySerializer", {}),
+            "order": ("CartOrderSerializer", {}),
+            "coupons": ("CouponSerializer", {"many": True}),
+        }
 
-    def __init__(self, *args, **kwargs):
-        super(CartOrderItemSerializer, self ).__init__(*args, **kwargs)
-        request = self.context.get("request")
-        if request and request.method == "POST":
-            self.Meta.depth = 0
-        else:
-            self.Meta.depth = 3
-
-class CartOrderSerializer(serializers.ModelSerializer):
-    order_items = CartOrderItemSerializer(many=True)
+class CartOrderSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    order_items = serializers.PrimaryKeyRelatedField(source="orderitem", many=True, read_only=True)
 
     class Meta:
         model = api_models.CartOrder
         fields = "__all__"
-
-    def __init__(self, *args, **kwargs):
-        super(CartOrderSerializer, self ).__init__(*args, **kwargs)
-        request = self.context.get("request")
-        if request and request.method == "POST":
-            self.Meta.depth = 0
-        else:
-            self.Meta.depth = 3
+        default_expand = ["order_items.course"]
+        expandable = {
+            "order_items": ("CartOrderItemSerializer", {"many": True, "source": "orderitem"}),
+            "student": ("UserSummarySerializer", {}),
+            "teachers": ("TeacherSummarySerializer", {"many": True}),
+            "coupons": ("CouponSerializer", {"many": True}),
+        }
 
 class CertificateSerializer(serializers.ModelSerializer):
 
@@ -193,25 +304,22 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = api_models.Notification
         fields = "__all__"
 
-class CouponSerializer(serializers.ModelSerializer):
+class CouponSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = api_models.Coupon
         fields = "__all__"
 
-class WhishlistSerializer(serializers.ModelSerializer):
+class WhishlistSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = api_models.Whishlist
         fields = "__all__"
-    
-    def __init__(self, *args, **kwargs):
-        super(WhishlistSerializer, self ).__init__(*args, **kwargs)
-        request = self.context.get("request")
-        if request and request.method == "POST":
-            self.Meta.depth = 0
-        else:
-            self.Meta.depth = 3
+        default_expand = ["course"]
+        expandable = {
+            "course": ("CourseCardSerializer", {}),
+            "user": ("UserSummarySerializer", {}),
+        }
 
 class CountrySerializer(serializers.ModelSerializer):
 
@@ -229,7 +337,7 @@ class EnrolledCourseSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = api_models.EnrolledCourse
-        fields = "__all__"
+        exclude = ["completed_bits"]
 
     def __init__(self, *args, **kwargs):
         super(EnrolledCourseSerializer, self ).__init__(*args, **kwargs)
@@ -258,7 +366,66 @@ class CourseSerializer(serializers.ModelSerializer):
             self.Meta.depth = 3
 
 
+class CourseCardSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    # Read-only list projection, every field is a column on Course or Teacher
+    teacher_name = serializers.CharField(source="teacher.full_name", read_only=True)
+    average_rating = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = api_models.Course
+        fields = ["id", "course_id", "title", "slug", "image", "price", "level", "language", "teacher_name", "average_rating", "rating_count", "enrollment_count", "lecture_count", "duration_total",]
+        select_related = ["teacher"]
+
+
+class EnrolledCourseCardSerializer(serializers.ModelSerializer):
+    # Student course list row; lectures, notes and Q&A stay on the detail endpoint
+    course = CourseCardSerializer(read_only=True)
+    lecture_count = serializers.IntegerField(source="course.lecture_count", read_only=True)
+    progress = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = api_models.EnrolledCourse
+        fields = ["id", "enrollment_id", "date", "course", "lecture_count", "completed_lessons", "progress", "last_lesson", "last_activity", "completed_at",]
+
+
+class CartLineSerializer(serializers.ModelSerializer):
+    # Compact cart row for the cart summary, course columns come from one join
+    title = serializers.CharField(source="course.title", read_only=True)
+    slug = serializers.SlugField(source="course.slug", read_only=True)
+    image = serializers.FileField(source="course.image", read_only=True)
+
+    class Meta:
+        model = api_models.Cart
+        fields = ["id", "course", "title", "slug", "image", "price", "tax_fee", "total",]
+
+
+class CartTotalsSerializer(serializers.Serializer):
+    price = serializers.DecimalField(max_digits=12, decimal_places=2)
+    tax = serializers.DecimalField(max_digits=12, decimal_places=2)
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
+    items_count = serializers.IntegerField()
+
+
+class CourseFilterSerializer(serializers.Serializer):
+    query = serializers.CharField(max_length=200, required=False, allow_blank=True)
+    category = serializers.SlugField(required=False)
+    level = serializers.ChoiceField(choices=api_models.LEVEL, required=False)
+    language = serializers.ChoiceField(choices=api_models.LANGUAGE, required=False)
+    price_min = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=0, required=False)
+    price_max = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=0, required=False)
+    featured = serializers.BooleanField(required=False, allow_null=True, default=None)
+    rating_min = serializers.FloatField(min_value=1, max_value=5, required=False)
+
+
+class CourseIdsSerializer(serializers.Serializer):
+    # ?course_id=1&course_id=2, at most one page of cards at a time
+    course_id = serializers.ListField(child=serializers.IntegerField(min_value=1), max_length=settings.API_MAX_PAGE_SIZE)
+
+
 class StudentSummarySerializer(serializers.Serializer): 
     total_courses = serializers.IntegerField(default=0)
+    in_progress_courses = serializers.IntegerField(default=0)
+    completed_courses = serializers.IntegerField(default=0)
     completed_lessons = serializers.IntegerField(default=0)
-    achieved_certificates = serializers.IntegerField(default=0)
\ No newline at end of file
+    achieved_certificates = serializers.IntegerField(default=0)
+    unseen_notifications = serializers.IntegerField(default=0)
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""
+Order workflows shared by the payment views, background tasks and webhooks.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+
+from api import cache as api_cache
+from api import models as api_models
+from api import realtime
+from api import stats
+
+
+@transaction.atomic
+def create_order(cart_id, student=None, full_name=None, email=None, country=None):
+    """
+    Turn a cart into a Processing order: one read of the cart, one INSERT for
+    the order with its totals, one bulk INSERT for the items and one M2M add.
+    """
+    lines = {}
+    sub_total = tax_fee = total = Decimal("0.00")
+    for line in api_models.Cart.objects.filter(cart_id=cart_id).select_related("course__teacher").order_by("date", "id"):
+        # A course carted twice is only ordered once
+        if line.course_id in lines:
+            continue
+        lines[line.course_id] = line
+        sub_total += line.price
+        tax_fee += line.tax_fee
+        total += line.total
+    lines = list(lines.values())
+
+    order = api_models.CartOrder.objects.create(
+        full_name=full_name,
+        email=email,
+        country=country,
+        student=student,
+        sub_total=sub_total,
+        tax_fee=tax_fee,
+        initial_total=total,
+        total=total,
+    )
+
+    api_models.CartOrderItem.objects.bulk_create([
+        api_models.CartOrderItem(
+            order=order,
+            course=line.course,
+            teacher=line.course.teacher,
+            price=line.price,
+            tax_fee=line.tax_fee,
+            total=line.total,
+            initial_total=line.total,
+        )
+        for line in lines
+    ])
+    order.teachers.add(*{line.course.teacher_id for line in lines})
+    return order
+
+
+def confirm_payment(order):
+    """
+    Mark a Processing order as Paid and queue its fulfilment. Returns False if
+    the order was already settled, so callers can report "Already Paid".
+    """
+    from api import tasks as api_tasks
+
+    if order.payment_status != "Processing":
+        return False
+
+    with transaction.atomic():
+        # Concurrent confirmations (browser retries, the webhook) queue up on
+        # the row lock and the losers see the order already Paid
+        locked = api_models.CartOrder.objects.select_for_update().only("payment_status").get(pk=order.pk)
+        if locked.payment_status != "Processing":
+            return False
+        order.payment_status = "Paid"
+        order.save(update_fields=["payment_status"])
+        api_tasks.fulfil_order.enqueue(order_id=order.pk, dedup_key=f"fulfil-order:{order.pk}")
+    return True
+
+
+@transaction.atomic
+def fulfil_order(order_id):
+    """
+    Enroll the student in every course of a Paid order and notify the student
+    and the teachers. Items that already have an enrollment are skipped, so
+    running it twice is harmless. The query count does not grow with the order.
+    """
+    order = api_models.CartOrder.objects.filter(pk=order_id, payment_status="Paid").select_related("student").first()
+    if order is None:
+        return []
+
+    order_items = list(api_models.CartOrderItem.objects.filter(order=order, enrolledcourse__isnull=True))
+    if not order_items:
+        return []
+
+    notifications = [
+        api_models.Notification(teacher_id=o.teacher_id, order=order, order_item=o, type="New Order")
+        for o in order_items
+    ]
+    notifications.append(api_models.Notification(user=order.student, order=order, type="Course Enrollment Completed"))
+    api_models.Notification.objects.bulk_create(notifications)
+    stats.add_notifications(notifications)
+    realtime.notifications_created(notifications)
+
+    enrollments = api_models.EnrolledCourse.objects.bulk_create([
+        api_models.EnrolledCourse(course_id=o.course_id, teacher_id=o.teacher_id, user=order.student, order_item=o)
+        for o in order_items
+    ])
+
+    # bulk_create skips the post_save handlers in api.signals, so do their work here
+    course_ids = [o.course_id for o in order_items]
+    stats.add_enrollments(course_ids)
+    stats.adjust_student(order.student_id, total_courses=len(enrollments))
+    tags = [api_cache.course_tag(course_id) for course_id in set(course_ids)]
+    transaction.on_commit(lambda: api_cache.invalidate_tags(api_cache.COURSE_LIST_TAG, *tags))
+    return enrollments
+
+
+class MalformedStripeEvent(ValueError):
+    """The payload can't be read as a Stripe event, so retrying won't help."""
+
+
+def receive_stripe_event(event, payload):
+    """Store a verified webhook in the inbox and wake the drain task. Redeliveries are ignored."""
+    from api import tasks as api_tasks
+
+    api_models.StripeEvent.objects.bulk_create(
+        [api_models.StripeEvent(event_id=event["id"], type=event.get("type", ""), payload=payload)],
+        ignore_conflicts=True,
+    )
+    # A burst of events shares one queued drain
+    api_tasks.drain_stripe_inbox.enqueue(dedup_key="stripe-inbox")
+
+
+PAID_SESSION_EVENTS = ("checkout.session.completed", "checkout.session.async_payment_succeeded")
+
+
+def apply_stripe_event(event):
+    try:
+        if event["type"] not in PAID_SESSION_EVENTS:
+            return
+        session = event["data"]["object"]
+        paid = session.get("payment_status") == "paid"
+    except (KeyError, TypeError, AttributeError) as e:
+        raise MalformedStripeEvent(f"Unexpected event shape: {e!r}") from e
+    if not paid:
+        return
+
+    orders = api_models.CartOrder.objects.all()
+    if session.get("client_reference_id"):
+        order = orders.filter(oid=session["client_reference_id"]).first()
+    else:
+        order = orders.filter(stripe_session_id=session["id"]).first()
+    if order is not None:
+        confirm_payment(order)
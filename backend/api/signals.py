@@ -0,0 +1,333 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+
+from api import cache as api_cache
+from api import models as api_models
+from api import realtime
+from api import reference
+from api import search
+from api import stats
+from api import suggest
+from userauths.models import Profile
+
+
+def index_course(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_course(instance)
+
+
+def unindex_course(sender, instance, **kwargs):
+    search.unindex_course(instance.pk)
+
+
+def reindex_related_courses(sender, instance, raw=False, **kwargs):
+    # Category titles and teacher names are part of each course document
+    if raw:
+        return
+    for course in instance.course_set.select_related("category", "teacher"):
+        search.index_course(course)
+
+
+def suggest_course(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if search.is_searchable(instance):
+        suggest.index.upsert("course", instance.pk, suggest.course_item(instance))
+    else:
+        suggest.index.remove("course", instance.pk)
+
+
+def suggest_category(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if instance.active:
+        suggest.index.upsert("category", instance.pk, suggest.category_item(instance))
+    else:
+        suggest.index.remove("category", instance.pk)
+
+
+def suggest_teacher(sender, instance, raw=False, **kwargs):
+    if not raw:
+        suggest.index.upsert("teacher", instance.pk, suggest.teacher_item(instance))
+
+
+def unsuggest(kind):
+    def receiver(sender, instance, **kwargs):
+        suggest.index.remove(kind, instance.pk)
+    return receiver
+
+
+def remember_previous(*fields):
+    # Stash the stored row so post_save can take back its old contribution
+    def receiver(sender, instance, raw=False, **kwargs):
+        instance._previous = None
+        if instance.pk and not raw:
+            instance._previous = sender.objects.filter(pk=instance.pk).values(*fields).first()
+    return receiver
+
+
+def count_course(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_previous", None)
+    if previous is None or previous["category_id"] != instance.category_id:
+        if previous:
+            stats.adjust_category(previous["category_id"], -1)
+        stats.adjust_category(instance.category_id, 1)
+
+
+def uncount_course(sender, instance, **kwargs):
+    stats.adjust_category(instance.category_id, -1)
+
+
+def count_review(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_previous", None)
+    # Ratings outside 1..5 have no counter column and are left out entirely,
+    # as rebuild_course_stats leaves them out
+    if previous and previous["active"]:
+        rating = stats.counted_rating(previous["rating"])
+        if rating is not None:
+            stats.add_review(previous["course_id"], rating, -1)
+    rating = stats.counted_rating(instance.rating)
+    if instance.active and rating is not None:
+        stats.add_review(instance.course_id, rating)
+
+
+def uncount_review(sender, instance, **kwargs):
+    rating = stats.counted_rating(instance.rating)
+    if instance.active and rating is not None:
+        stats.add_review(instance.course_id, rating, -1)
+
+
+def count_enrollment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.add_enrollments([instance.course_id])
+        stats.adjust_student(instance.user_id, total_courses=1)
+
+
+def uncount_enrollment(sender, instance, **kwargs):
+    stats.add_enrollments([instance.course_id], -1)
+    stats.adjust_student(instance.user_id, total_courses=-1)
+
+
+def count_completed_lesson(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.adjust_student(instance.user_id, completed_lessons=1)
+        stats.mark_lesson(instance.user_id, instance.course_id, instance.variant_item, 1)
+
+
+def uncount_completed_lesson(sender, instance, **kwargs):
+    stats.adjust_student(instance.user_id, completed_lessons=-1)
+    # A duplicate row (admin, old double clicks) still marks the lesson done
+    duplicates = api_models.CompletedLesson.objects.filter(user_id=instance.user_id, course_id=instance.course_id, variant_item_id=instance.variant_item_id)
+    if not duplicates.exists():
+        stats.mark_lesson(instance.user_id, instance.course_id, instance.variant_item, -1)
+
+
+def count_reply(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.add_reply(instance.question_id, instance.date)
+
+
+def uncount_reply(sender, instance, **kwargs):
+    stats.add_reply(instance.question_id, instance.date, -1)
+
+
+def push_question(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        realtime.question_created(instance)
+
+
+def push_message(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        realtime.message_created(instance)
+
+
+def push_notification(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        realtime.notifications_created([instance])
+
+
+def count_notification(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_previous", None)
+    if previous and (previous["seen"], previous["user_id"], previous["teacher_id"]) == (instance.seen, instance.user_id, instance.teacher_id):
+        return
+    if previous:
+        stats.add_notifications([api_models.Notification(**previous)], -1)
+    stats.add_notifications([instance])
+
+
+def uncount_notification(sender, instance, **kwargs):
+    stats.add_notifications([instance], -1)
+
+
+def count_certificate(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.adjust_student(instance.user_id, achieved_certificates=1)
+
+
+def uncount_certificate(sender, instance, **kwargs):
+    stats.adjust_student(instance.user_id, achieved_certificates=-1)
+
+
+def flag_lecture_for_probe(sender, instance, raw=False, **kwargs):
+    # Media is probed offline by `manage.py probe_media`, never in the request
+    if raw or not instance.url:
+        return
+    previous = getattr(instance, "_previous", None)
+    if previous is None or previous["url"] != instance.url:
+        instance.probe_status = "Pending"
+
+
+def number_lecture(sender, instance, raw=False, **kwargs):
+    # A lecture keeps its position for life, unless it moves to another course
+    if raw:
+        return
+    previous = getattr(instance, "_previous", None)
+    if instance.position is None or (previous and previous["variant__course_id"] != instance.variant.course_id):
+        instance.position = stats.next_lecture_position(instance.variant.course_id)
+
+
+def count_lecture(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_previous", None)
+    course_id = instance.variant.course_id
+    if previous and previous["variant_id"] == instance.variant_id:
+        delta = instance.duration_seconds - previous["duration_seconds"]
+        stats.adjust_course(course_id, duration_total=delta)
+        stats.adjust_variant(instance.variant_id, delta)
+        return
+    if previous:
+        stats.add_lecture(previous["variant__course_id"], previous["variant_id"], previous["duration_seconds"], -1)
+    stats.add_lecture(course_id, instance.variant_id, instance.duration_seconds)
+    # A new lecture can reopen finished enrollments, a moved one finish them
+    stats.recheck_completion(course_id)
+    if previous and previous["variant__course_id"] != course_id:
+        stats.recheck_completion(previous["variant__course_id"])
+
+
+def remember_lecture_course(sender, instance, **kwargs):
+    # Cascades may delete the variant before post_delete runs
+    instance._deleted_course_id = api_models.Variant.objects.filter(pk=instance.variant_id).values_list("course_id", flat=True).first()
+
+
+def uncount_lecture(sender, instance, **kwargs):
+    course_id = getattr(instance, "_deleted_course_id", None)
+    stats.add_lecture(course_id, instance.variant_id, instance.duration_seconds, -1)
+    stats.recheck_completion(course_id)
+
+
+def invalidate_course(sender, instance, **kwargs):
+    # Categories carry course_count
+    api_cache.invalidate_tags(api_cache.course_tag(instance.pk), api_cache.COURSE_LIST_TAG, api_cache.CATEGORIES_TAG)
+    reference.categories.invalidate()
+
+
+def invalidate_course_of(sender, instance, **kwargs):
+    # Variant, Review and EnrolledCourse rows are all part of their course's detail payload
+    api_cache.invalidate_tags(api_cache.course_tag(instance.course_id), api_cache.COURSE_LIST_TAG)
+
+
+def invalidate_course_detail(sender, instance, **kwargs):
+    # Nested under the enrollments in the course detail payload, but on no card
+    api_cache.invalidate_tags(api_cache.course_tag(instance.course_id))
+
+
+def invalidate_category_courses(sender, instance, **kwargs):
+    # Course detail payloads embed their category. Runs before a delete too,
+    # while the courses still point at it
+    course_ids = api_models.Course.objects.filter(category=instance).values_list("pk", flat=True)
+    api_cache.invalidate_tags(*[api_cache.course_tag(course_id) for course_id in course_ids])
+
+
+def invalidate_profile_courses(sender, instance, **kwargs):
+    # Reviews and Q&A in course detail payloads embed their author's profile
+    course_ids = set()
+    for model in (api_models.Review, api_models.Question_Answer, api_models.Question_Answer_Message):
+        course_ids.update(model.objects.filter(user_id=instance.user_id).values_list("course_id", flat=True))
+    api_cache.invalidate_tags(*[api_cache.course_tag(course_id) for course_id in course_ids])
+
+
+def invalidate_lecture_course(sender, instance, **kwargs):
+    course_ids = {getattr(instance, "_deleted_course_id", None) or instance.variant.course_id}
+    previous = getattr(instance, "_previous", None)
+    if previous:
+        course_ids.add(previous["variant__course_id"])
+    api_cache.invalidate_tags(api_cache.COURSE_LIST_TAG, *[api_cache.course_tag(course_id) for course_id in course_ids])
+
+
+def invalidate_teacher(sender, instance, **kwargs):
+    api_cache.invalidate_tags(api_cache.teacher_tag(instance.pk), api_cache.COURSE_LIST_TAG)
+
+
+def invalidate_categories(sender, instance, **kwargs):
+    api_cache.invalidate_tags(api_cache.CATEGORIES_TAG, api_cache.COURSE_LIST_TAG)
+    reference.categories.invalidate()
+
+
+def invalidate_countries(sender, instance, **kwargs):
+    reference.countries.invalidate()
+
+
+post_save.connect(index_course, sender=api_models.Course)
+post_delete.connect(unindex_course, sender=api_models.Course)
+post_save.connect(reindex_related_courses, sender=api_models.Category)
+post_save.connect(reindex_related_courses, sender=api_models.Teacher)
+
+post_save.connect(suggest_course, sender=api_models.Course)
+post_save.connect(suggest_category, sender=api_models.Category)
+post_save.connect(suggest_teacher, sender=api_models.Teacher)
+post_delete.connect(unsuggest("course"), sender=api_models.Course, weak=False)
+post_delete.connect(unsuggest("category"), sender=api_models.Category, weak=False)
+post_delete.connect(unsuggest("teacher"), sender=api_models.Teacher, weak=False)
+
+pre_save.connect(remember_previous("category_id"), sender=api_models.Course, weak=False)
+post_save.connect(count_course, sender=api_models.Course)
+post_delete.connect(uncount_course, sender=api_models.Course)
+pre_save.connect(remember_previous("course_id", "active", "rating"), sender=api_models.Review, weak=False)
+post_save.connect(count_review, sender=api_models.Review)
+post_delete.connect(uncount_review, sender=api_models.Review)
+post_save.connect(count_enrollment, sender=api_models.EnrolledCourse)
+post_delete.connect(uncount_enrollment, sender=api_models.EnrolledCourse)
+post_save.connect(count_completed_lesson, sender=api_models.CompletedLesson)
+post_delete.connect(uncount_completed_lesson, sender=api_models.CompletedLesson)
+post_save.connect(count_reply, sender=api_models.Question_Answer_Message)
+post_delete.connect(uncount_reply, sender=api_models.Question_Answer_Message)
+post_save.connect(push_question, sender=api_models.Question_Answer)
+post_save.connect(push_message, sender=api_models.Question_Answer_Message)
+post_save.connect(push_notification, sender=api_models.Notification)
+pre_save.connect(remember_previous("seen", "user_id", "teacher_id"), sender=api_models.Notification, weak=False)
+post_save.connect(count_notification, sender=api_models.Notification)
+post_delete.connect(uncount_notification, sender=api_models.Notification)
+post_save.connect(count_certificate, sender=api_models.Certificate)
+post_delete.connect(uncount_certificate, sender=api_models.Certificate)
+pre_save.connect(remember_previous("variant_id", "variant__course_id", "duration_seconds", "url"), sender=api_models.VariantItem, weak=False)
+pre_save.connect(flag_lecture_for_probe, sender=api_models.VariantItem)
+pre_save.connect(number_lecture, sender=api_models.VariantItem)
+post_save.connect(count_lecture, sender=api_models.VariantItem)
+pre_delete.connect(remember_lecture_course, sender=api_models.VariantItem)
+post_delete.connect(uncount_lecture, sender=api_models.VariantItem)
+
+for model in (api_models.Variant, api_models.Review, api_models.EnrolledCourse):
+    post_save.connect(invalidate_course_of, sender=model)
+    post_delete.connect(invalidate_course_of, sender=model)
+for model in (api_models.Note, api_models.CompletedLesson, api_models.Question_Answer, api_models.Question_Answer_Message):
+    post_save.connect(invalidate_course_detail, sender=model)
+    post_delete.connect(invalidate_course_detail, sender=model)
+post_save.connect(invalidate_course, sender=api_models.Course)
+post_delete.connect(invalidate_course, sender=api_models.Course)
+post_save.connect(invalidate_lecture_course, sender=api_models.VariantItem)
+post_delete.connect(invalidate_lecture_course, sender=api_models.VariantItem)
+post_save.connect(invalidate_teacher, sender=api_models.Teacher)
+post_delete.connect(invalidate_teacher, sender=api_models.Teacher)
+post_save.connect(invalidate_categories, sender=api_models.Category)
+post_delete.connect(invalidate_categories, sender=api_models.Category)
+post_save.connect(invalidate_category_courses, sender=api_models.Category)
+pre_delete.connect(invalidate_category_courses, sender=api_models.Category)
+post_save.connect(invalidate_profile_courses, sender=Profile)
+post_save.connect(invalidate_countries, sender=api_models.Country)
+post_delete.connect(invalidate_countries, sender=api_models.Country)
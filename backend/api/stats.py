@@ -0,0 +1,366 @@
+"""
+Denormalized counters on Course, Variant, Category, Question_Answer, Teacher
+and StudentStats, and the progress kept on each EnrolledCourse.
+
+Writes apply deltas with F() expressions in a single UPDATE, so concurrent
+writers never lose increments and read paths never aggregate on the fly.
+`rebuild_course_stats` recomputes everything from the source tables.
+"""
+from django.db import models, transaction
+from django.db.models import functions
+from django.utils import timezone
+
+from api import models as api_models
+from userauths.models import User
+
+
+def adjust_course(course_id, **deltas):
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if course_id is None or not deltas:
+        return
+    api_models.Course.objects.filter(pk=course_id).update(
+        **{field: models.F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def adjust_category(category_id, delta):
+    if category_id is None or not delta:
+        return
+    api_models.Category.objects.filter(pk=category_id).update(course_count=models.F("course_count") + delta)
+
+
+def adjust_variant(variant_id, duration_delta):
+    if variant_id is None or not duration_delta:
+        return
+    api_models.Variant.objects.filter(pk=variant_id).update(duration_total=models.F("duration_total") + duration_delta)
+
+
+RATINGS = tuple(rating for rating, _ in api_models.RATING)
+
+
+def counted_rating(rating):
+    """The rating as an int if it is one the counters track, else None."""
+    try:
+        rating = int(rating)
+    except (TypeError, ValueError):
+        return None
+    return rating if rating in RATINGS else None
+
+
+def review_deltas(rating, sign):
+    return {"rating_sum": sign * rating, "rating_count": sign, f"rating_{rating}": sign}
+
+
+def add_review(course_id, rating, sign=1):
+    adjust_course(course_id, **review_deltas(rating, sign))
+
+
+def _adjust_many(queryset, field, counts):
+    # One UPDATE per distinct delta, rather than one per row
+    by_delta = {}
+    for pk, delta in counts.items():
+        if pk is not None and delta:
+            by_delta.setdefault(delta, []).append(pk)
+    for delta, ids in by_delta.items():
+        queryset.filter(pk__in=ids).update(**{field: models.F(field) + delta})
+
+
+def add_enrollments(course_ids, sign=1):
+    counts = {}
+    for course_id in course_ids:
+        counts[course_id] = counts.get(course_id, 0) + sign
+    # An order enrolls each course once, so usually just one UPDATE
+    _adjust_many(api_models.Course.objects.all(), "enrollment_count", counts)
+
+
+def add_lecture(course_id, variant_id, duration_seconds, sign=1):
+    adjust_course(course_id, lecture_count=sign, duration_total=sign * duration_seconds)
+    adjust_variant(variant_id, sign * duration_seconds)
+
+
+def add_reply(question_id, date, sign=1):
+    if question_id is None:
+        return
+    updates = {"reply_count": models.F("reply_count") + sign}
+    if sign > 0:
+        updates["last_activity"] = functions.Greatest("last_activity", models.Value(date))
+    api_models.Question_Answer.objects.filter(pk=question_id).update(**updates)
+
+
+def adjust_student(user_id, **deltas):
+    # Only rows that exist are kept current; a missing row is built from the
+    # source tables on first read, see student_stats()
+    deltas = {field: models.F(field) + delta for field, delta in deltas.items() if delta}
+    if user_id is None or not deltas:
+        return
+    api_models.StudentStats.objects.filter(pk=user_id).update(**deltas)
+
+
+def add_notifications(notifications, sign=1):
+    """Count unseen notifications for their students and teachers."""
+    students, teachers = {}, {}
+    for notification in notifications:
+        if notification.seen:
+            continue
+        students[notification.user_id] = students.get(notification.user_id, 0) + sign
+        teachers[notification.teacher_id] = teachers.get(notification.teacher_id, 0) + sign
+    # Like adjust_student, only StudentStats rows that exist are kept current
+    _adjust_many(api_models.StudentStats.objects.all(), "unseen_notifications", students)
+    _adjust_many(api_models.Teacher.objects.all(), "unseen_notifications", teachers)
+
+
+def mark_notifications_seen(user_id=None, teacher_id=None):
+    """Mark all unseen notifications of a student or a teacher as seen."""
+    if teacher_id is not None:
+        notifications = api_models.Notification.objects.filter(teacher_id=teacher_id)
+        counter = api_models.Teacher.objects.filter(pk=teacher_id)
+        other, other_counters = "user_id", api_models.StudentStats.objects.all()
+    else:
+        notifications = api_models.Notification.objects.filter(user_id=user_id)
+        counter = api_models.StudentStats.objects.filter(pk=user_id)
+        other, other_counters = "teacher_id", api_models.Teacher.objects.all()
+    with transaction.atomic():
+        # A row can name both a student and a teacher, and then counts as
+        # unseen for both; lock the rows so the other side drops by exactly
+        # the ones flipped here
+        rows = list(notifications.filter(seen=False).select_for_update().values_list("pk", other))
+        if not rows:
+            return 0
+        updated = api_models.Notification.objects.filter(pk__in=[pk for pk, _ in rows]).update(seen=True)
+        counter.update(unseen_notifications=functions.Greatest(models.F("unseen_notifications") - updated, 0))
+        others = {}
+        for _, other_id in rows:
+            others[other_id] = others.get(other_id, 0) - 1
+        _adjust_many(other_counters, "unseen_notifications", others)
+    return updated
+
+
+def unseen_notifications(user_id=None, teacher_id=None):
+    if teacher_id is not None:
+        return api_models.Teacher.objects.filter(pk=teacher_id).values_list("unseen_notifications", flat=True).first()
+    row = student_stats(user_id)
+    return None if row is None else row.unseen_notifications
+
+
+def next_lecture_position(course_id):
+    with transaction.atomic():
+        # The UPDATE holds the course row until commit, so no two lectures share a position
+        api_models.Course.objects.filter(pk=course_id).update(lecture_seq=models.F("lecture_seq") + 1)
+        seq = api_models.Course.objects.filter(pk=course_id).values_list("lecture_seq", flat=True).first()
+    return None if seq is None else seq - 1
+
+
+def set_bit(bits, position, on):
+    """Return bits with the flag at position set or cleared, and whether that changed it."""
+    bits = bytearray(bits or b"")
+    index, mask = position // 8, 1 << (position % 8)
+    if bool(index < len(bits) and bits[index] & mask) == on:
+        return bytes(bits), False
+    if on:
+        bits.extend(b"\0" * (index + 1 - len(bits)))
+        bits[index] |= mask
+    else:
+        bits[index] &= ~mask
+    return bytes(bits.rstrip(b"\0")), True
+
+
+def mark_lesson(user_id, course_id, lesson, sign):
+    """
+    Record a lesson as completed (sign=1) or not (sign=-1) on the user's
+    enrollments in the course, and move completed_courses when that crossed
+    the finish line. One locked read and one UPDATE per enrollment.
+    """
+    if user_id is None or lesson.position is None:
+        return
+    now = timezone.now()
+    finished = 0
+    with transaction.atomic():
+        enrollments = (
+            api_models.EnrolledCourse.objects.select_for_update(of=("self",))
+            .filter(user_id=user_id, course_id=course_id)
+            .select_related("course")
+            .only("completed_lessons", "completed_bits", "completed_at", "course__lecture_count")
+        )
+        for enrollment in enrollments:
+            bits, changed = set_bit(enrollment.completed_bits, lesson.position, sign > 0)
+            if not changed:
+                continue
+            done = enrollment.completed_lessons + sign
+            lecture_count = enrollment.course.lecture_count
+            completed_at = (enrollment.completed_at or now) if lecture_count and done >= lecture_count else None
+            finished += (completed_at is not None) - (enrollment.completed_at is not None)
+            update = {"completed_lessons": done, "completed_bits": bits, "completed_at": completed_at, "last_activity": now}
+            if sign > 0:
+                update["last_lesson"] = lesson
+            api_models.EnrolledCourse.objects.filter(pk=enrollment.pk).update(**update)
+        adjust_student(user_id, completed_courses=finished)
+
+
+def recheck_completion(course_id):
+    """
+    Re-evaluate which enrollments in the course are complete after its
+    lecture count changed, moving completed_at and completed_courses to match.
+    """
+    if course_id is None:
+        return
+    with transaction.atomic():
+        lecture_count = api_models.Course.objects.filter(pk=course_id).values_list("lecture_count", flat=True).first()
+        if lecture_count is None:
+            return
+        enrollments = api_models.EnrolledCourse.objects.select_for_update().filter(course_id=course_id)
+        if lecture_count:
+            finished = enrollments.filter(completed_at__isnull=True, completed_lessons__gte=lecture_count)
+            reopened = enrollments.filter(completed_at__isnull=False, completed_lessons__lt=lecture_count)
+        else:
+            finished = enrollments.none()
+            reopened = enrollments.filter(completed_at__isnull=False)
+        finished = list(finished.values_list("pk", "user_id"))
+        reopened = list(reopened.values_list("pk", "user_id"))
+        if not finished and not reopened:
+            return
+
+        counts = {}
+        for _, user_id in finished:
+            counts[user_id] = counts.get(user_id, 0) + 1
+        for _, user_id in reopened:
+            counts[user_id] = counts.get(user_id, 0) - 1
+        # Same completion time rebuild_course_stats gives a finished enrollment
+        api_models.EnrolledCourse.objects.filter(pk__in=[pk for pk, _ in finished]).update(
+            completed_at=functions.Coalesce("last_activity", models.Value(timezone.now()))
+        )
+        api_models.EnrolledCourse.objects.filter(pk__in=[pk for pk, _ in reopened]).update(completed_at=None)
+        _adjust_many(api_models.StudentStats.objects.all(), "completed_courses", counts)
+
+
+def student_stats(user_id):
+    row = api_models.StudentStats.objects.filter(pk=user_id).first()
+    if row is None:
+        rebuild_student_stats([user_id])
+        row = api_models.StudentStats.objects.filter(pk=user_id).first()
+    return row
+
+
+def _count(queryset, group_by, value=None):
+    aggregate = models.Sum(value) if value else models.Count("id")
+    return functions.Coalesce(
+        models.Subquery(queryset.order_by().values(group_by).annotate(value=aggregate).values("value")[:1]),
+        0,
+    )
+
+
+def rebuild_course_stats():
+    rebuild_lecture_positions()
+
+    # Lecture durations are parsed from their free-form text in Python first,
+    # then every counter is recomputed with one UPDATE per table.
+    lectures = api_models.VariantItem.objects.only("id", "duration", "duration_seconds")
+    changed = []
+    for lecture in lectures.iterator(chunk_size=2000):
+        seconds = api_models.duration_to_seconds(lecture.duration)
+        if seconds != lecture.duration_seconds:
+            lecture.duration_seconds = seconds
+            changed.append(lecture)
+    api_models.VariantItem.objects.bulk_update(changed, ["duration_seconds"], batch_size=1000)
+
+    reviews = api_models.Review.objects.filter(course=models.OuterRef("pk"), active=True, rating__in=RATINGS)
+    lectures = api_models.VariantItem.objects.filter(variant__course=models.OuterRef("pk"))
+    updates = {
+        "rating_sum": _count(reviews, "course", "rating"),
+        "rating_count": _count(reviews, "course"),
+        "enrollment_count": _count(api_models.EnrolledCourse.objects.filter(course=models.OuterRef("pk")), "course"),
+        "lecture_count": _count(lectures, "variant__course"),
+        "duration_total": _count(lectures, "variant__course", "duration_seconds"),
+    }
+    for rating in RATINGS:
+        updates[f"rating_{rating}"] = _count(reviews.filter(rating=rating), "course")
+    api_models.Course.objects.update(**updates)
+
+    api_models.Variant.objects.update(
+        duration_total=_count(api_models.VariantItem.objects.filter(variant=models.OuterRef("pk")), "variant", "duration_seconds")
+    )
+
+    api_models.Category.objects.update(
+        course_count=_count(api_models.Course.objects.filter(category=models.OuterRef("pk")), "category")
+    )
+
+    api_models.Teacher.objects.update(
+        unseen_notifications=_count(api_models.Notification.objects.filter(teacher=models.OuterRef("pk"), seen=False), "teacher")
+    )
+
+    messages = api_models.Question_Answer_Message.objects.filter(question=models.OuterRef("pk"))
+    latest = messages.order_by("-date").values("date")[:1]
+    api_models.Question_Answer.objects.update(
+        reply_count=_count(messages, "question"),
+        last_activity=functions.Coalesce(models.Subquery(latest), "date"),
+    )
+
+
+def rebuild_lecture_positions():
+    # Number lectures that have no position yet, after the highest one handed out
+    lectures = api_models.VariantItem.objects.filter(position__isnull=True).order_by("variant__course_id", "variant_id", "id")
+    seqs = dict(api_models.Course.objects.values_list("pk", "lecture_seq"))
+    changed, courses = [], set()
+    for lecture in lectures.only("id", "variant__course_id").select_related("variant").iterator(chunk_size=2000):
+        course_id = lecture.variant.course_id
+        lecture.position = seqs[course_id]
+        seqs[course_id] += 1
+        changed.append(lecture)
+        courses.add(course_id)
+    api_models.VariantItem.objects.bulk_update(changed, ["position"], batch_size=1000)
+    api_models.Course.objects.bulk_update(
+        [api_models.Course(pk=pk, lecture_seq=seqs[pk]) for pk in courses], ["lecture_seq"], batch_size=1000,
+    )
+
+
+def rebuild_progress(user_ids=None):
+    """Recompute the progress fields of enrollments from their CompletedLesson rows."""
+    lessons = api_models.CompletedLesson.objects.filter(user__isnull=False)
+    enrollments = api_models.EnrolledCourse.objects.filter(user__isnull=False)
+    if user_ids is not None:
+        lessons = lessons.filter(user_id__in=user_ids)
+        enrollments = enrollments.filter(user_id__in=user_ids)
+
+    progress = {}
+    rows = lessons.order_by("date", "id").values_list("user_id", "course_id", "variant_item_id", "variant_item__position", "date")
+    for user_id, course_id, lesson_id, position, date in rows.iterator(chunk_size=2000):
+        entry = progress.setdefault((user_id, course_id), {"bits": b"", "count": 0})
+        if position is not None:
+            entry["bits"], changed = set_bit(entry["bits"], position, True)
+            entry["count"] += changed
+        entry["last_lesson"], entry["last_activity"] = lesson_id, date
+
+    changed = []
+    for enrollment in enrollments.select_related("course").only("user_id", "course_id", "completed_at", "course__lecture_count").iterator(chunk_size=2000):
+        entry = progress.get((enrollment.user_id, enrollment.course_id), {"bits": b"", "count": 0})
+        lecture_count = enrollment.course.lecture_count
+        enrollment.completed_lessons = entry["count"]
+        enrollment.completed_bits = entry["bits"]
+        enrollment.last_lesson_id = entry.get("last_lesson")
+        enrollment.last_activity = entry.get("last_activity")
+        if not lecture_count or entry["count"] < lecture_count:
+            enrollment.completed_at = None
+        elif enrollment.completed_at is None:
+            enrollment.completed_at = entry["last_activity"]
+        changed.append(enrollment)
+    api_models.EnrolledCourse.objects.bulk_update(
+        changed, ["completed_lessons", "completed_bits", "last_lesson", "last_activity", "completed_at"], batch_size=1000,
+    )
+
+
+def rebuild_student_stats(user_ids=None):
+    users = User.objects.all() if user_ids is None else User.objects.filter(pk__in=user_ids)
+    api_models.StudentStats.objects.bulk_create(
+        [api_models.StudentStats(user_id=pk) for pk in users.values_list("pk", flat=True)],
+        ignore_conflicts=True, batch_size=1000,
+    )
+
+    enrollments = api_models.EnrolledCourse.objects.filter(user=models.OuterRef("pk"))
+    finished = enrollments.filter(course__lecture_count__gt=0, completed_lessons__gte=models.F("course__lecture_count"))
+    rows = api_models.StudentStats.objects.all() if user_ids is None else api_models.StudentStats.objects.filter(pk__in=user_ids)
+    rows.update(
+        total_courses=_count(enrollments, "user"),
+        completed_courses=_count(finished, "user"),
+        completed_lessons=_count(api_models.CompletedLesson.objects.filter(user=models.OuterRef("pk")), "user"),
+        achieved_certificates=_count(api_models.Certificate.objects.filter(user=models.OuterRef("pk")), "user"),
+        unseen_notifications=_count(api_models.Notification.objects.filter(user=models.OuterRef("pk"), seen=False), "user"),
+    )
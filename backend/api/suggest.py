@@ -0,0 +1,138 @@
+import bisect
+import re
+import threading
+
+from django.core.cache import cache
+
+from api import models as api_models
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+VERSION_KEY = "suggest:version"
+
+
+def normalize(text):
+    return " ".join(re.findall(r"\w+", (text or "").lower()))
+
+
+def index_keys(label):
+    # Every word start is a key, so "djan" finds "Advanced Django Patterns"
+    words = normalize(label).split()
+    return [" ".join(words[start:]) for start in range(len(words))]
+
+
+class SuggestionIndex:
+    """
+    Process-local typeahead index over course titles, category titles and
+    teacher names, kept as a sorted list of (key, kind, pk) rows. A lookup is a
+    bisect to the first row with the prefix followed by a short forward scan.
+
+    Writes made in this process patch the rows in place. Other processes see
+    the bumped version stamp in the shared cache and reload on their next
+    lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (rows, items), replaced whole and never mutated, so readers load it once
+        self._snapshot = ((), {})
+        self._version = None
+
+    def suggest(self, prefix, limit=DEFAULT_LIMIT):
+        self._ensure_fresh()
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        # One load of the snapshot; rows and items always belong together
+        rows, items = self._snapshot
+        results = []
+        seen = set()
+        position = bisect.bisect_left(rows, (prefix,))
+        while position < len(rows) and rows[position][0].startswith(prefix) and len(results) < limit:
+            item_id = rows[position][1:]
+            if item_id not in seen:
+                seen.add(item_id)
+                results.append(items[item_id])
+            position += 1
+        return results
+
+    def upsert(self, kind, pk, item):
+        with self._lock:
+            if self._version is None:
+                return
+            rows, items = self._without(kind, pk)
+            for key in index_keys(item["label"]):
+                bisect.insort(rows, (key, kind, pk))
+            items[(kind, pk)] = item
+            self._publish(rows, items)
+
+    def remove(self, kind, pk):
+        with self._lock:
+            if self._version is None or (kind, pk) not in self._snapshot[1]:
+                return
+            self._publish(*self._without(kind, pk))
+
+    def reload(self):
+        items = {}
+        for course in api_models.Course.objects.published().only("id", "title", "slug"):
+            items[("course", course.pk)] = course_item(course)
+        for category in api_models.Category.objects.filter(active=True).only("id", "title", "slug"):
+            items[("category", category.pk)] = category_item(category)
+        for teacher in api_models.Teacher.objects.only("id", "full_name"):
+            items[("teacher", teacher.pk)] = teacher_item(teacher)
+
+        rows = sorted((key, kind, pk) for (kind, pk), item in items.items() for key in index_keys(item["label"]))
+
+        with self._lock:
+            self._snapshot = (tuple(rows), items)
+            self._version = current_version()
+
+    def _ensure_fresh(self):
+        if self._version is None or self._version != current_version():
+            self.reload()
+
+    def _without(self, kind, pk):
+        rows, items = self._snapshot
+        rows, items = list(rows), dict(items)
+        previous = items.pop((kind, pk), None)
+        if previous:
+            for key in index_keys(previous["label"]):
+                position = bisect.bisect_left(rows, (key, kind, pk))
+                if position < len(rows) and rows[position] == (key, kind, pk):
+                    del rows[position]
+        return rows, items
+
+    def _publish(self, rows, items):
+        self._snapshot = (tuple(rows), items)
+        expected = self._version + 1
+        # Another process wrote in between, so our copy is missing its change
+        self._version = expected if bump_version() == expected else None
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_version():
+    cache.add(VERSION_KEY, 1, None)
+    return cache.incr(VERSION_KEY)
+
+
+def course_item(course):
+    return {"type": "course", "label": course.title, "slug": course.slug}
+
+
+def category_item(category):
+    return {"type": "category", "label": category.title, "slug": category.slug}
+
+
+def teacher_item(teacher):
+    return {"type": "teacher", "label": teacher.full_name, "id": teacher.pk}
+
+
+index = SuggestionIndex()
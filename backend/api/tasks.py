@@ -0,0 +1,92 @@
+import json
+import logging
+import traceback
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from api import models as api_models
+from api import services
+from core.taskqueue import backoff, task
+from userauths.models import User
+
+logger = logging.getLogger(__name__)
+
+
+@task()
+def send_password_reset_email(user_id):
+    user = User.objects.filter(pk=user_id).first()
+    if user is None or not user.otp:
+        return
+
+    # Built from the stored OTP and token, so the payload carries no secrets
+    link = f"http://localhost:5173/create-new-password/?otp={user.otp}&uuidb64={user.pk}&refresh_token={user.refresh_token}"
+    context = {
+        "link": link,
+        "username": user.username,
+    }
+
+    msg = EmailMultiAlternatives(
+        subject="Password Reset Email",
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[user.email],
+        body=render_to_string("email/password_reset.txt", context),
+    )
+    msg.attach_alternative(render_to_string("email/password_reset.html", context), "text/html")
+    msg.send()
+
+
+@task()
+def fulfil_order(order_id):
+    services.fulfil_order(order_id)
+
+
+@task()
+def drain_stripe_inbox(batch_size=100):
+    while True:
+        now = timezone.now()
+        pending = api_models.StripeEvent.objects.filter(processed_at__isnull=True, retry_after__lte=now)
+        events = list(pending.order_by("id")[:batch_size])
+        if not events:
+            break
+        applied = []
+        for event in events:
+            try:
+                # A savepoint per event, so one failing event doesn't halt the inbox
+                with transaction.atomic():
+                    services.apply_stripe_event(json.loads(event.payload))
+            except (json.JSONDecodeError, services.MalformedStripeEvent):
+                logger.exception("Stripe event %s is malformed, setting it aside", event.event_id)
+                set_event_aside(event, now)
+            except Exception:
+                # Possibly transient (a locked or unreachable database), so try again later
+                if event.attempts + 1 >= settings.STRIPE_INBOX_MAX_ATTEMPTS:
+                    logger.exception("Stripe event %s failed %s times, setting it aside", event.event_id, event.attempts + 1)
+                    set_event_aside(event, now)
+                    continue
+                logger.warning("Stripe event %s failed, will retry", event.event_id, exc_info=True)
+                api_models.StripeEvent.objects.filter(pk=event.pk).update(
+                    attempts=F("attempts") + 1, retry_after=now + backoff(event.attempts + 1), last_error=traceback.format_exc(),
+                )
+            else:
+                applied.append(event.pk)
+        api_models.StripeEvent.objects.filter(pk__in=applied).update(processed_at=timezone.now(), attempts=F("attempts") + 1)
+
+    retry_at = (
+        api_models.StripeEvent.objects.filter(processed_at__isnull=True)
+        .order_by("retry_after").values_list("retry_after", flat=True).first()
+    )
+    if retry_at is not None:
+        # Not under "stripe-inbox", which must stay free for drains woken by new webhooks
+        delay = max((retry_at - timezone.now()).total_seconds(), 0)
+        drain_stripe_inbox.enqueue(dedup_key="stripe-inbox-retry", delay=delay)
+
+
+def set_event_aside(event, now):
+    api_models.StripeEvent.objects.filter(pk=event.pk).update(
+        processed_at=now, attempts=F("attempts") + 1, last_error=traceback.format_exc(),
+    )
@@ -1,3 +1,1297 @@
-from django.test import TestCase
+import asyncio
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from http.server import ThreadingHTTPServer
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from rest_framework.test import APIClient
+
+from api import media
+from api import models as api_models
+from api import payments
+from api import realtime
+from api import reference
+from api import services
+from api import stats
+from api import suggest
+from api import tasks as api_tasks
+from api.management.commands.payment_stub import StubHandler
+from api.management.commands.probe_media import Command as ProbeMediaCommand
+from core import pubsub
+from core.models import Task
+from userauths.models import User
+
+
+def make_user(name):
+    return User.objects.create(email=f"{name}@example.com", username=name, full_name=name.title())
+
+
+class CatalogMixin:
+    def setUp(self):
+        # Cached payloads and tag versions would otherwise outlive each test's rows
+        cache.clear()
+        teacher_user = make_user("teacher")
+        self.teacher = api_models.Teacher.objects.create(user=teacher_user, full_name="Teacher")
+        self.category = api_models.Category.objects.create(title="Web Development")
+        self.students = [make_user(f"student{i}") for i in range(3)]
+
+    def make_course(self, title, lectures=3, price="10.00"):
+        course = api_models.Course.objects.create(
+            category=self.category, teacher=self.teacher, title=title, price=Decimal(price),
+        )
+        variant = api_models.Variant.objects.create(course=course, title="Intro")
+        for i in range(lectures):
+            api_models.VariantItem.objects.create(variant=variant, title=f"Lecture {i}", duration="05:30")
+        return course
+
+    def enroll(self, course, user):
+        order = api_models.CartOrder.objects.create(student=user)
+        item = api_models.CartOrderItem.objects.create(order=order, course=course, teacher=self.teacher, price=course.price)
+        return api_models.EnrolledCourse.objects.create(course=course, user=user, teacher=self.teacher, order_item=item)
+
+
+class CounterSignalTests(CatalogMixin, TestCase):
+    """The counters kept by api.signals must agree with a full rebuild."""
+
+    def course_counters(self):
+        return list(api_models.Course.objects.order_by("pk").values(
+            "pk", "rating_sum", "rating_count", "rating_1", "rating_2", "rating_3", "rating_4", "rating_5",
+            "enrollment_count", "lecture_count", "duration_total",
+        ))
+
+    def other_counters(self):
+        return (
+            list(api_models.Category.objects.order_by("pk").values_list("pk", "course_count")),
+            list(api_models.Variant.objects.order_by("pk").values_list("pk", "duration_total")),
+            list(api_models.Question_Answer.objects.order_by("pk").values_list("pk", "reply_count")),
+            [
+                (pk, lessons, completed_at is not None)
+                for pk, lessons, completed_at in api_models.EnrolledCourse.objects.order_by("pk").values_list(
+                    "pk", "completed_lessons", "completed_at",
+                )
+            ],
+        )
+
+    def student_counters(self):
+        return list(api_models.StudentStats.objects.order_by("pk").values_list("pk", "total_courses", "completed_courses"))
+
+    def assertMatchesRebuild(self):
+        counters = (self.course_counters(), self.other_counters(), self.student_counters())
+        call_command("rebuild_course_stats", stdout=StringIO())
+        call_command("rebuild_student_stats", stdout=StringIO())
+        self.assertEqual(counters, (self.course_counters(), self.other_counters(), self.student_counters()))
+
+    def setUp(self):
+        super().setUp()
+        self.python = self.make_course("Python")
+        self.django = self.make_course("Django", lectures=2)
+        # StudentStats rows that exist are kept current from here on
+        stats.rebuild_student_stats()
+
+    def test_reviews(self):
+        first = api_models.Review.objects.create(user=self.students[0], course=self.python, review="Good", rating=4, active=True)
+        second = api_models.Review.objects.create(user=self.students[1], course=self.python, review="Fine", rating=3, active=False)
+        second.active = True
+        second.save()
+        first.rating = 5
+        first.course = self.django
+        first.save()
+        api_models.Review.objects.create(user=self.students[2], course=self.python, review="Odd", rating=7, active=True)
+        second.delete()
+
+        self.assertMatchesRebuild()
+        django = api_models.Course.objects.get(pk=self.django.pk)
+        self.assertEqual((django.rating_count, django.rating_5), (1, 1))
+
+    def test_enrollments_and_lectures(self):
+        enrollment = self.enroll(self.python, self.students[0])
+        self.enroll(self.django, self.students[1])
+        for lecture in api_models.VariantItem.objects.filter(variant__course=self.python):
+            api_models.CompletedLesson.objects.create(course=self.python, user=self.students[0], variant_item=lecture)
+        self.assertIsNotNone(api_models.EnrolledCourse.objects.get(pk=enrollment.pk).completed_at)
+        self.assertMatchesRebuild()
+
+        variant = api_models.Variant.objects.get(course=self.python)
+        lecture = api_models.VariantItem.objects.filter(variant__course=self.django).first()
+        lecture.variant = variant
+        lecture.duration = "10:00"
+        lecture.save()
+        self.assertMatchesRebuild()
+
+    def test_lecture_changes_recheck_completion(self):
+        enrollment = self.enroll(self.python, self.students[0])
+        for lecture in api_models.VariantItem.objects.filter(variant__course=self.python):
+            api_models.CompletedLesson.objects.create(course=self.python, user=self.students[0], variant_item=lecture)
+        self.assertEqual(stats.student_stats(self.students[0].pk).completed_courses, 1)
+
+        # A new lecture reopens the finished enrollment, deleting it finishes it again
+        variant = api_models.Variant.objects.get(course=self.python)
+        extra = api_models.VariantItem.objects.create(variant=variant, title="Extra", duration="1:00:00")
+        self.assertIsNone(api_models.EnrolledCourse.objects.get(pk=enrollment.pk).completed_at)
+        self.assertEqual(stats.student_stats(self.students[0].pk).completed_courses, 0)
+        self.assertMatchesRebuild()
+        extra.delete()
+        self.assertIsNotNone(api_models.EnrolledCourse.objects.get(pk=enrollment.pk).completed_at)
+        self.assertEqual(stats.student_stats(self.students[0].pk).completed_courses, 1)
+        self.assertMatchesRebuild()
+
+    def test_stale_instance_save_keeps_counters(self):
+        course = api_models.Course.objects.create(category=self.category, teacher=self.teacher, title="Stale")
+        variant = api_models.Variant.objects.create(course=course, title="Intro")
+        api_models.VariantItem.objects.create(variant=variant, title="Lecture", duration="05:00")
+        self.enroll(course, self.students[0])
+
+        course.title = "Renamed"
+        course.save()
+        course.refresh_from_db()
+        self.assertEqual((course.title, course.lecture_count, course.enrollment_count), ("Renamed", 1, 1))
+        self.assertMatchesRebuild()
+        course.delete()
+        self.assertMatchesRebuild()
+
+    def test_questions_and_courses(self):
+        question = api_models.Question_Answer.objects.create(course=self.python, user=self.students[0], title="How?")
+        api_models.Question_Answer_Message.objects.create(course=self.python, question=question, user=self.students[1], message="Like this")
+        message = api_models.Question_Answer_Message.objects.create(course=self.python, question=question, user=self.students[0], message="Thanks")
+        message.delete()
+
+        other = api_models.Category.objects.create(title="Data")
+        self.django.category = other
+        self.django.save()
+        self.python.delete()
+        self.assertMatchesRebuild()
+
+
+class ProgressTests(CatalogMixin, TestCase):
+    url = "/api/v1/student/course-completed/"
+
+    def setUp(self):
+        super().setUp()
+        self.course = self.make_course("Python")
+        self.student = self.students[0]
+        self.enrollment = self.enroll(self.course, self.student)
+        self.lectures = list(api_models.VariantItem.objects.filter(variant__course=self.course).order_by("id"))
+        self.client = APIClient()
+
+    def toggle(self, lecture):
+        return self.client.post(self.url, {
+            "user_id": self.student.pk, "course_id": self.course.pk, "variant_item_id": lecture.variant_item_id,
+        }, format="json").data
+
+    def progress(self):
+        return api_models.EnrolledCourse.objects.values(
+            "completed_lessons", "completed_bits", "last_lesson", "completed_at",
+        ).get(pk=self.enrollment.pk)
+
+    def test_set_bit(self):
+        self.assertEqual(stats.set_bit(b"", 9, True), (b"\x00\x02", True))
+        self.assertEqual(stats.set_bit(b"\x00\x02", 9, True), (b"\x00\x02", False))
+        self.assertEqual(stats.set_bit(b"\x01\x02", 9, False), (b"\x01", True))
+        self.assertEqual(stats.set_bit(b"\x01", 20, False), (b"\x01", False))
+
+    def test_positions_are_never_reused(self):
+        self.assertEqual([lecture.position for lecture in self.lectures], [0, 1, 2])
+        self.lectures[2].delete()
+        added = api_models.VariantItem.objects.create(variant=self.lectures[0].variant, title="Extra")
+        self.assertEqual(added.position, 3)
+
+    def test_toggle_updates_progress(self):
+        response = self.toggle(self.lectures[1])
+        self.assertEqual((response["completed_lessons"], response["lecture_count"], response["course_completed"]), (1, 3, False))
+        progress = self.progress()
+        self.assertEqual((bytes(progress["completed_bits"]), progress["last_lesson"]), (b"\x02", self.lectures[1].pk))
+
+        self.assertEqual(self.toggle(self.lectures[1])["completed_lessons"], 0)
+        self.assertEqual(bytes(self.progress()["completed_bits"]), b"")
+
+        for lecture in self.lectures:
+            response = self.toggle(lecture)
+        self.assertTrue(response["course_completed"])
+        self.assertEqual(bytes(self.progress()["completed_bits"]), b"\x07")
+        self.assertEqual(stats.student_stats(self.student.pk).completed_courses, 1)
+
+    def test_duplicate_rows_count_once(self):
+        first, second = [
+            api_models.CompletedLesson.objects.create(course=self.course, user=self.student, variant_item=self.lectures[0])
+            for _ in range(2)
+        ]
+        self.assertEqual(self.progress()["completed_lessons"], 1)
+        first.delete()
+        progress = self.progress()
+        self.assertEqual((progress["completed_lessons"], bytes(progress["completed_bits"])), (1, b"\x01"))
+
+        stats.rebuild_progress()
+        self.assertEqual(self.progress(), progress)
+        second.delete()
+        self.assertEqual(self.progress()["completed_lessons"], 0)
+
+
+class ProbeMediaTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.course = self.make_course("Python", lectures=0)
+        self.variant = self.course.variant_set.get()
+        self.lecture = api_models.VariantItem.objects.create(variant=self.variant, title="Video", url="https://cdn.example.com/a.mp4")
+        # Threads rather than processes, so the patched probe is the one that runs
+        pool = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(pool.shutdown)
+        self.pool = pool
+
+    def run_batch(self, probe):
+        with mock.patch.object(media, "probe_lecture", side_effect=probe):
+            return ProbeMediaCommand(stdout=StringIO(), stderr=StringIO()).run_batch(self.pool, 10)
+
+    def test_new_and_changed_urls_are_queued(self):
+        self.assertEqual(self.lecture.probe_status, "Pending")
+        api_models.VariantItem.objects.filter(pk=self.lecture.pk).update(probe_status="Done")
+        self.lecture.refresh_from_db()
+        self.lecture.title = "Renamed"
+        self.lecture.save()
+        self.assertEqual(self.lecture.probe_status, "Done")
+        self.lecture.url = "https://cdn.example.com/b.mp4"
+        self.lecture.save()
+        self.assertEqual(self.lecture.probe_status, "Pending")
+
+    def test_stores_duration_and_images(self):
+        result = {"duration": 754, "poster": b"poster", "thumbnails": b"strip"}
+        self.assertEqual(self.run_batch(lambda url: result), (1, 0))
+
+        lecture = api_models.VariantItem.objects.get(pk=self.lecture.pk)
+        self.assertEqual((lecture.probe_status, lecture.duration, lecture.duration_seconds), ("Done", "12:34", 754))
+        self.assertEqual(lecture.poster.read(), b"poster")
+        self.assertEqual(lecture.thumbnails.read(), b"strip")
+        # The saved duration reaches the denormalized totals
+        self.assertEqual(api_models.Variant.objects.get(pk=self.variant.pk).duration_total, 754)
+        self.assertEqual(api_models.Course.objects.get(pk=self.course.pk).duration_total, 754)
+        self.assertEqual(self.run_batch(lambda url: result), (0, 0))
+
+    def test_failures_are_recorded_and_retried_on_request(self):
+        def broken(url):
+            raise OSError("cannot open")
+
+        self.assertEqual(self.run_batch(broken), (0, 1))
+        self.assertEqual(api_models.VariantItem.objects.get(pk=self.lecture.pk).probe_status, "Failed")
+        self.assertEqual(self.run_batch(broken), (0, 0))
+
+        with mock.patch("api.management.commands.probe_media.ProcessPoolExecutor", return_value=self.pool):
+            with mock.patch.object(media, "probe_lecture", return_value={"duration": 5, "poster": b"p", "thumbnails": b"t"}):
+                call_command("probe_media", "--retry-failed", stdout=StringIO())
+        self.assertEqual(api_models.VariantItem.objects.get(pk=self.lecture.pk).probe_status, "Done")
+
+    def test_url_changed_while_probing(self):
+        old_url = self.lecture.url
+        self.lecture.url = "https://cdn.example.com/b.mp4"
+        self.lecture.save()
+        ProbeMediaCommand().store(self.lecture.pk, old_url, {"duration": 5, "poster": b"p", "thumbnails": b"t"})
+        lecture = api_models.VariantItem.objects.get(pk=self.lecture.pk)
+        self.assertEqual((lecture.probe_status, lecture.duration), ("Pending", None))
+
+
+class StudentSummaryTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.student = self.students[0]
+        self.python = self.make_course("Python", lectures=2)
+        self.django = self.make_course("Django", lectures=2)
+        self.enroll(self.python, self.student)
+        self.enroll(self.django, self.student)
+        for lecture in api_models.VariantItem.objects.filter(variant__course=self.python):
+            api_models.CompletedLesson.objects.create(course=self.python, user=self.student, variant_item=lecture)
+        lecture = api_models.VariantItem.objects.filter(variant__course=self.django).first()
+        api_models.CompletedLesson.objects.create(course=self.django, user=self.student, variant_item=lecture)
+        api_models.Certificate.objects.create(course=self.python, user=self.student)
+
+    def get(self, user_id):
+        return self.client.get(f"/api/v1/student/summary/{user_id}/")
+
+    def test_summary(self):
+        expected = {
+            "total_courses": 2, "in_progress_courses": 1, "completed_courses": 1,
+            "completed_lessons": 3, "achieved_certificates": 1, "unseen_notifications": 0,
+        }
+        # The first read builds the row from the source tables
+        self.assertFalse(api_models.StudentStats.objects.filter(pk=self.student.pk).exists())
+        self.assertEqual(self.get(self.student.pk).data, [expected])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get(self.student.pk).data, [expected])
+
+        # Kept current by the signals from then on
+        api_models.Certificate.objects.filter(user=self.student).delete()
+        self.enroll(self.make_course("Go"), self.student)
+        data = self.get(self.student.pk).data[0]
+        self.assertEqual((data["total_courses"], data["in_progress_courses"], data["achieved_certificates"]), (3, 2, 0))
+
+    def test_unknown_user(self):
+        self.assertEqual(self.get(999999).status_code, 404)
+
+
+class EnrolledCourseListTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.student = self.students[0]
+        self.url = f"/api/v1/student/course-list/{self.student.pk}/"
+
+    def complete(self, course, count):
+        for lecture in api_models.VariantItem.objects.filter(variant__course=course).order_by("id")[:count]:
+            api_models.CompletedLesson.objects.create(course=course, user=self.student, variant_item=lecture)
+
+    def test_progress_is_computed_in_sql(self):
+        python, django, empty = self.make_course("Python"), self.make_course("Django", lectures=2), self.make_course("Empty", lectures=0)
+        for course in (python, django, empty):
+            self.enroll(course, self.student)
+        self.enroll(python, self.students[1])
+        self.complete(python, 1)
+        self.complete(django, 2)
+
+        with self.assertNumQueries(1):
+            rows = self.client.get(self.url).data["results"]
+        progress = {row["course"]["title"]: (row["lecture_count"], row["completed_lessons"], row["progress"]) for row in rows}
+        self.assertEqual(progress["Django"], (2, 2, 100.0))
+        self.assertEqual(progress["Empty"], (0, 0, 0.0))
+        self.assertAlmostEqual(progress["Python"][2], 100 / 3)
+        self.assertEqual(len(rows), 3)
+        # The light card only; lectures, notes and Q&A stay on the detail endpoint
+        self.assertNotIn("lectures", rows[0])
+        self.assertNotIn("curriculum", rows[0]["course"])
+
+    def test_progress_is_capped(self):
+        course = self.make_course("Python", lectures=2)
+        self.enroll(course, self.student)
+        # Counters that have drifted past the lecture count until the next rebuild
+        api_models.EnrolledCourse.objects.update(completed_lessons=3)
+        rows = self.client.get(self.url).data["results"]
+        self.assertEqual(rows[0]["progress"], 100.0)
+
+
+class QuestionAnswerThreadTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.course = self.make_course("Python", lectures=0)
+        self.url = f"/api/v1/student/question-answer-list-create/{self.course.pk}/"
+
+    def ask(self, title, replies=0):
+        response = self.client.post(self.url, {
+            "course_id": self.course.pk, "user_id": self.students[0].pk, "title": title, "message": f"{title}?",
+        })
+        self.assertEqual(response.status_code, 201)
+        question = api_models.Question_Answer.objects.get(title=title)
+        for i in range(replies):
+            self.reply(question, f"Reply {i}")
+        return question
+
+    def reply(self, question, message):
+        return self.client.post("/api/v1/student/question-answer-message-create/", {
+            "course_id": self.course.pk, "qa_id": question.qa_id, "user_id": self.students[1].pk, "message": message,
+        })
+
+    def test_threads_order_by_latest_activity(self):
+        first = self.ask("First")
+        self.ask("Second")
+        response = self.reply(first, "Bump")
+        self.assertEqual(response.data["question"]["messages"][-1]["message"], "Bump")
+
+        threads = self.client.get(self.url).data["results"]
+        self.assertEqual([thread["title"] for thread in threads], ["First", "Second"])
+        self.assertEqual([thread["reply_count"] for thread in threads], [2, 1])
+        self.assertEqual(threads[0]["profile"]["user"], self.students[0].pk)
+
+    @override_settings(QA_THREAD_MESSAGES=3)
+    def test_thread_page_is_two_queries(self):
+        for i in range(4):
+            self.ask(f"Question {i}", replies=i + 1)
+
+        with self.assertNumQueries(2):
+            threads = self.client.get(self.url).data["results"]
+        self.assertEqual(len(threads), 4)
+        latest = threads[0]
+        # Only the newest messages are embedded, oldest first
+        self.assertEqual([message["message"] for message in latest["messages"]], ["Reply 1", "Reply 2", "Reply 3"])
+        self.assertEqual(latest["reply_count"], 5)
+        self.assertEqual(latest["messages"][0]["profile"]["user"], self.students[1].pk)
+
+    def test_full_history_pages_by_cursor(self):
+        question = self.ask("History", replies=3)
+        url = f"/api/v1/student/question-answer-message-list/{question.qa_id}/?page_size=2"
+        first = self.client.get(url).data
+        second = self.client.get(first["next"]).data
+        messages = [message["message"] for message in first["results"] + second["results"]]
+        self.assertEqual(messages, ["Reply 2", "Reply 1", "Reply 0", "History?"])
+        self.assertIsNone(second["next"])
+
+
+class CourseDetailCacheTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = self.make_course("Python")
+        self.enrollment = self.enroll(self.course, self.students[0])
+        self.url = f"/api/v1/course/course-detail/{self.course.slug}/"
+        self.client = APIClient()
+
+    def get(self, **headers):
+        return self.client.get(self.url, **headers)
+
+    def test_nested_writes_refresh_the_cached_payload(self):
+        self.assertEqual(self.get().data["students"][0]["completed_lesson"], [])
+
+        lecture = api_models.VariantItem.objects.filter(variant__course=self.course).first()
+        api_models.CompletedLesson.objects.create(course=self.course, user=self.students[0], variant_item=lecture)
+        student = self.get().data["students"][0]
+        self.assertEqual(len(student["completed_lesson"]), 1)
+        self.assertEqual(student["completed_lessons"], 1)
+
+        api_models.Note.objects.create(course=self.course, user=self.students[0], note="Remember")
+        self.assertEqual(len(self.get().data["students"][0]["note"]), 1)
+
+        question = api_models.Question_Answer.objects.create(course=self.course, user=self.students[0], title="How?")
+        self.assertEqual(len(self.get().data["students"][0]["question_answer"]), 1)
+        api_models.Question_Answer_Message.objects.create(course=self.course, question=question, user=self.students[1], message="Like this")
+        self.assertEqual(len(self.get().data["students"][0]["question_answer"][0]["messages"]), 1)
+
+        self.category.title = "Programming"
+        self.category.save()
+        self.assertEqual(self.get().data["category"]["title"], "Programming")
+        self.category.delete()
+        self.assertIsNone(self.get().data["category"])
+
+    def test_rebuild_refreshes_the_cached_payload(self):
+        api_models.Course.objects.filter(pk=self.course.pk).update(rating_sum=9, rating_count=2)
+        self.assertEqual(self.get().data["rating_count"], 2)
+        call_command("rebuild_course_stats", stdout=StringIO())
+        self.assertEqual(self.get().data["rating_count"], 0)
+
+
+class ETagTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = self.make_course("Python")
+        self.enroll(self.course, self.students[0])
+        self.client = APIClient()
+
+    def assertChanges(self, url, write):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+        write()
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second["ETag"], first["ETag"])
+        return second
+
+    def test_detail_etag_follows_nested_writes(self):
+        url = f"/api/v1/course/course-detail/{self.course.slug}/"
+        lecture = api_models.VariantItem.objects.filter(variant__course=self.course).first()
+        response = self.assertChanges(url, lambda: api_models.CompletedLesson.objects.create(
+            course=self.course, user=self.students[0], variant_item=lecture,
+        ))
+        self.assertEqual(response.data["students"][0]["completed_lessons"], 1)
+
+        question = api_models.Question_Answer.objects.create(course=self.course, user=self.students[0], title="How?")
+        self.assertChanges(url, lambda: api_models.Question_Answer_Message.objects.create(
+            course=self.course, question=question, user=self.students[1], message="Like this",
+        ))
+
+        profile = self.students[0].profile
+        profile.full_name = "Renamed"
+        response = self.assertChanges(url, profile.save)
+        self.assertEqual(response.data["students"][0]["question_answer"][0]["profile"]["full_name"], "Renamed")
+
+    def test_list_etags_follow_counters(self):
+        self.assertChanges("/api/v1/course/course-list/", lambda: api_models.Review.objects.create(
+            user=self.students[0], course=self.course, review="Good", rating=5, active=True,
+        ))
+        self.assertChanges("/api/v1/course/category/", lambda: self.make_course("Django"))
+
+    def test_etag_depends_on_the_query(self):
+        response = self.client.get("/api/v1/course/course-list/")
+        other = self.client.get("/api/v1/course/course-list/?level=Beginner", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(other.status_code, 200)
+
+
+class CourseCatalogTests(CatalogMixin, TestCase):
+    url = "/api/v1/course/course-list/"
+
+    def setUp(self):
+        super().setUp()
+        self.python = self.make_course("Python Basics")
+        self.django = self.make_course("Django for Beginners")
+        self.django.level = "Intermediate"
+        self.django.save()
+        self.draft = self.make_course("Python Drafts")
+        self.draft.teacher_course_status = "Draft"
+        self.draft.save()
+        self.client = APIClient()
+
+    def titles(self, response):
+        return [course["title"] for course in response.data["results"]]
+
+    def test_cards_run_a_fixed_number_of_queries(self):
+        api_models.Review.objects.create(user=self.students[0], course=self.python, review="Good", rating=4, active=True)
+        api_models.Review.objects.create(user=self.students[1], course=self.python, review="Fine", rating=3, active=True)
+        self.enroll(self.python, self.students[0])
+
+        # The page and the facet counts, whatever the page size
+        with self.assertNumQueries(2):
+            self.client.get(self.url, {"page_size": 1})
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+
+        card = next(card for card in response.data["results"] if card["id"] == self.python.pk)
+        self.assertEqual(set(card), {
+            "id", "course_id", "title", "slug", "image", "price", "level", "language", "teacher_name",
+            "average_rating", "rating_count", "enrollment_count", "lecture_count", "duration_total",
+        })
+        self.assertEqual((card["average_rating"], card["rating_count"], card["enrollment_count"]), (3.5, 2, 1))
+        self.assertEqual((card["teacher_name"], card["lecture_count"], card["duration_total"]), ("Teacher", 3, 990))
+
+    def test_filters_and_facets(self):
+        response = self.client.get(self.url, {"level": "Intermediate"})
+        self.assertEqual(self.titles(response), ["Django for Beginners"])
+        self.assertEqual(response.data["facets"]["level"], {"Intermediate": 1})
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["facets"]["level"], {"Beginner": 1, "Intermediate": 1})
+        self.assertEqual(response.data["facets"]["category"], {self.category.slug: 2})
+
+        self.assertEqual(self.client.get(self.url, {"level": "Expert"}).status_code, 400)
+
+    def test_query_combines_with_filters(self):
+        response = self.client.get(self.url, {"query": "pyth"})
+        self.assertEqual(self.titles(response), ["Python Basics"])
+        self.assertEqual(response.data["facets"]["level"], {"Beginner": 1})
+
+        response = self.client.get(self.url, {"query": "django", "level": "Beginner"})
+        self.assertEqual(self.titles(response), [])
+        self.assertEqual(len(self.titles(self.client.get(self.url, {"query": " "}))), 2)
+
+    def test_cursor_pages(self):
+        for i in range(3):
+            self.make_course(f"Extra {i}")
+
+        titles = []
+        response = self.client.get(self.url, {"page_size": 2})
+        while True:
+            self.assertLessEqual(len(response.data["results"]), 2)
+            titles += self.titles(response)
+            if not response.data["next"]:
+                break
+            response = self.client.get(response.data["next"])
+        self.assertEqual(len(titles), 5)
+        self.assertEqual(len(set(titles)), 5)
+
+    def test_cart_and_wishlist_membership(self):
+        student = self.students[0]
+        api_models.Cart.objects.create(course=self.python, price=self.python.price, total=self.python.price, cart_id="333333")
+        api_models.Whishlist.objects.create(user=student, course=self.django)
+        params = {"course_id": [self.python.pk, self.django.pk]}
+
+        response = self.client.get("/api/v1/cart/contains/333333/", params)
+        self.assertEqual(response.data, {"course_ids": [self.python.pk]})
+        response = self.client.get(f"/api/v1/student/wishlist-contains/{student.pk}/", params)
+        self.assertEqual(response.data, {"course_ids": [self.django.pk]})
+        response = self.client.get(f"/api/v1/student/wishlist-contains/{self.students[1].pk}/", params)
+        self.assertEqual(response.data, {"course_ids": []})
+
+        self.assertEqual(self.client.get("/api/v1/cart/contains/333333/").status_code, 400)
+
+
+class CourseSearchTests(CatalogMixin, TestCase):
+    url = "/api/v1/course/search"
+
+    def setUp(self):
+        super().setUp()
+        self.basics = self.make_course("Python Basics")
+        self.scraping = self.make_course("Web Scraping")
+        self.scraping.description = "Collect data with python requests"
+        self.scraping.save()
+        self.draft = self.make_course("Python Drafts")
+        self.draft.teacher_course_status = "Draft"
+        self.draft.save()
+        self.client = APIClient()
+
+    def search(self, query, **params):
+        return self.client.get(self.url, dict(params, query=query))
+
+    def titles(self, response):
+        return [course["title"] for course in response.data["results"]]
+
+    def test_ranks_title_matches_first(self):
+        response = self.search("pyth")
+        self.assertEqual(self.titles(response), ["Python Basics", "Web Scraping"])
+        self.assertEqual(response.data["count"], 2)
+
+    def test_pages_by_offset(self):
+        first = self.search("python", limit=1)
+        self.assertEqual(self.titles(first), ["Python Basics"])
+        second = self.client.get(first.data["next"])
+        self.assertEqual(self.titles(second), ["Web Scraping"])
+        self.assertIsNone(second.data["next"])
+
+    def test_index_follows_writes(self):
+        self.teacher.full_name = "Guido"
+        self.teacher.save()
+        self.assertEqual(len(self.titles(self.search("guido"))), 2)
+
+        self.basics.teacher_course_status = "Draft"
+        self.basics.save()
+        self.assertEqual(self.titles(self.search("python")), ["Web Scraping"])
+        self.scraping.delete()
+        self.assertEqual(self.titles(self.search("python")), [])
+
+    def test_query_syntax_is_not_passed_through(self):
+        for query in ['"', "python OR", "NEAR(", "*", ""]:
+            response = self.search(query)
+            self.assertEqual(response.status_code, 200, query)
+        self.assertEqual(self.titles(self.search("")), [])
+
+
+class SuggestTests(CatalogMixin, TestCase):
+    url = "/api/v1/course/suggest"
+
+    def setUp(self):
+        super().setUp()
+        self.course = self.make_course("Advanced Django Patterns")
+        # The index is per process and outlives each test's rows
+        suggest.index.reload()
+        self.client = APIClient()
+
+    def labels(self, query, **params):
+        return [item["label"] for item in self.client.get(self.url, dict(params, query=query)).data]
+
+    def test_matches_any_word_start(self):
+        self.assertEqual(self.labels("djan"), ["Advanced Django Patterns"])
+        self.assertEqual(self.labels("django pat"), ["Advanced Django Patterns"])
+        self.assertEqual(self.labels("web"), ["Web Development"])
+        self.assertEqual(self.labels("teach"), ["Teacher"])
+        self.assertEqual(self.labels("ango"), [])
+        self.assertEqual(self.labels(""), [])
+
+    def test_limit(self):
+        for i in range(25):
+            self.make_course(f"Django {i}")
+        self.assertEqual(len(self.labels("django")), suggest.DEFAULT_LIMIT)
+        self.assertEqual(len(self.labels("django", limit=3)), 3)
+        self.assertEqual(len(self.labels("django", limit=100)), suggest.MAX_LIMIT)
+        self.assertEqual(len(self.labels("django", limit="many")), suggest.DEFAULT_LIMIT)
+
+    def test_writes_in_this_process_patch_the_index(self):
+        self.course.title = "Flask Patterns"
+        self.course.save()
+        self.assertEqual(self.labels("djan"), [])
+        self.assertEqual(self.labels("flask"), ["Flask Patterns"])
+
+        self.course.teacher_course_status = "Draft"
+        self.course.save()
+        self.assertEqual(self.labels("flask"), [])
+
+    def test_writes_in_other_processes_reload_the_index(self):
+        # No signals here, just the version bump another process would make
+        api_models.Course.objects.filter(pk=self.course.pk).update(title="Flask Patterns")
+        self.assertEqual(self.labels("djan"), ["Advanced Django Patterns"])
+        suggest.bump_version()
+        self.assertEqual(self.labels("djan"), [])
+        self.assertEqual(self.labels("flask"), ["Flask Patterns"])
+
+
+class CursorPaginationTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.student = self.students[0]
+        self.client = APIClient()
+
+    def walk(self, url, params=None, between_pages=None):
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertNotIn("count", response.data)
+            pages.append([row["id"] for row in response.data["results"]])
+            if not response.data["next"]:
+                return pages
+            if between_pages:
+                between_pages()
+            response = self.client.get(response.data["next"])
+
+    def test_wishlist_pages_newest_first(self):
+        courses = [self.make_course(f"Course {i}") for i in range(5)]
+        rows = [api_models.Whishlist.objects.create(user=self.student, course=course) for course in courses]
+
+        pages = self.walk(f"/api/v1/student/wishlist/{self.student.pk}/", {"page_size": 2})
+        self.assertEqual(pages, [[rows[4].pk, rows[3].pk], [rows[2].pk, rows[1].pk], [rows[0].pk]])
+
+    def test_rows_added_while_paging_are_not_repeated(self):
+        question = api_models.Question_Answer.objects.create(course=self.make_course("Python"), user=self.student, title="How?")
+        for i in range(4):
+            api_models.Question_Answer_Message.objects.create(course=question.course, question=question, user=self.student, message=f"{i}")
+
+        def reply():
+            api_models.Question_Answer_Message.objects.create(course=question.course, question=question, user=self.student, message="new")
+
+        pages = self.walk(f"/api/v1/student/question-answer-message-list/{question.qa_id}/", {"page_size": 2}, reply)
+        seen = [pk for page in pages for pk in page]
+        self.assertEqual(len(seen), 4)
+        self.assertEqual(len(set(seen)), 4)
+
+
+class SparseFieldsTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.student = self.students[0]
+        self.courses = [self.make_course(f"Course {i}") for i in range(3)]
+        self.client = APIClient()
+
+    def fill_cart(self, cart_id, courses):
+        for course in courses:
+            api_models.Cart.objects.create(course=course, user=self.student, price=course.price, total=course.price, cart_id=cart_id)
+        return f"/api/v1/course/cart-list/{cart_id}/"
+
+    def test_default_and_explicit_expansion(self):
+        url = self.fill_cart("444444", self.courses[:1])
+
+        item = self.client.get(url).data["results"][0]
+        self.assertEqual(item["course"]["title"], "Course 0")
+        self.assertEqual(item["user"], self.student.pk)
+
+        item = self.client.get(url, {"expand": ""}).data["results"][0]
+        self.assertEqual(item["course"], self.courses[0].pk)
+
+        item = self.client.get(url, {"expand": "user"}).data["results"][0]
+        self.assertEqual(set(item["user"]), {"id", "username", "full_name"})
+        self.assertEqual(item["course"], self.courses[0].pk)
+
+        response = self.client.get(url, {"expand": "course,user", "fields": "id,course.title,user.username"})
+        self.assertEqual(response.data["results"][0], {
+            "id": item["id"], "course": {"title": "Course 0"}, "user": {"username": "student0"},
+        })
+
+    def test_query_count_does_not_grow_with_rows(self):
+        small = self.fill_cart("555555", self.courses[:1])
+        large = self.fill_cart("666666", self.courses)
+        for params in ({}, {"expand": "course,user"}):
+            with self.assertNumQueries(1):
+                self.client.get(small, params)
+            with self.assertNumQueries(1):
+                self.client.get(large, params)
+
+    def checkout_url(self, cart_id, courses):
+        self.fill_cart(cart_id, courses)
+        order = services.create_order(cart_id, student=self.student, full_name="Student", email="student@example.com")
+        return f"/api/v1/order/checkout/{order.oid}/"
+
+    def test_checkout_nests_order_items(self):
+        small = self.checkout_url("777777", self.courses[:1])
+        url = self.checkout_url("888888", self.courses)
+
+        # The order, its items with courses, and the coupon and teacher id lists
+        with self.assertNumQueries(5):
+            self.client.get(small)
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(sorted(item["course"]["title"] for item in response.data["order_items"]), ["Course 0", "Course 1", "Course 2"])
+        self.assertEqual(response.data["student"], self.student.pk)
+        self.assertNotIn("password", json.dumps(response.data))
+        self.assertNotIn("password", json.dumps(self.client.get(url, {"expand": "student,order_items.teacher"}).data))
+
+
+class ReferenceTableTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Stands in for the copy held by another process
+        self.other = reference.ReferenceTable(reference.api_cache.CATEGORIES_TAG, reference.load_categories)
+        self.clock = 1000.0
+        patcher = mock.patch("api.reference.time.monotonic", side_effect=lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def titles(self, table):
+        return sorted(category.title for category in table.get())
+
+    def test_served_from_memory_between_checks(self):
+        self.titles(self.other)
+        with self.assertNumQueries(0):
+            self.titles(self.other)
+        self.clock += reference.CHECK_INTERVAL
+        with self.assertNumQueries(1):
+            self.titles(self.other)
+
+    def test_writes_reach_other_processes_without_a_shared_cache(self):
+        self.assertEqual(self.titles(self.other), ["Web Development"])
+        api_models.Category.objects.create(title="Data")
+        # The writer's own copy is expired straight away
+        self.assertEqual(self.titles(reference.categories), ["Data", "Web Development"])
+        # Another process keeps its copy until its next check
+        self.assertEqual(self.titles(self.other), ["Web Development"])
+        self.clock += reference.CHECK_INTERVAL
+        # Per-process caches (LocMemCache) can't carry the change, so none is consulted
+        with mock.patch.object(reference.api_cache, "tag_versions", side_effect=AssertionError):
+            self.assertEqual(self.titles(self.other), ["Data", "Web Development"])
+
+    def test_countries(self):
+        country = api_models.Country.objects.create(name="India", tax_rate=5)
+        self.assertEqual(reference.countries.get()["India"].tax_rate, 5)
+        country.tax_rate = 7
+        country.save()
+        self.assertEqual(reference.countries.get()["India"].tax_rate, 7)
+
+
+class PaymentClientTests(SimpleTestCase):
+    """api.payments against the `manage.py payment_stub` handler on a free port."""
+
+    def setUp(self):
+        requests_seen = self.requests_seen = []
+        rejected = self.rejected_tokens = set()
+
+        class Handler(StubHandler):
+            quiet = True
+
+            def reply(self, data, status=200):
+                requests_seen.append((self.command, self.path))
+                token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+                if self.command == "GET" and (token in rejected or "*" in rejected):
+                    data, status = {"error": "invalid_token"}, 401
+                super().reply(data, status)
+
+        self.handler = Handler
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def token_requests(self):
+        return sum(1 for request in self.requests_seen if request == ("POST", "/v1/oauth2/token"))
+
+    def test_paypal_token_is_reused(self):
+        client = payments.PayPalClient(self.base, "id", "secret")
+        self.assertEqual(client.get_order("ORDER-1"), {"id": "ORDER-1", "status": "COMPLETED"})
+        client.get_order("ORDER-2")
+        self.assertEqual(self.token_requests(), 1)
+
+    def test_paypal_token_is_renewed_before_expiry(self):
+        self.handler.token_ttl = payments.TOKEN_REFRESH_MARGIN
+        client = payments.PayPalClient(self.base, "id", "secret")
+        client.get_order("ORDER-1")
+        client.get_order("ORDER-2")
+        self.assertEqual(self.token_requests(), 2)
+
+    def test_paypal_retries_once_with_a_fresh_token(self):
+        client = payments.PayPalClient(self.base, "id", "secret")
+        self.rejected_tokens.add(client.access_token())
+        self.assertEqual(client.get_order("ORDER-1")["status"], "COMPLETED")
+        self.assertEqual(self.token_requests(), 2)
+
+    def test_paypal_errors(self):
+        self.rejected_tokens.add("*")
+        client = payments.PayPalClient(self.base, "id", "secret")
+        with self.assertRaisesMessage(payments.PaymentGatewayError, "401"):
+            client.get_order("ORDER-1")
+
+        closed = payments.PayPalClient("http://127.0.0.1:9", "id", "secret")
+        with self.assertRaisesMessage(payments.PaymentGatewayError, "unreachable"):
+            closed.get_order("ORDER-1")
+
+    def test_stripe_checkout_session(self):
+        import stripe
+        for name in ("api_base", "default_http_client", "max_network_retries"):
+            self.addCleanup(setattr, stripe, name, getattr(stripe, name))
+
+        client = payments.StripeClient(self.base, "sk_test")
+        created = client.create_checkout_session(customer_email="a@example.com", client_reference_id="ORDER-1", mode="payment")
+        self.assertEqual((created.payment_status, created.customer_email), ("unpaid", "a@example.com"))
+        self.assertEqual(client.retrieve_checkout_session(created.id).payment_status, "paid")
+
+
+class CartSummaryTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.courses = [self.make_course(f"Course {i}", lectures=0, price="0.10") for i in range(3)]
+        for course in self.courses:
+            # Amounts a float sum gets wrong: 0.1 + 0.2 != 0.3
+            api_models.Cart.objects.create(course=course, cart_id="111111", price=Decimal("0.10"), tax_fee=Decimal("0.20"), total=Decimal("0.30"))
+        api_models.Cart.objects.create(course=self.courses[0], cart_id="222222", price=Decimal("9.99"), total=Decimal("9.99"))
+
+    def test_lines_and_totals(self):
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/v1/cart/summary/111111/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["totals"], {"price": "0.30", "tax": "0.60", "total": "0.90", "items_count": 3})
+        # Newest line first
+        self.assertEqual([line["title"] for line in response.data["items"]], ["Course 2", "Course 1", "Course 0"])
+        self.assertEqual(response.data["items"][0]["slug"], self.courses[2].slug)
+
+    def test_empty_cart(self):
+        response = self.client.get("/api/v1/cart/summary/999999/")
+        self.assertEqual(response.data, {"items": [], "totals": {"price": "0.00", "tax": "0.00", "total": "0.00", "items_count": 0}})
+
+    def test_stats_use_the_same_totals(self):
+        response = self.client.get("/api/v1/cart/stats/111111/")
+        self.assertEqual(response.data, {"price": Decimal("0.30"), "tax": Decimal("0.60"), "total": Decimal("0.90"), "items_count": 3})
+
+
+class OrderTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = self.make_course("Python")
+        self.student = self.students[0]
+        api_models.Cart.objects.create(course=self.course, user=self.student, price=self.course.price, total=self.course.price, cart_id="111111")
+        self.order = services.create_order("111111", student=self.student, full_name="Student", email="student@example.com")
+
+    def test_create_order_from_cart(self):
+        other = api_models.Teacher.objects.create(user=make_user("other"), full_name="Other")
+        django = self.make_course("Django", price="20.00")
+        django.teacher = other
+        django.save()
+        for course in (self.course, django, django):
+            api_models.Cart.objects.create(
+                course=course, user=self.student, price=course.price, tax_fee=Decimal("1.00"),
+                total=course.price + 1, cart_id="999999",
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            order = services.create_order("999999", student=self.student)
+        with CaptureQueriesContext(connection) as single_line:
+            services.create_order("111111", student=self.student)
+        # Three cart lines cost the same queries as the one-line cart from setUp
+        self.assertEqual(len(queries), len(single_line))
+
+        order = api_models.CartOrder.objects.get(pk=order.pk)
+        self.assertEqual((order.sub_total, order.tax_fee, order.total), (Decimal("30.00"), Decimal("2.00"), Decimal("32.00")))
+        self.assertEqual(order.initial_total, order.total)
+        items = order.orderitem.order_by("course__title")
+        self.assertEqual([(item.course.title, item.teacher_id, item.total) for item in items], [
+            ("Django", other.pk, Decimal("21.00")), ("Python", self.teacher.pk, Decimal("11.00")),
+        ])
+        self.assertEqual(set(order.teachers.values_list("pk", flat=True)), {self.teacher.pk, other.pk})
+
+    def test_confirm_payment_is_idempotent(self):
+        self.assertTrue(services.confirm_payment(self.order))
+        self.assertFalse(services.confirm_payment(api_models.CartOrder.objects.get(pk=self.order.pk)))
+        self.assertEqual(api_models.CartOrder.objects.get(pk=self.order.pk).payment_status, "Paid")
+        self.assertEqual(Task.objects.filter(name=api_tasks.fulfil_order.task_name).count(), 1)
+
+    def test_fulfil_order_is_idempotent(self):
+        self.assertEqual(services.fulfil_order(self.order.pk), [])  # Not paid yet
+        services.confirm_payment(self.order)
+        self.assertEqual(len(services.fulfil_order(self.order.pk)), 1)
+        self.assertEqual(services.fulfil_order(self.order.pk), [])
+
+        self.assertEqual(api_models.EnrolledCourse.objects.filter(user=self.student).count(), 1)
+        self.assertEqual(api_models.Course.objects.get(pk=self.course.pk).enrollment_count, 1)
+        self.assertEqual(api_models.Notification.objects.filter(order=self.order).count(), 2)
+        self.assertEqual(stats.student_stats(self.student.pk).total_courses, 1)
+
+    def stripe_event(self, event_id, oid):
+        return {
+            "id": event_id,
+            "type": "checkout.session.completed",
+            "data": {"object": {"id": "cs_test", "payment_status": "paid", "client_reference_id": oid}},
+        }
+
+    def test_drain_sets_bad_events_aside(self):
+        api_models.StripeEvent.objects.create(event_id="evt_junk", type="checkout.session.completed", payload="not json")
+        missing = self.stripe_event("evt_missing", None)
+        del missing["data"]
+        api_models.StripeEvent.objects.create(event_id="evt_missing", type=missing["type"], payload=json.dumps(missing))
+        event = self.stripe_event("evt_paid", self.order.oid)
+        services.receive_stripe_event(event, json.dumps(event))
+        services.receive_stripe_event(event, json.dumps(event))  # Redelivery
+
+        with self.assertLogs("api.tasks", "ERROR") as logs:
+            api_tasks.drain_stripe_inbox()
+        self.assertEqual(len(logs.records), 2)
+
+        events = {e.event_id: e for e in api_models.StripeEvent.objects.all()}
+        self.assertEqual(len(events), 3)
+        self.assertTrue(all(e.processed_at for e in events.values()))
+        self.assertIsNone(events["evt_paid"].last_error)
+        self.assertIn("JSONDecodeError", events["evt_junk"].last_error)
+        self.assertIn("MalformedStripeEvent", events["evt_missing"].last_error)
+        self.assertEqual(api_models.CartOrder.objects.get(pk=self.order.pk).payment_status, "Paid")
+        self.assertTrue(Task.objects.filter(name=api_tasks.fulfil_order.task_name, status="Queued").exists())
+
+
+    def test_drain_retries_transient_failures(self):
+        event = self.stripe_event("evt_paid", self.order.oid)
+        services.receive_stripe_event(event, json.dumps(event))
+        locked = mock.patch("api.services.confirm_payment", side_effect=OperationalError("database is locked"))
+        with locked, self.assertLogs("api.tasks", "WARNING"):
+            api_tasks.drain_stripe_inbox()
+
+        stored = api_models.StripeEvent.objects.get(event_id="evt_paid")
+        self.assertIsNone(stored.processed_at)
+        self.assertEqual(stored.attempts, 1)
+        self.assertIn("database is locked", stored.last_error)
+        self.assertGreater(stored.retry_after, timezone.now())
+        retry = Task.objects.get(dedup_key="stripe-inbox-retry")
+        self.assertGreater(retry.run_after, timezone.now())
+
+        # Not due yet, so a drain woken by another webhook leaves it alone
+        api_tasks.drain_stripe_inbox()
+        self.assertIsNone(api_models.StripeEvent.objects.get(pk=stored.pk).processed_at)
+
+        api_models.StripeEvent.objects.filter(pk=stored.pk).update(retry_after=timezone.now() - timedelta(seconds=1))
+        api_tasks.drain_stripe_inbox()
+        stored.refresh_from_db()
+        self.assertIsNotNone(stored.processed_at)
+        self.assertEqual(stored.attempts, 2)
+        self.assertEqual(api_models.CartOrder.objects.get(pk=self.order.pk).payment_status, "Paid")
+
+    @override_settings(STRIPE_INBOX_MAX_ATTEMPTS=2)
+    def test_drain_gives_up_after_max_attempts(self):
+        event = self.stripe_event("evt_paid", self.order.oid)
+        services.receive_stripe_event(event, json.dumps(event))
+        with mock.patch("api.services.confirm_payment", side_effect=OperationalError("database is locked")):
+            with self.assertLogs("api.tasks", "WARNING"):
+                api_tasks.drain_stripe_inbox()
+            api_models.StripeEvent.objects.update(retry_after=timezone.now())
+            with self.assertLogs("api.tasks", "ERROR"):
+                api_tasks.drain_stripe_inbox()
+
+        stored = api_models.StripeEvent.objects.get(event_id="evt_paid")
+        self.assertIsNotNone(stored.processed_at)
+        self.assertEqual(stored.attempts, 2)
+        self.assertEqual(api_models.CartOrder.objects.get(pk=self.order.pk).payment_status, "Processing")
+
+
+@override_settings(PUBSUB_BACKEND="core.pubsub.DatabaseBroker", PUBSUB_POLL_INTERVAL=0.05)
+class NotificationFeedTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.student, self.other = self.students[:2]
+        stats.rebuild_student_stats()
+        self.client = APIClient()
+
+    def notify(self, **kwargs):
+        return api_models.Notification.objects.create(type="New Order", **kwargs)
+
+    def unseen(self, url):
+        return self.client.get(url).data["unseen"]
+
+    def test_student_feed(self):
+        old = self.notify(user=self.student)
+        new = self.notify(user=self.student)
+        self.notify(user=self.other)
+        url = f"/api/v1/student/notification-list/{self.student.pk}/"
+        unseen_url = f"/api/v1/student/notification-unseen/{self.student.pk}/"
+
+        self.assertEqual([row["id"] for row in self.client.get(url).data["results"]], [new.pk, old.pk])
+        self.assertEqual(self.unseen(unseen_url), 2)
+
+        old.seen = True
+        old.save()
+        self.assertEqual([row["id"] for row in self.client.get(url, {"unseen": 1}).data["results"]], [new.pk])
+        self.assertEqual(self.unseen(unseen_url), 1)
+
+        new.user = self.other
+        new.save()
+        self.assertEqual(self.unseen(unseen_url), 0)
+        self.assertEqual(self.unseen(f"/api/v1/student/notification-unseen/{self.other.pk}/"), 2)
+
+        response = self.client.post(f"/api/v1/student/notification-mark-seen/{self.other.pk}/")
+        self.assertEqual(response.data["updated"], 2)
+        self.assertEqual(self.unseen(f"/api/v1/student/notification-unseen/{self.other.pk}/"), 0)
+        self.assertEqual(self.client.post(f"/api/v1/student/notification-mark-seen/{self.other.pk}/").data["updated"], 0)
+
+    def test_teacher_feed(self):
+        seen = self.notify(teacher=self.teacher, seen=True)
+        unseen = self.notify(teacher=self.teacher)
+        unseen_url = f"/api/v1/teacher/notification-unseen/{self.teacher.pk}/"
+        self.assertEqual(self.unseen(unseen_url), 1)
+
+        unseen.delete()
+        seen.delete()
+        self.assertEqual(self.unseen(unseen_url), 0)
+
+        self.notify(teacher=self.teacher)
+        self.client.post(f"/api/v1/teacher/notification-mark-seen/{self.teacher.pk}/")
+        self.assertEqual(self.unseen(unseen_url), 0)
+        self.assertFalse(api_models.Notification.objects.filter(teacher=self.teacher, seen=False).exists())
+        self.assertEqual(self.client.get("/api/v1/teacher/notification-unseen/0/").status_code, 404)
+
+    def test_counters_match_rebuild(self):
+        for i in range(3):
+            self.notify(user=self.student, teacher=self.teacher, seen=i == 0)
+        self.client.post(f"/api/v1/teacher/notification-mark-seen/{self.teacher.pk}/")
+        counters = (stats.unseen_notifications(user_id=self.student.pk), stats.unseen_notifications(teacher_id=self.teacher.pk))
+
+        stats.rebuild_student_stats()
+        call_command("rebuild_course_stats", stdout=StringIO())
+        self.assertEqual(counters, (
+            stats.unseen_notifications(user_id=self.student.pk), stats.unseen_notifications(teacher_id=self.teacher.pk),
+        ))
+
+
+class EventStreamTests(CatalogMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        pubsub._broker = None
+        self.addCleanup(self.close_broker)
+        course = self.make_course("Python")
+        self.student = self.students[0]
+        api_models.Cart.objects.create(course=course, user=self.student, price=course.price, total=course.price, cart_id="111111")
+        self.order = services.create_order("111111", student=self.student)
+
+    def close_broker(self):
+        # Stop the poller thread so it doesn't outlive this test's tables
+        if pubsub._broker is not None:
+            pubsub._broker.close()
+            pubsub._broker = None
+
+    def test_notifications_from_the_worker_reach_open_streams(self):
+        def fulfil_in_worker():
+            # Publishes through its own broker instance, like a runworker process
+            with mock.patch.object(pubsub, "_broker", pubsub.DatabaseBroker()):
+                services.confirm_payment(self.order)
+                services.fulfil_order(self.order.pk)
+
+        async def scenario():
+            stream = realtime.stream([realtime.user_channel(self.student.pk)])
+            self.assertTrue((await stream.__anext__()).startswith("retry:"))
+            while pubsub.broker()._last_id is None:
+                await asyncio.sleep(0.01)
+            await sync_to_async(fulfil_in_worker)()
+            try:
+                return await asyncio.wait_for(stream.__anext__(), 5)
+            finally:
+                await stream.aclose()
+
+        event = asyncio.run(scenario())
+        self.assertTrue(event.startswith("event: notification\n"))
+        self.assertIn("Course Enrollment Completed", event)
+
+    def test_qa_messages_reach_their_course_only(self):
+        python = api_models.Course.objects.get(title="Python")
+        django = self.make_course("Django")
+        questions = {
+            course: api_models.Question_Answer.objects.create(course=course, user=self.student, title="How?")
+            for course in (python, django)
+        }
+
+        def reply(course):
+            api_models.Question_Answer_Message.objects.create(course=course, question=questions[course], user=self.student, message="Like this")
+
+        async def scenario():
+            stream = realtime.stream([realtime.course_channel(python.pk)])
+            await stream.__anext__()
+            while pubsub.broker()._last_id is None:
+                await asyncio.sleep(0.01)
+            await sync_to_async(reply)(django)
+            await sync_to_async(reply)(python)
+            try:
+                return await asyncio.wait_for(stream.__anext__(), 5)
+            finally:
+                await stream.aclose()
+
+        event = asyncio.run(scenario())
+        self.assertTrue(event.startswith("event: qa.message\n"))
+        self.assertIn(questions[python].qa_id, event)
+
+    @override_settings(EVENT_STREAM_HEARTBEAT=0.1, EVENT_STREAM_MAX_AGE=0.35)
+    def test_idle_stream_keeps_alive_then_ends(self):
+        async def scenario():
+            return [chunk async for chunk in realtime.stream([realtime.user_channel(self.student.pk)])]
+
+        chunks = asyncio.run(scenario())
+        self.assertTrue(chunks[0].startswith("retry:"))
+        self.assertEqual(set(chunks[1:]), {": keep-alive\n\n"})
+        self.assertFalse(pubsub.broker()._channels)
+
+    def test_view_needs_channels_and_asgi(self):
+        self.assertEqual(self.client.get("/api/v1/stream/").status_code, 400)
+        # The test client is WSGI, where the stream would hold a worker
+        self.assertEqual(self.client.get("/api/v1/stream/", {"user_id": self.student.pk}).status_code, 204)
+
+
+class IdempotencyKeyTests(CatalogMixin, TestCase):
+    url = "/api/v1/order/create-order/"
+
+    def setUp(self):
+        super().setUp()
+        course = self.make_course("Python")
+        api_models.Cart.objects.create(course=course, price=course.price, total=course.price, cart_id="222222")
+        self.client = APIClient()
+        self.body = {"full_name": "Student", "email": "student@example.com", "country": "India", "cart_id": "222222", "user_id": 0}
+
+    def post(self, body, key="order-1"):
+        return self.client.post(self.url, body, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay_returns_stored_response(self):
+        first = self.post(self.body)
+        replay = self.post(self.body)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay.data, first.data)
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertFalse(first.has_header("Idempotent-Replayed"))
+        self.assertEqual(api_models.CartOrder.objects.count(), 1)
+
+    def test_other_keys_and_no_key_run_again(self):
+        self.post(self.body)
+        self.post(self.body, key="order-2")
+        self.client.post(self.url, self.body, format="json")
+        self.assertEqual(api_models.CartOrder.objects.count(), 3)
+
+    def test_key_reused_for_another_request(self):
+        self.post(self.body)
+        response = self.post(dict(self.body, email="other@example.com"))
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(api_models.CartOrder.objects.count(), 1)
+
+    def test_abandoned_claim_is_taken_over(self):
+        self.post(self.body)
+        abandoned = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT + 1)
+        api_models.IdempotencyKey.objects.update(status_code=None, response=None, date=abandoned)
+        response = self.post(self.body)
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header("Idempotent-Replayed"))
+        self.assertEqual(api_models.IdempotencyKey.objects.get().status_code, 201)
+
+    def test_keys_are_scoped_to_the_cart(self):
+        course = api_models.Course.objects.get()
+        api_models.Cart.objects.create(course=course, price=course.price, total=course.price, cart_id="333333")
+        first = self.post(self.body)
+        second = self.post(dict(self.body, cart_id="333333"))
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        self.assertNotEqual(first.data["order_oid"], second.data["order_oid"])
+
+    def test_keys_are_scoped_to_the_user(self):
+        self.client.force_authenticate(self.students[0])
+        first = self.post(self.body)
+        self.client.force_authenticate(self.students[1])
+        second = self.post(self.body)
+        self.assertFalse(second.has_header("Idempotent-Replayed"))
+        self.assertNotEqual(first.data["order_oid"], second.data["order_oid"])
+
+    def test_multipart_replay(self):
+        body = dict(self.body, user_id=self.students[0].pk)
+        first = self.client.post(self.url, body, HTTP_IDEMPOTENCY_KEY="order-1")
+        replay = self.client.post(self.url, body, HTTP_IDEMPOTENCY_KEY="order-1")
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertEqual(replay.data, first.data)
+
+    def test_request_still_in_progress(self):
+        first = self.post(self.body)
+        api_models.IdempotencyKey.objects.update(status_code=None, response=None)
+        response = self.post(self.body)
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(api_models.CartOrder.objects.count(), 1)
@@ -22,16 +22,20 @@ urlpatterns = [
     path("course/category/", api_views.CategoryListAPIView.as_view()),
     path("course/course-list/", api_views.CourseListAPIView.as_view()),
     path("course/search", api_views.SearchCourseAPIView.as_view()),
+    path("course/suggest", api_views.CourseSuggestAPIView.as_view()),
     path("course/course-detail/<slug>/", api_views.CourseDetailAPIView.as_view()),
     path("course/cart/", api_views.CartAPIView.as_view()),
     path("course/cart-list/<cart_id>/", api_views.CartListAPIView.as_view()),
     path("course/cart-item-delete/<cart_id>/<item_id>/", api_views.CartItemDeleteAPIView.as_view()),
     path("cart/stats/<cart_id>/", api_views.CartStatsAPIView.as_view()),
+    path("cart/summary/<cart_id>/", api_views.CartSummaryAPIView.as_view()),
+    path("cart/contains/<cart_id>/", api_views.CartContainsAPIView.as_view()),
     path("order/create-order/", api_views.CreateOrderAPIView.as_view()),
     path("order/checkout/<oid>/", api_views.checkoutAPIView.as_view()),
     path("order/coupon/", api_views.CouponApplyAPIView.as_view()),
     path("payment/stripe-checkout/<order_oid>/", api_views.StripeCheckoutAPIView.as_view()),
     path("payment/payment-success/", api_views.PaymentSuccessAPIView.as_view()),
+    path("payment/stripe-webhook/", api_views.StripeWebhookAPIView.as_view()),
 
     # Student API Endpoints
 
@@ -44,7 +48,21 @@ urlpatterns = [
     path("student/rate-course/", api_views.StudentRateCourseCreateAPIView.as_view()),
     path("student/review-detail/<user_id>/<review_id>/", api_views.StudentRateCourseUpdateAPIView.as_view()),
     path("student/wishlist/<user_id>/", api_views.StudentWhishlistListCreateAPIView.as_view()),
+    path("student/wishlist-contains/<user_id>/", api_views.StudentWishlistContainsAPIView.as_view()),
     path("student/question-answer-list-create/<course_id>/", api_views.QuestionAnswerListCreateAPIView.as_view()),
     path("student/question-answer-message-create/", api_views.QuestionAnswerMessageSendAPIView.as_view()),
+    path("student/question-answer-message-list/<qa_id>/", api_views.QuestionAnswerMessageListAPIView.as_view()),
+    path("student/notification-list/<user_id>/", api_views.StudentNotificationListAPIView.as_view()),
+    path("student/notification-unseen/<user_id>/", api_views.StudentNotificationUnseenAPIView.as_view()),
+    path("student/notification-mark-seen/<user_id>/", api_views.StudentNotificationMarkSeenAPIView.as_view()),
+
+    # Teacher API Endpoints
+
+    path("teacher/notification-list/<teacher_id>/", api_views.TeacherNotificationListAPIView.as_view()),
+    path("teacher/notification-unseen/<teacher_id>/", api_views.TeacherNotificationUnseenAPIView.as_view()),
+    path("teacher/notification-mark-seen/<teacher_id>/", api_views.TeacherNotificationMarkSeenAPIView.as_view()),
+
+    # Push Endpoints (Server-Sent Events, ASGI only)
+    path("stream/", api_views.event_stream),
 
 ]
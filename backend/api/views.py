@@ -1,11 +1,14 @@
+import hashlib
 import random
+from datetime import timedelta
 from decimal import Decimal
-import requests
 
 from django.shortcuts import render, redirect
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
 from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 from django.contrib.auth.hashers import check_password
 
 import stripe
@@ -13,16 +16,115 @@ import stripe.error
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.permissions import AllowAny
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework import generics, status
 
 from api import serializer as api_serializer
 from api import models as api_models
+from api import cache as api_cache
+from api import payments
+from api import realtime
+from api import reference
+from api import services
+from api import stats
+from api import suggest
+from api import tasks as api_tasks
+from api.pagination import ActivityCursorPagination, DateCursorPagination, IdCursorPagination, SearchResultPagination
+from api.search import CourseSearchResults
 from userauths.models import User, Profile
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
-PAYPAL_CLIENT_ID = settings.PAYPAL_CLIENT_ID
-PAYPAL_SECRET_ID = settings.PAYPAL_SECRET_ID
+
+
+class ConditionalGetMixin:
+    """
+    Strong ETags for GET endpoints, derived from cache tag versions rather
+    than the rendered body. A matching If-None-Match returns 304 before the
+    queryset or serializer runs.
+    """
+    etag_tags = ()
+
+    def get_etag_versions(self):
+        return api_cache.tag_versions(self.etag_tags)
+
+    def get(self, request, *args, **kwargs):
+        etag = api_cache.etag_for(self.get_etag_versions(), request.get_full_path())
+        if api_cache.etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response["ETag"] = etag
+        return response
+
+
+class IdempotentMixin:
+    """
+    Honours an Idempotency-Key header on POST. The first request claims the
+    key with one INSERT and its response is stored; retries with the same key
+    get that response back from one indexed lookup. A retry that arrives while
+    the first request is still running gets 409, and reusing a key for a
+    different body gets 422. A claim left without a response for
+    IDEMPOTENCY_LOCK_TIMEOUT seconds (its process died) can be taken over.
+
+    Clients choose their own keys, so keys are scoped to the caller: the
+    authenticated user, or for anonymous calls the request field named by
+    `idempotency_owner_field` (the cart or order the request acts on).
+    """
+    idempotency_owner_field = None
+
+    def get_idempotency_scope(self, request):
+        if request.user.is_authenticated:
+            owner = f"user:{request.user.pk}"
+        elif self.idempotency_owner_field:
+            owner = f"{self.idempotency_owner_field}:{request.data.get(self.idempotency_owner_field)}"
+        else:
+            owner = "anonymous"
+        return f"{request.path} {owner}"
+
+    def post(self, request, *args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if not key:
+            return super().post(request, *args, **kwargs)
+
+        # request.body first: it can't be read once request.data has consumed the stream
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+        scope = self.get_idempotency_scope(request)
+        stored = api_models.IdempotencyKey.objects.filter(scope=scope, key=key).first()
+        now = timezone.now()
+        if stored and (
+            stored.date < now - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+            or stored.status_code is None and stored.date < now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+        ):
+            # Only delete the row we looked at, not a claim another retry just made
+            api_models.IdempotencyKey.objects.filter(pk=stored.pk, status_code=stored.status_code).delete()
+            stored = None
+
+        if stored:
+            if stored.fingerprint != fingerprint:
+                return Response({"message": "Idempotency-Key was already used with a different request"}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if stored.status_code is None:
+                return Response({"message": "A request with this Idempotency-Key is still in progress"}, status=status.HTTP_409_CONFLICT)
+            return Response(stored.response, status=stored.status_code, headers={"Idempotent-Replayed": "true"})
+
+        try:
+            with transaction.atomic():
+                stored = api_models.IdempotencyKey.objects.create(scope=scope, key=key, fingerprint=fingerprint)
+        except IntegrityError:
+            return Response({"message": "A request with this Idempotency-Key is still in progress"}, status=status.HTTP_409_CONFLICT)
+
+        try:
+            response = super().post(request, *args, **kwargs)
+        except Exception:
+            stored.delete()
+            raise
+
+        if response.status_code >= 500 or not hasattr(response, "data"):
+            # Let the client retry failures, and don't store what can't be replayed
+            stored.delete()
+        else:
+            api_models.IdempotencyKey.objects.filter(pk=stored.pk).update(status_code=response.status_code, response=response.data)
+        return response
 
 
 class MyTokenObtainPairView(TokenObtainPairView):
@@ -58,33 +160,9 @@ class PasswordResetEmailVerifyAPIView(generics.RetrieveAPIView):
             user.otp = generate_random_otp()  
             user.save()  
 
-            # Generate the password reset link containing query parameters
-            link = f"http://localhost:5173/create-new-password/?otp={user.otp}&uuidb64={uuidb64}&refresh_token={refresh_token}"
-
-            # Prepare the email content with the link and username
-            context = {
-                "link": link,
-                "username": user.username,
-            }
-
-            # Email subject and body (both text and HTML versions)
-            subject = 'Password Reset Email'
-            text_body = render_to_string("email/password_reset.txt", context)
-            html_body = render_to_string("email/password_reset.html", context)
-
-            # Prepare and send the email using EmailMultiAlternatives
-            msg = EmailMultiAlternatives(
-                subject=subject, 
-                from_email=settings.DEFAULT_FROM_EMAIL,  
-                to=[user.email],  
-                body=text_body  
-            )
-
-            # Attach the HTML body as an alternative format
-            msg.attach_alternative(html_body, "text/html") 
-            msg.send()  
-
-            print("Password reset link:", link)
+            # Rendering and SMTP happen in the worker; repeated requests for
+            # the same user collapse into one queued email
+            api_tasks.send_password_reset_email.enqueue(user_id=uuidb64, dedup_key=f"password-reset:{uuidb64}")
 
         return user 
 
@@ -143,20 +221,36 @@ class ProfileAPIView(generics.RetrieveUpdateAPIView):
         user = User.objects.get(id=user_id)
         return Profile.objects.get(user=user)  
 
-class CategoryListAPIView(generics.ListAPIView):
-    queryset = api_models.Category.objects.filter(active=True) 
+class CategoryListAPIView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = api_serializer.CategorySerializer 
     permission_classes = [AllowAny] 
+    etag_tags = [api_cache.CATEGORIES_TAG]
 
+    def get_queryset(self):
+        return reference.categories.get()
 
-class CourseListAPIView(generics.ListAPIView):
-    queryset = api_models.Course.objects.filter(platform_status="Published", teacher_course_status="Published")
-    
-    serializer_class = api_serializer.CourseSerializer 
-    permission_classes = [AllowAny] 
+
+class CourseListAPIView(ConditionalGetMixin, generics.ListAPIView):
+    serializer_class = api_serializer.CourseCardSerializer
+    permission_classes = [AllowAny]
+    pagination_class = DateCursorPagination
+    etag_tags = [api_cache.COURSE_LIST_TAG]
+
+    def get_catalog(self):
+        filters = api_serializer.CourseFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        return api_models.Course.objects.published().filter_catalog(**filters.validated_data)
+
+    def get_queryset(self):
+        return self.get_catalog().with_card_stats()
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.data["facets"] = self.get_catalog().facet_counts()
+        return response
 
 
-class CourseDetailAPIView(generics.RetrieveAPIView):
+class CourseDetailAPIView(ConditionalGetMixin, generics.RetrieveAPIView):
     queryset = api_models.Course.objects.filter(platform_status="Published", teacher_course_status="Published")
     serializer_class = api_serializer.CourseSerializer
     permission_classes = [AllowAny]
@@ -166,6 +260,27 @@ class CourseDetailAPIView(generics.RetrieveAPIView):
     
         course = api_models.Course.objects.get(slug=slug, platform_status="Published", teacher_course_status="Published")
         return course
+
+    def get_cache_key(self):
+        return f"course-detail:{self.kwargs['slug']}"
+
+    def get_etag_versions(self):
+        # A cache hit is served without touching the ORM; on a miss the tag
+        # versions are read before serializing so a concurrent write can't
+        # be cached as current.
+        self.entry = api_cache.get_tagged(self.get_cache_key())
+        if self.entry is not None:
+            return self.entry["versions"]
+
+        self.course = self.get_object()
+        self.versions = api_cache.tag_versions([api_cache.course_tag(self.course.pk), api_cache.teacher_tag(self.course.teacher_id)])
+        return self.versions
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.entry is None:
+            data = self.get_serializer(self.course).data
+            self.entry = api_cache.set_tagged(self.get_cache_key(), data, self.versions, settings.COURSE_DETAIL_CACHE_TIMEOUT)
+        return Response(self.entry["data"])
     
 
 class CartAPIView(generics.CreateAPIView):
@@ -190,12 +305,8 @@ class CartAPIView(generics.CreateAPIView):
             user = None
 
         # Step 3: Handle Country and Tax Calculation
-        try:
-            country_object = api_models.Country.objects.filter(name=country_name).first()
-            country = country_object.name  
-        except:
-            country_object = None
-            country = "United States"  
+        country_object = reference.countries.get().get(country_name)
+        country = country_object.name if country_object else "United States"
 
         # Calculate tax rate. If no country found, default to a tax rate of 0.
         if country_object:
@@ -238,11 +349,12 @@ class CartAPIView(generics.CreateAPIView):
 class CartListAPIView(generics.ListAPIView):
     serializer_class = api_serializer.CartSerializer
     permission_classes = [AllowAny]
+    pagination_class = DateCursorPagination
 
     def get_queryset(self):
         cart_id = self.kwargs['cart_id']
         queryset = api_models.Cart.objects.filter(cart_id=cart_id)
-        return queryset
+        return self.get_serializer_class().setup_queryset(queryset, self.request)
 
 class CartItemDeleteAPIView(generics.DestroyAPIView):
     serializer_class = api_serializer.CartSerializer
@@ -266,30 +378,53 @@ class CartStatsAPIView(generics.RetrieveAPIView):
         return queryset
     
     def get(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
+        data = self.get_queryset().totals()
 
-        total_price = 0.00
-        total_tax = 0.00
-        total_total = 0.00
+        return Response(data, status=status.HTTP_200_OK)
 
-        for cart_item in queryset:
-            total_price += float(cart_item.price)
-            total_tax += float(cart_item.tax_fee)
-            total_total += round(float(cart_item.total), 2)
 
-        data = {
-            "price": total_price,
-            "tax": total_tax,
-            "total": total_total,
-            "items_count": queryset.count()
-        }
+class CourseMembershipAPIView(generics.GenericAPIView):
+    # Which of the given courses are in a cart or wishlist, so a page of
+    # course cards can mark them without loading the whole list
+    permission_classes = [AllowAny]
 
-        return Response(data, status=status.HTTP_200_OK)
+    def get(self, request, *args, **kwargs):
+        params = api_serializer.CourseIdsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        course_ids = self.get_queryset().filter(course_id__in=params.validated_data["course_id"]).values_list("course_id", flat=True)
 
+        return Response({"course_ids": sorted(set(course_ids))}, status=status.HTTP_200_OK)
 
-class CreateOrderAPIView(generics.CreateAPIView):
+
+class CartContainsAPIView(CourseMembershipAPIView):
+    def get_queryset(self):
+        return api_models.Cart.objects.filter(cart_id=self.kwargs['cart_id'])
+
+
+class CartSummaryAPIView(generics.GenericAPIView):
+    # Cart lines and totals in one response, two queries however full the cart
+    serializer_class = api_serializer.CartLineSerializer
+    permission_classes = [AllowAny]
+
+    def get_queryset(self):
+        return api_models.Cart.objects.filter(cart_id=self.kwargs['cart_id'])
+
+    def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        lines = queryset.select_related("course").only(
+            "id", "course_id", "price", "tax_fee", "total", "course__title", "course__slug", "course__image",
+        ).order_by("-date", "-id")
+
+        return Response({
+            "items": self.get_serializer(lines, many=True).data,
+            "totals": api_serializer.CartTotalsSerializer(queryset.totals()).data,
+        }, status=status.HTTP_200_OK)
+
+
+class CreateOrderAPIView(IdempotentMixin, generics.CreateAPIView):
     serializer_class = api_serializer.CartOrderSerializer
     permission_classes = [AllowAny]
+    idempotency_owner_field = "cart_id"
     queryset = api_models.CartOrder.objects.all()
 
     def create(self, request, *args, **kwargs):
@@ -304,67 +439,24 @@ class CreateOrderAPIView(generics.CreateAPIView):
         else:
             user = None
 
-        cart_items = api_models.Cart.objects.filter(cart_id=cart_id)
-
-        total_price = Decimal(0.00)
-        total_tax = Decimal(0.00)
-        total_initial_total = Decimal(0.00)
-        total_total = Decimal(0.00)
-
-        order = api_models.CartOrder.objects.create(
-            full_name=full_name,
-            email=email,
-            country=country,
-            student=user
-        )
-
-        for c in cart_items:
-            # Check if the CartOrderItem already exists for this order and course
-            existing_item = api_models.CartOrderItem.objects.filter(order=order, course=c.course).first()
-
-            if existing_item:
-                continue
-            else:
-                # Create a new CartOrderItem if it doesn't exist
-                api_models.CartOrderItem.objects.create(
-                    order=order,
-                    course=c.course,
-                    price=c.price,
-                    tax_fee=c.tax_fee,
-                    total=c.total,
-                    initial_total=c.total,
-                    teacher=c.course.teacher
-                )
-
-            # Update totals as before
-            total_price += Decimal(str(c.price))
-            total_tax += Decimal(str(c.tax_fee))
-            total_initial_total += Decimal(str(c.total))
-            total_total += Decimal(str(c.total))
-
-            order.teachers.add(c.course.teacher)
-
-        
-        order.sub_total = total_price
-        order.tax_fee = total_tax
-        order.initial_total = total_initial_total
-        order.total = total_total
-
-        order.save()
+        order = services.create_order(cart_id, student=user, full_name=full_name, email=email, country=country)
 
         return Response({"message": "Order Created Successfully", "order_oid": order.oid}, status=status.HTTP_201_CREATED)
     
 
 class checkoutAPIView(generics.RetrieveAPIView):
-    queryset = api_models.CartOrder.objects.all()   
     serializer_class = api_serializer.CartOrderSerializer
     permission_classes = [AllowAny]
     lookup_field = 'oid'
 
+    def get_queryset(self):
+        return self.get_serializer_class().setup_queryset(api_models.CartOrder.objects.all(), self.request)
+
 
-class CouponApplyAPIView(generics.CreateAPIView):
+class CouponApplyAPIView(IdempotentMixin, generics.CreateAPIView):
     serializer_class = api_serializer.CouponSerializer
     permission_classes = [AllowAny]
+    idempotency_owner_field = "order_oid"
 
     def create(self, request, *args, **kwargs):
         # Extracting Data:
@@ -421,8 +513,9 @@ class StripeCheckoutAPIView(generics.CreateAPIView):
             return Response({"message": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
 
         try:
-            checkout_session = stripe.checkout.Session.create(
+            checkout_session = payments.stripe_client().create_checkout_session(
                 customer_email= order.email,
+                client_reference_id=order.oid,
                 payment_method_types=['card'],
                 line_items=[
                     {
@@ -441,29 +534,18 @@ class StripeCheckoutAPIView(generics.CreateAPIView):
                 cancel_url=settings.FRONTEND_SITE_URL + '/payment-failed/',
             )
             
-            print("checkout_session =====", checkout_session)
             order.stripe_session_id = checkout_session.id
+            order.save(update_fields=["stripe_session_id"])
 
             return redirect(checkout_session.url) # stripe checkout session having a URL - there will redirect
         except stripe.error.StripeError as e:
             return Response({"message": f"Something went wrong when trying to make payment. Error: {str(e)}"})
 
 
-def get_access_token(client_id, secret_key):
-    token_url = "https://api.sandbox.paypal.com/v1/oauth2/token"
-    data = {'grant_type': 'client_credentials'}
-    auth = (client_id, secret_key)
-    response = requests.post(token_url, data=data, auth=auth)
-
-    if response.status_code == 200:
-        return response.json()['access_token']
-    else:
-        raise Exception(f'Failed to get access token from paypal {response.status_code}')
-    
-
-class PaymentSuccessAPIView(generics.CreateAPIView):
+class PaymentSuccessAPIView(IdempotentMixin, generics.CreateAPIView):
     serializer_class = api_serializer.CartOrderSerializer
     queryset = api_models.CartOrder.objects.all()
+    idempotency_owner_field = "order_oid"
 
 
     def create(self, request, *args, **kwargs):
@@ -472,75 +554,38 @@ class PaymentSuccessAPIView(generics.CreateAPIView):
         paypal_order_id = request.data['paypal_order_id']
 
         order = api_models.CartOrder.objects.get(oid=order_oid)
-        order_items = api_models.CartOrderItem.objects.filter(order=order)
-        print({'Order items': order_items})
 
         # Paypal payment success
 
         if paypal_order_id != "null":
-            paypal_api_url = f"https://api-m.sandbox.paypal.com/v2/checkout/orders/{paypal_order_id}"
-            headers = {
-                'Content-Type': 'application/json',
-                'Authorization': f'Bearer {get_access_token(settings.PAYPAL_CLIENT_ID, settings.PAYPAL_SECRET_ID)}'
-            }
-            response = requests.get(paypal_api_url, headers=headers)
-            if response.status_code == 200:
-                paypal_order_data = response.json()
-                paypal_payment_status = paypal_order_data['status']
-                if paypal_payment_status == 'COMPLETED':
-                    if order.payment_status == "Processing":
-                        order.payment_status = "Paid"
-                        order.save()
-
-                        api_models.Notification.objects.create(user=order.student, order=order, type="Course Enrollment Completed")
-                        
-                        for o in order_items:
-                            api_models.Notification.objects.create(
-                                teacher=o.teacher,
-                                order=order,
-                                order_item=o,
-                                type="New Order",
-                            )
-                            api_models.EnrolledCourse.objects.create(
-                                course=o.course,
-                                teacher=o.teacher,
-                                user=order.student,
-                                order_item=o,
-                            ) 
-                        
-                        return Response({"message": "Payment Successful"})
-                    else:
-                        return Response({"message": "Payment Already Paid"}, status=status.HTTP_200_OK)
+            try:
+                paypal_order_data = payments.paypal().get_order(paypal_order_id)
+            except payments.PaymentGatewayError as e:
+                return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            paypal_payment_status = paypal_order_data['status']
+            if paypal_payment_status == 'COMPLETED':
+                if services.confirm_payment(order):
+                    return Response({"message": "Payment Successful"})
                 else:
-                    return Response({"message": "Payment Failed"}, status=status.HTTP_400_BAD_REQUEST)
+                    return Response({"message": "Payment Already Paid"}, status=status.HTTP_200_OK)
             else:
-                return Response({"message": f"Paypal Error Occured. Error: {response.status_code}"}, status=status.HTTP_400_BAD_REQUEST)
+                return Response({"message": "Payment Failed"}, status=status.HTTP_400_BAD_REQUEST)
 
 
         # Stripe payment success
 
         if session_id != 'null':
-            session = stripe.checkout.Session.retrieve(session_id)
+            # The webhook usually got here first, then there's nothing to ask Stripe
+            if order.payment_status == "Paid" and order.stripe_session_id == session_id:
+                return Response({"message": "Payment Successful"}, status=status.HTTP_200_OK)
+
+            try:
+                session = payments.stripe_client().retrieve_checkout_session(session_id)
+            except stripe.error.StripeError as e:
+                return Response({"message": f"Stripe Error Occured. Error: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
             if session.payment_status == 'paid':
-                if order.payment_status == "Processing":
-                    order.payment_status = "Paid"
-                    order.save()
-
-                    api_models.Notification.objects.create(user=order.student, order=order, type="Course Enrollment Completed")
-                        
-                    for o in order_items:
-                        api_models.Notification.objects.create(
-                            teacher=o.teacher,
-                            order=order,
-                            order_item=o,
-                            type="New Order",
-                        )
-                        api_models.EnrolledCourse.objects.create(
-                            course=o.course,
-                            teacher=o.teacher,
-                            user=order.student,
-                            order_item=o,
-                        )
+                if services.confirm_payment(order):
                     return Response({"message": "Payment Successful"}, status=status.HTTP_200_OK)
                 else:
                     return Response({"message": "Payment Already Paid"}, status=status.HTTP_200_OK)
@@ -548,14 +593,43 @@ class PaymentSuccessAPIView(generics.CreateAPIView):
                 return Response({"message": "Payment Failed"}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class StripeWebhookAPIView(generics.GenericAPIView):
+    # Verify, store, acknowledge; fulfilment runs in the worker
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def post(self, request, *args, **kwargs):
+        payload = request.body
+        try:
+            event = payments.verify_stripe_webhook(payload, request.META.get("HTTP_STRIPE_SIGNATURE"))
+        except payments.PaymentGatewayError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        services.receive_stripe_event(event, payload.decode())
+        return Response({"received": True}, status=status.HTTP_200_OK)
+
+
 class SearchCourseAPIView(generics.ListAPIView):
-    serializer_class = api_serializer.CourseSerializer
+    serializer_class = api_serializer.CourseCardSerializer
     permission_classes = [AllowAny]
-    
+    pagination_class = SearchResultPagination
 
     def get_queryset(self):
-        query = self.request.GET.get('query')
-        return api_models.Course.objects.filter(title__contains=query, platform_status="Published", teacher_course_status="Published")
+        query = self.request.GET.get('query', '')
+        return CourseSearchResults(query, api_models.Course.objects.published().with_card_stats())
+
+
+class CourseSuggestAPIView(generics.GenericAPIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get('query', '')
+        try:
+            limit = min(int(request.GET.get('limit', suggest.DEFAULT_LIMIT)), suggest.MAX_LIMIT)
+        except ValueError:
+            limit = suggest.DEFAULT_LIMIT
+
+        return Response(suggest.index.suggest(query, limit), status=status.HTTP_200_OK)
 
 
 class StudentSummaryAPIView(generics.ListAPIView):
@@ -563,19 +637,12 @@ class StudentSummaryAPIView(generics.ListAPIView):
     permission_classes = [AllowAny]
 
     def get_queryset(self):
-        user_id = self.kwargs['user_id']
-        user = User.objects.get(id=user_id)
-
-        total_courses = api_models.EnrolledCourse.objects.filter(user=user).count()
-        completed_lessons = api_models.CompletedLesson.objects.filter(user=user).count()
-        achieved_certificates  = api_models.Certificate.objects.filter(user=user).count()
-
+        # One primary-key read of the counters kept by api.signals
+        row = stats.student_stats(self.kwargs['user_id'])
+        if row is None:
+            raise NotFound("User not found")
 
-        return [{
-            "total_courses": total_courses,
-            "completed_lessons": completed_lessons,
-            "achieved_certificates": achieved_certificates
-        }]
+        return [row]
     
 
     def list(self, request, *args, **kwargs):
@@ -585,13 +652,13 @@ class StudentSummaryAPIView(generics.ListAPIView):
 
 
 class StudentCourseListAPIView(generics.ListAPIView):
-    serializer_class = api_serializer.EnrolledCourseSerializer
+    serializer_class = api_serializer.EnrolledCourseCardSerializer
     permission_classes = [AllowAny]
+    pagination_class = DateCursorPagination
 
     def get_queryset(self):
         user_id = self.kwargs['user_id']
-        user = User.objects.get(id=user_id)
-        return api_models.EnrolledCourse.objects.filter(user=user)
+        return api_models.EnrolledCourse.objects.filter(user_id=user_id).select_related("course__teacher").with_progress()
     
 class StudentCourseDetailAPIView(generics.RetrieveAPIView):
     serializer_class = api_serializer.EnrolledCourseSerializer
@@ -619,19 +686,31 @@ class StudentCourseCompletedCreateAPIView(generics.CreateAPIView):
         course = api_models.Course.objects.get(id=course_id)
         variant_item = api_models.VariantItem.objects.get(variant_item_id=variant_item_id)
 
-        completed_lesson = api_models.CompletedLesson.objects.filter(user=user, course=course, variant_item=variant_item).first()
+        enrollments = api_models.EnrolledCourse.objects.filter(user=user, course=course)
+        with transaction.atomic():
+            # Lock the enrollment first so double clicks toggle one after the other
+            list(enrollments.select_for_update().only("id"))
+            completed_lesson = api_models.CompletedLesson.objects.filter(user=user, course=course, variant_item=variant_item).first()
 
-        if completed_lesson:
-            completed_lesson.delete()
-            return Response({"message": "Course marked as not completed"})
-
-        else:
-            api_models.CompletedLesson.objects.create(
-                user=user,
-                course=course,
-                variant_item=variant_item,
-            )
-            return Response({"message": "Course marked as completed"})
+            if completed_lesson:
+                completed_lesson.delete()
+                message = "Course marked as not completed"
+            else:
+                api_models.CompletedLesson.objects.create(
+                    user=user,
+                    course=course,
+                    variant_item=variant_item,
+                )
+                message = "Course marked as completed"
+
+        # The progress fields were brought up to date by the CompletedLesson signals
+        progress = enrollments.values("completed_lessons", "completed_at").first() or {}
+        return Response({
+            "message": message,
+            "completed_lessons": progress.get("completed_lessons", 0),
+            "lecture_count": course.lecture_count,
+            "course_completed": progress.get("completed_at") is not None,
+        })
         
 
 class StudentNoteCreateAPIView(generics.ListCreateAPIView):
@@ -685,9 +764,12 @@ class StudentRateCourseCreateAPIView(generics.CreateAPIView):
     def create(self, request, *args, **kwargs):
         user_id = request.data['user_id']
         course_id = request.data['course_id']
-        rating = request.data['rating']
+        rating = stats.counted_rating(request.data['rating'])
         review = request.data['review']
 
+        if rating is None:
+            return Response({"message": "Rating must be between 1 and 5"}, status=status.HTTP_400_BAD_REQUEST)
+
         user = User.objects.get(id=user_id)
         course = api_models.Course.objects.get(id=course_id)
 
@@ -717,11 +799,13 @@ class StudentRateCourseUpdateAPIView(generics.RetrieveUpdateAPIView):
 class StudentWhishlistListCreateAPIView(generics.ListCreateAPIView):
     serializer_class = api_serializer.WhishlistSerializer
     permission_classes = [AllowAny]
+    pagination_class = IdCursorPagination
 
     def get_queryset(self):
         user_id = self.kwargs['user_id']
         user = User.objects.get(id=user_id)
-        return api_models.Whishlist.objects.filter(user=user)
+        queryset = api_models.Whishlist.objects.filter(user=user)
+        return self.get_serializer_class().setup_queryset(queryset, self.request)
     
     def create(self, request, *args, **kwargs):
         user_id = request.data['user_id']
@@ -739,14 +823,19 @@ class StudentWhishlistListCreateAPIView(generics.ListCreateAPIView):
             return Response({"message": "Course added to wishlist"}, status=status.HTTP_201_CREATED)
         
 
+class StudentWishlistContainsAPIView(CourseMembershipAPIView):
+    def get_queryset(self):
+        return api_models.Whishlist.objects.filter(user_id=self.kwargs['user_id'])
+
+
 class QuestionAnswerListCreateAPIView(generics.ListCreateAPIView):
     serializer_class = api_serializer.Question_AnswerSerializer
     permission_classes = [AllowAny]
+    pagination_class = ActivityCursorPagination
 
     def get_queryset(self):
         course_id = self.kwargs['course_id']
-        course = api_models.Course.objects.get(id=course_id)
-        return api_models.Question_Answer.objects.filter(course=course)
+        return api_models.Question_Answer.objects.filter(course_id=course_id).threads()
     
     def create(self, request, *args, **kwargs):
         course_id = request.data['course_id']
@@ -794,5 +883,95 @@ class QuestionAnswerMessageSendAPIView(generics.CreateAPIView):
             question=question
         )
 
+        question = api_models.Question_Answer.objects.threads().get(pk=question.pk)
         question_serializer = api_serializer.Question_AnswerSerializer(question)
-        return Response({"message": "Message Sent", "question": question_serializer.data})
\ No newline at end of file
+        return Response({"message": "Message Sent", "question": question_serializer.data})
+
+
+class QuestionAnswerMessageListAPIView(generics.ListAPIView):
+    # Full history of a thread, newest first; the thread list only embeds the latest messages
+    serializer_class = api_serializer.Question_Answer_MessageSerializer
+    permission_classes = [AllowAny]
+    pagination_class = DateCursorPagination
+
+    def get_queryset(self):
+        qa_id = self.kwargs['qa_id']
+        return api_models.Question_Answer_Message.objects.filter(question__qa_id=qa_id).select_related("user__profile")
+
+
+class NotificationRecipientMixin:
+    # "user" for the student feed, "teacher" for the teacher feed; the URL carries <user_id> or <teacher_id>
+    recipient = "user"
+
+    def recipient_kwargs(self):
+        return {f"{self.recipient}_id": self.kwargs[f"{self.recipient}_id"]}
+
+
+class StudentNotificationListAPIView(NotificationRecipientMixin, generics.ListAPIView):
+    # Newest first, keyset-paged off the (recipient, date, id) indexes; ?unseen=1 for unseen only
+    serializer_class = api_serializer.NotificationSerializer
+    permission_classes = [AllowAny]
+    pagination_class = DateCursorPagination
+
+    def get_queryset(self):
+        queryset = api_models.Notification.objects.filter(**self.recipient_kwargs())
+        if self.request.query_params.get("unseen"):
+            queryset = queryset.filter(seen=False)
+        return queryset
+
+
+class StudentNotificationUnseenAPIView(NotificationRecipientMixin, generics.GenericAPIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        # A counter read, however many notifications there are
+        unseen = stats.unseen_notifications(**self.recipient_kwargs())
+        if unseen is None:
+            raise NotFound("Recipient not found")
+        return Response({"unseen": unseen})
+
+
+class StudentNotificationMarkSeenAPIView(NotificationRecipientMixin, generics.GenericAPIView):
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        updated = stats.mark_notifications_seen(**self.recipient_kwargs())
+        return Response({"message": "Notifications marked as seen", "updated": updated})
+
+
+class TeacherNotificationListAPIView(StudentNotificationListAPIView):
+    recipient = "teacher"
+
+
+class TeacherNotificationUnseenAPIView(StudentNotificationUnseenAPIView):
+    recipient = "teacher"
+
+
+class TeacherNotificationMarkSeenAPIView(StudentNotificationMarkSeenAPIView):
+    recipient = "teacher"
+
+
+async def event_stream(request):
+    """
+    Server-Sent Events for Q&A of ?course_id= and notifications of ?user_id=
+    and ?teacher_id=. Needs the ASGI app (backend.asgi); a plain Django view
+    because DRF views are sync and would hold a worker thread per client.
+    """
+    channels = []
+    if request.GET.get("course_id"):
+        channels.append(realtime.course_channel(request.GET["course_id"]))
+    if request.GET.get("user_id"):
+        channels.append(realtime.user_channel(request.GET["user_id"]))
+    if request.GET.get("teacher_id"):
+        channels.append(realtime.teacher_channel(request.GET["teacher_id"]))
+    if not channels:
+        return JsonResponse({"message": "Pass course_id, user_id or teacher_id"}, status=400)
+    if not isinstance(request, ASGIRequest):
+        # WSGI would drain the whole stream before sending a byte, holding a
+        # worker thread all along; 204 tells EventSource not to reconnect
+        return HttpResponse(status=204)
+
+    response = StreamingHttpResponse(realtime.stream(channels), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Don't let nginx buffer the stream
+    return response
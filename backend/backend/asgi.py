@@ -5,6 +5,12 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+The event stream (api/v1/stream/) only works when the API is served from
+here, e.g. `uvicorn backend.asgi:application` in development or
+`gunicorn backend.asgi:application -k uvicorn.workers.UvicornWorker` in
+production. Under runserver/WSGI it answers 204 and the frontend, built
+without VITE_REALTIME_EVENTS=true, refetches instead of subscribing.
 """
 
 import os
@@ -14,3 +20,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+# Fill the process-local reference tables before the first request
+from api import reference
+reference.preload()
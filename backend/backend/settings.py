@@ -84,6 +84,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Worker threads and web requests write concurrently; wait for the
+        # write lock instead of failing with "database is locked"
+        'OPTIONS': {'timeout': 20},
     }
 }
 
@@ -147,6 +150,9 @@ DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL')
 # STRIPE PAYMENT
 
 STRIPE_SECRET_KEY = env("STRIPE_SECRET_KEY")
+STRIPE_WEBHOOK_SECRET = env("STRIPE_WEBHOOK_SECRET", "")
+# Failed inbox events are retried with backoff, then set aside
+STRIPE_INBOX_MAX_ATTEMPTS = env.int("STRIPE_INBOX_MAX_ATTEMPTS", 8)
 FRONTEND_SITE_URL = env("FRONTEND_SITE_URL")
 BACKEND_SITE_URL = env("BACKEND_SITE_URL")
 
@@ -154,6 +160,14 @@ BACKEND_SITE_URL = env("BACKEND_SITE_URL")
 PAYPAL_CLIENT_ID = env("PAYPAL_CLIENT_ID")
 PAYPAL_SECRET_ID = env("PAYPAL_SECRET_ID")
 
+# Provider endpoints and client tuning, see api/payments.py. Point both bases
+# at `manage.py payment_stub` to benchmark checkout offline.
+PAYPAL_API_BASE = env("PAYPAL_API_BASE", "https://api-m.sandbox.paypal.com")
+STRIPE_API_BASE = env("STRIPE_API_BASE", "https://api.stripe.com")
+PAYMENT_CONNECT_TIMEOUT = env.float("PAYMENT_CONNECT_TIMEOUT", 3.05)
+PAYMENT_READ_TIMEOUT = env.float("PAYMENT_READ_TIMEOUT", 10)
+PAYMENT_POOL_SIZE = env.int("PAYMENT_POOL_SIZE", 10)
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -233,5 +247,40 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Cache
+# Use a shared backend (e.g. django.core.cache.backends.redis.RedisCache) when
+# running more than one worker process so invalidations reach all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': env("CACHE_BACKEND", 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env("CACHE_LOCATION", 'techgrad'),
+    }
+}
+
+COURSE_DETAIL_CACHE_TIMEOUT = env.int("COURSE_DETAIL_CACHE_TIMEOUT", 300)
+
+# List pagination
+
+API_PAGE_SIZE = env.int("API_PAGE_SIZE", 20)
+API_MAX_PAGE_SIZE = env.int("API_MAX_PAGE_SIZE", 100)
+
+# Latest messages embedded in each Q&A thread; older ones page in from the message list
+QA_THREAD_MESSAGES = env.int("QA_THREAD_MESSAGES", 20)
+
+# Push events (core.pubsub) and the event stream served over ASGI
+PUBSUB_BACKEND = env("PUBSUB_BACKEND", "core.pubsub.DatabaseBroker")
+PUBSUB_POLL_INTERVAL = env.float("PUBSUB_POLL_INTERVAL", 0.5)  # seconds, DatabaseBroker only
+PUBSUB_RETENTION = env.int("PUBSUB_RETENTION", 300)  # seconds a published row is kept, DatabaseBroker only
+PUBSUB_QUEUE_SIZE = env.int("PUBSUB_QUEUE_SIZE", 100)  # per open stream
+EVENT_STREAM_HEARTBEAT = env.int("EVENT_STREAM_HEARTBEAT", 15)  # seconds
+EVENT_STREAM_MAX_AGE = env.int("EVENT_STREAM_MAX_AGE", 300)  # seconds before the client is told to reconnect
+
+# How long a stored Idempotency-Key response is replayed
+IDEMPOTENCY_KEY_TTL = env.int("IDEMPOTENCY_KEY_TTL", 60 * 60 * 24)
+# How long a claimed key with no response yet blocks retries; after that the
+# first request is presumed dead and the key can be claimed again
+IDEMPOTENCY_LOCK_TIMEOUT = env.int("IDEMPOTENCY_LOCK_TIMEOUT", 60)
+
 # Set coresheader to allow all origin
 CORS_ALLOW_ALL_ORIGINS = True
\ No newline at end of file
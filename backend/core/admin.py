@@ -1,3 +1,5 @@
 from django.contrib import admin
+from core import models
 
-# Register your models here.
+
+admin.site.register(models.Task)
@@ -0,0 +1,42 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import taskqueue
+
+
+def run_in_thread(job):
+    try:
+        return taskqueue.run(job)
+    finally:
+        # Connections are per thread; don't leave one open per pool thread
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run queued background tasks (emails, order fulfilment, ...) in a thread pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=4, help="Tasks run concurrently")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds to sleep when the queue is empty")
+        parser.add_argument("--burst", action="store_true", help="Exit once no task is due")
+
+    def handle(self, *args, **options):
+        worker = taskqueue.worker_id()
+        taskqueue.purge_finished()
+        self.stdout.write(f"Worker {worker} running {len(taskqueue.registry)} task types on {options['threads']} threads")
+
+        with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+            while True:
+                taskqueue.requeue_stale()
+                jobs = taskqueue.claim(worker, options["threads"])
+                if not jobs:
+                    if options["burst"]:
+                        break
+                    time.sleep(options["interval"])
+                    continue
+
+                for job, ok in zip(jobs, pool.map(run_in_thread, jobs)):
+                    self.stdout.write(f"{job.name} #{job.pk}: {'done' if ok else 'failed'}")
@@ -0,0 +1,74 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so nothing this process already imported skews
+# the numbers. Prints setup wall time and peak RSS as one JSON line on stdout.
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform != "darwin":
+    peak *= 1024
+print(json.dumps({"setup_seconds": elapsed, "peak_rss_bytes": peak}))
+"""
+
+
+def parse_importtime(stderr):
+    # Lines look like "import time:   self [us] | cumulative | <indent>module"
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+        })
+    return modules
+
+
+class Command(BaseCommand):
+    help = "Measure cold start: per-module import times and peak memory of django.setup() in a fresh interpreter"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=20, help="Number of slowest top-level imports to list")
+        parser.add_argument("--json", action="store_true", help="Emit one JSON document, for tracking over time")
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "backend.settings"))
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", PROBE],
+            capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+        )
+        if result.returncode != 0:
+            raise CommandError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "django.setup() failed")
+
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        modules = parse_importtime(result.stderr)
+        top_level = sorted((module for module in modules if module["depth"] == 0), key=lambda module: module["cumulative_us"], reverse=True)
+        report["import_seconds"] = sum(module["self_us"] for module in modules) / 1_000_000
+        report["module_count"] = len(modules)
+        report["slowest_imports"] = top_level[:options["top"]]
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report))
+            return
+
+        self.stdout.write(f"django.setup(): {report['setup_seconds']:.3f}s")
+        self.stdout.write(f"imports:        {report['import_seconds']:.3f}s across {report['module_count']} modules")
+        self.stdout.write(f"peak RSS:       {report['peak_rss_bytes'] / (1024 * 1024):.1f} MB")
+        self.stdout.write("")
+        self.stdout.write(f"{'cumulative ms':>14}  {'self ms':>8}  module")
+        for module in report["slowest_imports"]:
+            self.stdout.write(f"{module['cumulative_us'] / 1000:>14.1f}  {module['self_us'] / 1000:>8.1f}  {module['module']}")
@@ -1,3 +1,47 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+TASK_STATUS = (
+    ("Queued", "Queued"),
+    ("Running", "Running"),
+    ("Done", "Done"),
+    ("Failed", "Failed"),
+)
+
+
+class Task(models.Model):
+    """A unit of background work, see core.taskqueue and `manage.py runworker`."""
+
+    name = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict, blank=True)
+    # Unique while queued, cleared when a worker claims the task
+    dedup_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=TASK_STATUS, default="Queued")
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, null=True, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(null=True, blank=True)
+    date = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_after"], name="task_status_run_after_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+class PubSubMessage(models.Model):
+    """A published event, relayed to open streams in every process by core.pubsub.DatabaseBroker."""
+
+    channel = models.CharField(max_length=200)
+    message = models.JSONField(encoder=DjangoJSONEncoder)
+    date = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return self.channel
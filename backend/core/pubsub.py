@@ -0,0 +1,169 @@
+"""
+Publish/subscribe for pushing events to open streaming responses.
+
+`publish(channel, message)` may be called from any thread: signal handlers,
+sync views, task workers. Subscribers are asyncio consumers running in the
+ASGI event loop. Messages must be JSON-serializable.
+
+LocalBroker only reaches subscribers in the same process. The default
+DatabaseBroker stores each message in a table that every serving process
+polls, so events published by other API processes or by `runworker` (which
+creates the order notifications) reach open streams too, within
+PUBSUB_POLL_INTERVAL. For lower latency, point PUBSUB_BACKEND at a broker
+with the same publish/subscribe/unsubscribe interface that relays through a
+push service (Redis, Postgres NOTIFY).
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.models import PubSubMessage
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, channels, queue_size):
+        self.channels = tuple(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        # Set when messages were dropped for a slow consumer, who should refetch
+        self.overflowed = False
+
+    def deliver(self, channel, message):
+        # Runs in the subscriber's loop
+        try:
+            self.queue.put_nowait((channel, message))
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout=None):
+        """Next (channel, message), or None if nothing arrived within timeout seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    def __init__(self, queue_size=None):
+        self.queue_size = queue_size or settings.PUBSUB_QUEUE_SIZE
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, channel, message)
+            except RuntimeError:
+                # Its loop has shut down; the stream is gone
+                self.unsubscribe(subscription)
+
+    def subscribe(self, channels):
+        """Must be called from the consumer's event loop."""
+        subscription = Subscription(channels, self.queue_size)
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+
+
+class DatabaseBroker(LocalBroker):
+    """
+    Publishes by inserting a PubSubMessage row. A daemon thread, started by
+    the first subscription in the process, reads new rows every
+    PUBSUB_POLL_INTERVAL seconds and delivers them to local subscribers, and
+    now and then deletes rows older than PUBSUB_RETENTION.
+    """
+
+    BATCH = 1000
+    PURGE_EVERY = 60  # seconds
+
+    def __init__(self, queue_size=None):
+        super().__init__(queue_size)
+        self._last_id = None
+        self._purged_at = 0.0
+        self._poller = None
+        self._stop = threading.Event()
+
+    def publish(self, channel, message):
+        PubSubMessage.objects.create(channel=channel, message=message)
+
+    def subscribe(self, channels):
+        subscription = super().subscribe(channels)
+        with self._lock:
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll_forever, name="pubsub-poller", daemon=True)
+                self._poller.start()
+        return subscription
+
+    def poll(self):
+        """Deliver rows published since the last poll. Returns how many were read."""
+        if self._last_id is None:
+            # Start from now; streams refetch what they missed before subscribing
+            self._last_id = PubSubMessage.objects.order_by("-id").values_list("id", flat=True).first() or 0
+            return 0
+        rows = list(PubSubMessage.objects.filter(id__gt=self._last_id).order_by("id").values_list("id", "channel", "message")[:self.BATCH])
+        for pk, channel, message in rows:
+            super().publish(channel, message)
+            self._last_id = pk
+
+        now = time.monotonic()
+        if now - self._purged_at >= self.PURGE_EVERY:
+            self._purged_at = now
+            cutoff = timezone.now() - timedelta(seconds=settings.PUBSUB_RETENTION)
+            PubSubMessage.objects.filter(date__lt=cutoff).delete()
+        return len(rows)
+
+    def close(self):
+        self._stop.set()
+        if self._poller is not None:
+            self._poller.join()
+
+    def _poll_forever(self):
+        while not self._stop.is_set():
+            try:
+                read = self.poll()
+            except Exception:
+                logger.exception("Polling for published events failed")
+                read = 0
+            finally:
+                close_old_connections()
+            if read < self.BATCH:
+                self._stop.wait(settings.PUBSUB_POLL_INTERVAL)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.PUBSUB_BACKEND)()
+    return _broker
+
+
+def publish(channel, message):
+    broker().publish(channel, message)
@@ -0,0 +1,136 @@
+"""
+A small database-backed task queue.
+
+Register work with @task, queue it with `func.enqueue(**payload)` and run it
+with `manage.py runworker`. Payloads are stored as JSON, so pass ids rather
+than model instances. Tasks may run more than once (a worker can die after
+the work but before marking it done), so they should be idempotent.
+"""
+
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from core.models import Task
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE = 5  # seconds before the first retry, doubling after that
+BACKOFF_MAX = 60 * 60
+STALE_AFTER = timedelta(minutes=15)  # Running this long means the worker died
+
+registry = {}
+
+
+def task(name=None, max_attempts=5):
+    """Register a function as a task and give it an `enqueue` method."""
+    def decorator(func):
+        task_name = name or f"{func.__module__}.{func.__name__}"
+        registry[task_name] = func
+
+        def enqueue(dedup_key=None, delay=0, **payload):
+            return enqueue_task(task_name, payload, dedup_key=dedup_key, delay=delay, max_attempts=max_attempts)
+
+        func.task_name = task_name
+        func.enqueue = enqueue
+        return func
+    return decorator
+
+
+def autodiscover():
+    autodiscover_modules("tasks")
+
+
+def enqueue_task(name, payload, dedup_key=None, delay=0, max_attempts=5):
+    """
+    Queue a task. With a dedup_key, a task that is still waiting under that
+    key absorbs the new one, and the queued row is returned instead.
+    """
+    fields = {
+        "name": name,
+        "payload": payload,
+        "dedup_key": dedup_key,
+        "max_attempts": max_attempts,
+        "run_after": timezone.now() + timedelta(seconds=delay),
+    }
+    if dedup_key is None:
+        return Task.objects.create(**fields)
+
+    try:
+        with transaction.atomic():
+            return Task.objects.create(**fields)
+    except IntegrityError:
+        existing = Task.objects.filter(dedup_key=dedup_key).first()
+        if existing is None:
+            # Claimed between our insert and this lookup; queue a fresh one
+            return enqueue_task(name, payload, dedup_key, delay, max_attempts)
+        return existing
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def requeue_stale():
+    """Give tasks held by a dead worker back to the queue."""
+    return Task.objects.filter(status="Running", locked_at__lt=timezone.now() - STALE_AFTER).update(
+        status="Queued", locked_by=None, locked_at=None
+    )
+
+
+def claim(worker, limit):
+    """
+    Claim up to `limit` due tasks. Each claim is a conditional UPDATE, so two
+    workers racing for the same row can't both win, on any database.
+    """
+    now = timezone.now()
+    candidates = Task.objects.filter(status="Queued", run_after__lte=now).order_by("run_after", "id").values_list("id", flat=True)[: limit * 2]
+
+    claimed = []
+    for pk in candidates:
+        won = Task.objects.filter(pk=pk, status="Queued").update(
+            status="Running", locked_by=worker, locked_at=now, dedup_key=None, attempts=models.F("attempts") + 1,
+        )
+        if won:
+            claimed.append(pk)
+        if len(claimed) == limit:
+            break
+    return list(Task.objects.filter(pk__in=claimed).order_by("run_after", "id"))
+
+
+def run(job):
+    func = registry.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f"Unknown task {job.name!r}")
+        func(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning("Task %s #%s failed (attempt %s/%s)", job.name, job.pk, job.attempts, job.max_attempts)
+        retry = func is not None and job.attempts < job.max_attempts
+        Task.objects.filter(pk=job.pk).update(
+            status="Queued" if retry else "Failed",
+            run_after=timezone.now() + backoff(job.attempts) if retry else job.run_after,
+            finished_at=None if retry else timezone.now(),
+            locked_by=None, locked_at=None, last_error=error,
+        )
+        return False
+
+    Task.objects.filter(pk=job.pk).update(status="Done", finished_at=timezone.now(), locked_by=None, locked_at=None)
+    return True
+
+
+def purge_finished(older_than=timedelta(days=7)):
+    return Task.objects.filter(status="Done", finished_at__lt=timezone.now() - older_than).delete()[0]
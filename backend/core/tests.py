@@ -1,3 +1,175 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core import pubsub
+from core import taskqueue
+from core.management.commands.startup_profile import parse_importtime
+from core.models import PubSubMessage, Task
+
+
+@override_settings(PUBSUB_POLL_INTERVAL=0.05)
+class DatabaseBrokerTests(TransactionTestCase):
+    def setUp(self):
+        self.broker = pubsub.DatabaseBroker()
+        self.addCleanup(self.broker.close)
+
+    async def wait_for_poller(self):
+        while self.broker._last_id is None:
+            await asyncio.sleep(0.01)
+
+    def test_relays_messages_published_by_other_processes(self):
+        async def scenario():
+            subscription = self.broker.subscribe(["user:1"])
+            await self.wait_for_poller()
+            # A separate broker stands in for a worker process
+            other = pubsub.DatabaseBroker()
+            await sync_to_async(other.publish)("user:2", {"event": "notification", "data": {"id": 1}})
+            await sync_to_async(other.publish)("user:1", {"event": "notification", "data": {"id": 2}})
+            return await subscription.get(timeout=5), await subscription.get(timeout=0.2)
+
+        item, nothing = asyncio.run(scenario())
+        self.assertEqual(item, ("user:1", {"event": "notification", "data": {"id": 2}}))
+        self.assertIsNone(nothing)
+
+    def test_starts_from_the_latest_message(self):
+        PubSubMessage.objects.create(channel="user:1", message={"old": True})
+        self.assertEqual(self.broker.poll(), 0)
+        PubSubMessage.objects.create(channel="user:1", message={"old": False})
+        self.assertEqual(self.broker.poll(), 1)
+        self.assertEqual(self.broker.poll(), 0)
+
+    @override_settings(PUBSUB_RETENTION=60)
+    def test_purges_old_messages(self):
+        old = PubSubMessage.objects.create(channel="user:1", message={}, date=timezone.now() - timedelta(seconds=61))
+        recent = PubSubMessage.objects.create(channel="user:1", message={})
+        self.broker.poll()
+        self.broker.poll()
+        self.assertFalse(PubSubMessage.objects.filter(pk=old.pk).exists())
+        self.assertTrue(PubSubMessage.objects.filter(pk=recent.pk).exists())
+
+
+class TaskQueueTests(TransactionTestCase):
+    def setUp(self):
+        self.calls = []
+        self.fail_times = 0
+
+        def record(**payload):
+            if len(self.calls) < self.fail_times:
+                self.calls.append(payload)
+                raise ValueError("boom")
+            self.calls.append(payload)
+
+        self.addCleanup(taskqueue.registry.pop, "tests.record", None)
+        self.record = taskqueue.task(name="tests.record", max_attempts=3)(record)
+
+    def run_due(self):
+        return [taskqueue.run(job) for job in taskqueue.claim("tests", 10)]
+
+    def test_runs_queued_tasks(self):
+        self.record.enqueue(order_id=1)
+        self.record.enqueue(order_id=2, delay=60)
+        self.assertEqual(self.run_due(), [True])
+        self.assertEqual(self.calls, [{"order_id": 1}])
+        self.assertEqual(self.run_due(), [])
+        self.assertEqual(list(Task.objects.order_by("id").values_list("status", flat=True)), ["Done", "Queued"])
+
+    def test_dedup_key_absorbs_waiting_duplicates(self):
+        first = self.record.enqueue(dedup_key="order-1", order_id=1)
+        second = self.record.enqueue(dedup_key="order-1", order_id=1)
+        self.assertEqual(first.pk, second.pk)
+        # Once claimed the key is free again, so later changes are not lost
+        self.assertEqual(self.run_due(), [True])
+        third = self.record.enqueue(dedup_key="order-1", order_id=1)
+        self.assertNotEqual(third.pk, first.pk)
+
+    def test_failures_back_off_then_give_up(self):
+        self.fail_times = 10
+        job = self.record.enqueue(order_id=1)
+        now = timezone.now()
+        with mock.patch("core.taskqueue.random.uniform", return_value=1), self.assertLogs("core.taskqueue", "WARNING"):
+            self.assertEqual(self.run_due(), [False])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("Queued", 1))
+        self.assertAlmostEqual((job.run_after - now).total_seconds(), taskqueue.BACKOFF_BASE, delta=1)
+        self.assertIn("ValueError: boom", job.last_error)
+
+        for _ in range(2):
+            Task.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            with self.assertLogs("core.taskqueue", "WARNING"):
+                self.assertEqual(self.run_due(), [False])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("Failed", 3))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        with mock.patch("core.taskqueue.random.uniform", return_value=1):
+            delays = [taskqueue.backoff(attempts).total_seconds() for attempts in (1, 2, 3, 30)]
+        self.assertEqual(delays, [5, 10, 20, taskqueue.BACKOFF_MAX])
+
+    def test_claims_are_exclusive_and_stale_claims_requeued(self):
+        self.record.enqueue(order_id=1)
+        self.assertEqual(len(taskqueue.claim("worker-a", 10)), 1)
+        self.assertEqual(taskqueue.claim("worker-b", 10), [])
+
+        Task.objects.update(locked_at=timezone.now() - taskqueue.STALE_AFTER - timedelta(seconds=1))
+        self.assertEqual(taskqueue.requeue_stale(), 1)
+        self.assertEqual([job.locked_by for job in taskqueue.claim("worker-b", 10)], ["worker-b"])
+
+    def test_unknown_tasks_fail_without_retrying(self):
+        taskqueue.enqueue_task("tests.missing", {})
+        with self.assertLogs("core.taskqueue", "WARNING"):
+            self.assertEqual(self.run_due(), [False])
+        self.assertEqual(Task.objects.get().status, "Failed")
+
+    def test_runworker_burst(self):
+        self.fail_times = 1
+        self.record.enqueue(order_id=1)
+        self.record.enqueue(order_id=2)
+        out = io.StringIO()
+        with self.assertLogs("core.taskqueue", "WARNING"):
+            call_command("runworker", "--burst", "--threads", "2", stdout=out)
+        self.assertEqual(sorted(Task.objects.values_list("status", flat=True)), ["Done", "Queued"])
+        self.assertIn("tests.record", out.getvalue())
+        self.assertIn("failed", out.getvalue())
+
+
+class StartupProfileTests(SimpleTestCase):
+    def test_parses_importtime_lines(self):
+        stderr = "\n".join([
+            "import time: self [us] | cumulative | imported package",
+            "import time:       120 |        120 |   _io",
+            "import time:       300 |        420 | django",
+            "some other output",
+        ])
+        self.assertEqual(parse_importtime(stderr), [
+            {"module": "_io", "depth": 1, "self_us": 120, "cumulative_us": 120},
+            {"module": "django", "depth": 0, "self_us": 300, "cumulative_us": 420},
+        ])
+
+    def test_reports_setup_as_json(self):
+        out = io.StringIO()
+        call_command("startup_profile", "--json", "--top", "5", stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertGreater(report["setup_seconds"], 0)
+        self.assertGreater(report["module_count"], 0)
+        self.assertLessEqual(len(report["slowest_imports"]), 5)
+
+    def test_setup_does_not_import_media_libraries(self):
+        # A fresh interpreter: this test process may already have them loaded
+        probe = "import sys, django; django.setup(); import api.models; print(sorted(set(sys.modules) & {'moviepy', 'numpy', 'imageio'}))"
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "backend.settings"))
+        result = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, env=env, cwd=settings.BASE_DIR)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "[]")
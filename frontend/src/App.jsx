@@ -28,6 +28,7 @@ import StudentWishList from "./views/student/Wishlist";
 import StudentProfileEdit from "./views/student/Profile";
 import useAxios from "./utils/useAxios";
 import UserData from "./views/plugins/UserData";
+import { fetchCartCount } from "./utils/pagination";
 
 function App() {
 	const [cartCount, setCartCount] = useState(0);
@@ -38,9 +39,7 @@ function App() {
 	}, []);
 
 	useEffect(() => {
-		apiInstance.get(`course/cart-list/${CartId()}/`).then((res) => {
-			setCartCount(res.data?.length);
-		});
+		fetchCartCount(apiInstance, CartId()).then(setCartCount);
 
 		useAxios()
 			.get(`user/profile/${UserData()?.user_id}/`)
@@ -2,6 +2,9 @@ import UserData from "../views/plugins/UserData";
 
 export const API_BASE_URL = `http://127.0.0.1:8000/api/v1/`;
 
+// Push updates need the API served over ASGI (see backend/asgi.py); off by default
+export const REALTIME_EVENTS = import.meta.env.VITE_REALTIME_EVENTS === "true";
+
 export const userId = UserData()?.user_id;
 
 // prettier-ignore
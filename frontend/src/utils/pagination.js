@@ -0,0 +1,28 @@
+// List endpoints return one page at a time ({ results, next }); follow `next`
+// until the last page for screens that need every row.
+export const fetchAllPages = async (client, url) => {
+	const rows = [];
+	let next = url;
+	while (next) {
+		const res = await client.get(next);
+		rows.push(...res.data.results);
+		next = res.data.next;
+	}
+	return rows;
+};
+
+// The cart badge counts rows server-side instead of measuring one page
+export const fetchCartCount = async (client, cartId) => {
+	const res = await client.get(`cart/stats/${cartId}/`);
+	return res.data?.items_count || 0;
+};
+
+// Which of courseIds are in a cart or wishlist, answered by the server for
+// just those courses instead of by loading the whole list
+export const fetchCourseMembership = async (client, url, courseIds) => {
+	if (courseIds.length === 0) return [];
+	const params = new URLSearchParams();
+	courseIds.forEach((id) => params.append("course_id", id));
+	const res = await client.get(`${url}?${params}`);
+	return res.data.course_ids;
+};
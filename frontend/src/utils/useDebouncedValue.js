@@ -0,0 +1,16 @@
+import { useState, useEffect } from "react";
+
+// Follows `value` once it has stopped changing for `delay` ms, so typing in
+// a search box sends one request per pause instead of one per keystroke.
+const useDebouncedValue = (value, delay = 300) => {
+	const [debounced, setDebounced] = useState(value);
+
+	useEffect(() => {
+		const timer = setTimeout(() => setDebounced(value), delay);
+		return () => clearTimeout(timer);
+	}, [value, delay]);
+
+	return debounced;
+};
+
+export default useDebouncedValue;
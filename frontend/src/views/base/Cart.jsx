@@ -23,13 +23,10 @@ export default function ModernCart() {
 
 	const fetchCartData = async () => {
 		try {
-			const cartResponse = await apiInstance.get(
-				`course/cart-list/${CartId()}/`
-			);
-			const statsResponse = await apiInstance.get(`cart/stats/${CartId()}/`);
-			setCart(cartResponse.data);
-			setCartStats(statsResponse.data);
-			setCartCount(cartResponse.data.length);
+			const res = await apiInstance.get(`cart/summary/${CartId()}/`);
+			setCart(res.data.items);
+			setCartStats(res.data.totals);
+			setCartCount(res.data.totals.items_count);
 		} catch (error) {
 			console.error("Error fetching cart data:", error);
 		}
@@ -119,13 +116,13 @@ export default function ModernCart() {
 									{cart.map((course) => (
 										<li key={course.id} className="py-6 flex items-center">
 											<img
-												src={course.course.image}
-												alt={course.course.title}
+												src={course.image}
+												alt={course.title}
 												className="h-20 w-30 rounded-md object-cover"
 											/>
 											<div className="ml-4 flex-1">
 												<h3 className="text-lg font-medium text-gray-900">
-													{course.course.title}
+													{course.title}
 												</h3>
 												<p className="mt-1 text-lg text-indigo-600 font-semibold">
 													₹{course.price}
@@ -156,18 +153,18 @@ export default function ModernCart() {
 								<div className="flex justify-between">
 									<span className="text-gray-600">Subtotal</span>
 									<span className="font-medium">
-										₹{cartStats.price?.toFixed(2)}
+										₹{cartStats.price}
 									</span>
 								</div>
 								<div className="flex justify-between">
 									<span className="text-gray-600">Tax</span>
 									<span className="font-medium">
-										₹{cartStats.tax?.toFixed(2)}
+										₹{cartStats.tax}
 									</span>
 								</div>
 								<div className="flex justify-between text-lg font-bold">
 									<span>Total</span>
-									<span>₹{cartStats.total?.toFixed(2)}</span>
+									<span>₹{cartStats.total}</span>
 								</div>
 							</div>
 
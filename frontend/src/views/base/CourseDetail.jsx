@@ -28,6 +28,7 @@ import UserData from "../plugins/UserData";
 import Toast from "../plugins/Toast";
 import { CartContext } from "../plugins/Context";
 import apiInstance from "../../utils/axios";
+import { fetchCartCount, fetchCourseMembership } from "../../utils/pagination";
 
 const StarRating = ({ rating }) => (
 	<div className="flex items-center">
@@ -78,10 +79,14 @@ export default function CourseDetail() {
 		}
 	};
 
+	// Membership of this one course is checked on the server rather than by
+	// loading the whole wishlist and cart
 	const fetchWishlist = async () => {
+		if (!userId) return;
 		try {
-			const res = await useAxios().get(`student/wishlist/${userId}/`);
-			setWishlist(res.data.map((item) => item.course.id));
+			setWishlist(
+				await fetchCourseMembership(useAxios(), `student/wishlist-contains/${userId}/`, [course.id])
+			);
 		} catch (error) {
 			console.error("Error fetching wishlist:", error);
 		}
@@ -89,9 +94,9 @@ export default function CourseDetail() {
 
 	const fetchCart = async () => {
 		try {
-			const res = await apiInstance.get(`course/cart-list/${CartId()}/`);
-			setIsInCart(res.data.some((item) => item.course.id === course?.id));
-			setCartCount(res.data.length);
+			const inCart = await fetchCourseMembership(apiInstance, `cart/contains/${CartId()}/`, [course.id]);
+			setIsInCart(inCart.includes(course.id));
+			setCartCount(await fetchCartCount(apiInstance, CartId()));
 		} catch (error) {
 			console.error("Error fetching cart:", error);
 		}
@@ -99,11 +104,11 @@ export default function CourseDetail() {
 
 	useEffect(() => {
 		fetchCourses();
-		fetchWishlist();
 	}, []);
 
 	useEffect(() => {
 		if (course) {
+			fetchWishlist();
 			fetchCart();
 		}
 	}, [course]);
@@ -123,8 +128,7 @@ export default function CourseDetail() {
 			setIsInCart(true);
 			Toast().fire({ icon: "success", title: "Added to Cart" });
 
-			const res = await apiInstance.get(`course/cart-list/${CartId()}/`);
-			setCartCount(res.data?.length);
+			setCartCount(await fetchCartCount(apiInstance, CartId()));
 		} catch (error) {
 			console.error(error);
 			setAddToCartBtn("Add to Cart");
@@ -139,8 +143,12 @@ export default function CourseDetail() {
 		formdata.append("user_id", userId);
 
 		try {
-			await useAxios().post(`student/wishlist/${userId}/`, formdata);
-			fetchWishlist();
+			const res = await useAxios().post(`student/wishlist/${userId}/`, formdata);
+			setWishlist((prev) =>
+				res.status === 201
+					? [...prev, courseId]
+					: prev.filter((id) => id !== courseId)
+			);
 			Toast().fire({ icon: "success", title: "Wishlist updated" });
 		} catch (error) {
 			console.error("Error updating wishlist:", error);
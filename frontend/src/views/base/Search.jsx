@@ -1,11 +1,9 @@
-import { useState, useEffect, useContext } from "react";
+import { useState, useEffect, useContext, useRef } from "react";
 
 import {
 	Star,
 	ShoppingCart,
 	ArrowRight,
-	ChevronLeft,
-	ChevronRight,
 	Users,
 } from "lucide-react";
 import { Link } from "react-router-dom";
@@ -17,6 +15,10 @@ import Toast from "../plugins/Toast";
 import apiInstance from "../../utils/axios";
 import { CartContext } from "../plugins/Context";
 import useAxios from "../../utils/useAxios";
+import useDebouncedValue from "../../utils/useDebouncedValue";
+import { fetchCartCount } from "../../utils/pagination";
+
+const PAGE_SIZE = 8;
 
 const CourseSkeleton = () => (
 	<div className="bg-white rounded-lg shadow-md overflow-hidden animate-pulse">
@@ -43,11 +45,29 @@ export default function Search() {
 	const userId = UserData()?.user_id;
 	const cartId = CartId();
 
-	const fetchCourse = async () => {
+	const [searchQuery, setsearchQuery] = useState("");
+	const [nextPage, setNextPage] = useState(null);
+	const [isLoadingMore, setIsLoadingMore] = useState(false);
+	const [suggestions, setSuggestions] = useState([]);
+
+	// One request per pause in typing, not one per keystroke
+	const debouncedQuery = useDebouncedValue(searchQuery.trim());
+	const latestRequest = useRef(0);
+	const pickedSuggestion = useRef(null);
+
+	const fetchCourse = async (query = "") => {
+		const request = ++latestRequest.current;
 		setIsLoading(true);
 		try {
-			const res = await useAxios().get(`/course/course-list/`);
-			setCourses(res.data);
+			// Searched on the server; only the first page is loaded up front
+			const url = query
+				? `course/search?query=${encodeURIComponent(query)}&limit=${PAGE_SIZE}`
+				: `course/course-list/?page_size=${PAGE_SIZE}`;
+			const res = await useAxios().get(url);
+			// Typing fires overlapping requests; only the latest one may land
+			if (request !== latestRequest.current) return;
+			setCourses(res.data.results);
+			setNextPage(res.data.next);
 			setIsLoading(false);
 		} catch (error) {
 			console.log(error);
@@ -55,9 +75,40 @@ export default function Search() {
 		}
 	};
 
+	const loadMore = async () => {
+		const request = latestRequest.current;
+		setIsLoadingMore(true);
+		try {
+			const res = await useAxios().get(nextPage);
+			if (request !== latestRequest.current) return;
+			setCourses((prev) => [...prev, ...res.data.results]);
+			setNextPage(res.data.next);
+		} catch (error) {
+			console.log(error);
+		} finally {
+			setIsLoadingMore(false);
+		}
+	};
+
+	const fetchSuggestions = async (query) => {
+		const request = latestRequest.current;
+		try {
+			const res = await apiInstance.get(`course/suggest?query=${encodeURIComponent(query)}`);
+			if (request !== latestRequest.current) return;
+			setSuggestions(res.data);
+		} catch (error) {
+			console.log(error);
+		}
+	};
+
 	useEffect(() => {
-		fetchCourse();
-	}, []);
+		fetchCourse(debouncedQuery);
+		if (debouncedQuery && debouncedQuery !== pickedSuggestion.current) {
+			fetchSuggestions(debouncedQuery);
+		} else {
+			setSuggestions([]);
+		}
+	}, [debouncedQuery]);
 
 	const addToCart = async (courseId, userId, price, country, cartId) => {
 		const formdata = new FormData();
@@ -76,29 +127,22 @@ export default function Search() {
 				});
 
 			// set cart count after adding to cart
-			apiInstance.get(`course/cart-list/${CartId()}/`).then((res) => {
-				setCartCount(res.data?.length);
-			});
+			fetchCartCount(apiInstance, CartId()).then(setCartCount);
 		} catch (error) {
 			console.log(error);
 		}
 	};
 
 	// search Feature
-	const [searchQuery, setsearchQuery] = useState("");
-
 	const handleSearch = (e) => {
-		const query = e.target.value.toLowerCase();
-		setsearchQuery(query);
+		setsearchQuery(e.target.value.toLowerCase());
+	};
 
-		if (query === "") {
-			fetchCourse();
-		} else {
-			const course = courses.filter((course) => {
-				return course.title.toLowerCase().includes(query);
-			});
-			setCourses(course);
-		}
+	const pickSuggestion = (suggestion) => {
+		// Search for the picked label without offering it again
+		pickedSuggestion.current = suggestion.label.toLowerCase();
+		setsearchQuery(pickedSuggestion.current);
+		setSuggestions([]);
 	};
 
 	return (
@@ -109,13 +153,41 @@ export default function Search() {
 						<h1 className="text-xl font-bold mb-4">
 							Showing Results: for &quot;{searchQuery || " "}&quot;
 						</h1>
-						<div className="max-w-md">
+						<div className="max-w-md relative">
 							<input
 								type="text"
 								className="w-full px-3 py-[6px] border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-indigo-500"
 								placeholder="Search Courses..."
+								value={searchQuery}
 								onChange={handleSearch}
 							/>
+							{suggestions.length > 0 && (
+								<ul className="absolute z-10 mt-1 w-full bg-white border border-gray-200 rounded-md shadow-lg">
+									{suggestions.map((suggestion) => (
+										<li key={`${suggestion.type}-${suggestion.slug || suggestion.id}`}>
+											{suggestion.type === "course" ? (
+												<Link
+													to={`/course-detail/${suggestion.slug}/`}
+													className="block px-3 py-2 text-sm hover:bg-indigo-50"
+												>
+													{suggestion.label}
+												</Link>
+											) : (
+												<button
+													type="button"
+													onClick={() => pickSuggestion(suggestion)}
+													className="w-full text-left px-3 py-2 text-sm hover:bg-indigo-50"
+												>
+													{suggestion.label}
+													<span className="ml-2 text-xs text-gray-500">
+														{suggestion.type}
+													</span>
+												</button>
+											)}
+										</li>
+									))}
+								</ul>
+							)}
 						</div>
 					</section>
 
@@ -127,9 +199,9 @@ export default function Search() {
 						</div>
 					) : (
 						<div className="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-4 gap-6">
-							{courses?.slice(0, 8).map((course, index) => (
+							{courses.map((course) => (
 								<div
-									key={index}
+									key={course.id}
 									className="bg-white rounded-lg shadow-md overflow-hidden hover:shadow-xl transition-all duration-300 ease-in-out flex flex-col"
 								>
 									<Link
@@ -157,9 +229,9 @@ export default function Search() {
 											</h3>
 											<p className="text-sm text-gray-600 mb-4 flex items-center">
 												<Users size={16} className="mr-2" />
-												By {course.teacher.full_name} •{" "}
-												{course.students?.length} Student
-												{course.students?.length !== 1 && "s"}
+												By {course.teacher_name} •{" "}
+												{course.enrollment_count} Student
+												{course.enrollment_count !== 1 && "s"}
 											</p>
 											<div className="flex items-center mb-4">
 												<div className="flex items-center mr-2">
@@ -177,7 +249,7 @@ export default function Search() {
 												</div>
 												<span className="text-sm text-gray-600">
 													{course.average_rating?.toFixed(1)} (
-													{course.reviews?.length} reviews)
+													{course.rating_count} reviews)
 												</span>
 											</div>
 										</div>
@@ -209,17 +281,17 @@ export default function Search() {
 						</div>
 					)}
 
-					<nav className="flex justify-center space-x-2">
-						<button className="px-4 py-2 border border-gray-300 rounded-md hover:bg-gray-100 flex items-center">
-							<ChevronLeft className="h-4 w-4 mr-1" /> Previous
-						</button>
-						<button className="px-4 py-2 bg-indigo-600 text-white rounded-md">
-							1
-						</button>
-						<button className="px-4 py-2 border border-gray-300 rounded-md hover:bg-gray-100 flex items-center">
-							Next <ChevronRight className="h-4 w-4 ml-1" />
-						</button>
-					</nav>
+					{!isLoading && nextPage && (
+						<nav className="flex justify-center">
+							<button
+								onClick={loadMore}
+								disabled={isLoadingMore}
+								className="px-4 py-2 border border-gray-300 rounded-md hover:bg-gray-100 disabled:opacity-50"
+							>
+								{isLoadingMore ? "Loading..." : "Load more"}
+							</button>
+						</nav>
+					)}
 
 					<section className="bg-indigo-600 rounded-lg overflow-hidden">
 						<div className="max-w-6xl mx-auto px-4 py-12 sm:px-6 lg:px-8 lg:py-16 flex items-center">
@@ -8,6 +8,7 @@ import "react-loading-skeleton/dist/skeleton.css";
 
 import VideoPlayer from "./Partials/VideoPlayer";
 import useAxios from "../../utils/useAxios";
+import { API_BASE_URL, REALTIME_EVENTS } from "../../utils/constants";
 import UserData from "../plugins/UserData";
 import Toast from "../plugins/Toast";
 
@@ -626,6 +627,40 @@ const CourseDetail = () => {
 		fetchCourseDetail();
 	}, [fetchCourseDetail]);
 
+	// Q&A deltas pushed by the server, instead of reloading the whole course
+	useEffect(() => {
+		const courseId = course.course?.id;
+		if (!courseId || !REALTIME_EVENTS || !window.EventSource) return;
+
+		const appendMessage = (question, message) => {
+			const messages = question.messages || [];
+			if (messages.some((m) => m.id === message.id)) return question;
+			return { ...question, messages: [...messages, message] };
+		};
+
+		const source = new EventSource(`${API_BASE_URL}stream/?course_id=${courseId}`);
+		source.addEventListener("qa.question", (event) => {
+			const question = JSON.parse(event.data);
+			setQuestions((prev) =>
+				prev?.some((q) => q.qa_id === question.qa_id)
+					? prev
+					: [question, ...(prev || [])]
+			);
+		});
+		source.addEventListener("qa.message", (event) => {
+			const { qa_id, message } = JSON.parse(event.data);
+			setQuestions((prev) =>
+				prev?.map((q) => (q.qa_id === qa_id ? appendMessage(q, message) : q))
+			);
+			setSelectedConversation((prev) =>
+				prev?.qa_id === qa_id ? appendMessage(prev, message) : prev
+			);
+		});
+		// Deltas were dropped on the server side
+		source.addEventListener("reset", () => fetchCourseDetail());
+		return () => source.close();
+	}, [course.course?.id, fetchCourseDetail]);
+
 	const handleMarkLessonAsCompleted = useCallback(
 		async (variantItemId) => {
 			const key = `lecture_${variantItemId}`;
@@ -813,10 +848,15 @@ const CourseDetail = () => {
 					formdata
 				);
 				setSelectedConversation(res.data.question);
-				console.log(res.data.question);
+				setQuestions((prev) =>
+					prev?.map((q) =>
+						q.qa_id === res.data.question.qa_id ? res.data.question : q
+					)
+				);
 
 				setCreateMessage({ title: "", message: "" });
-				fetchCourseDetail();
+				// Without the event stream, other people's replies only show up on a reload
+				if (!REALTIME_EVENTS) fetchCourseDetail();
 			} catch (error) {
 				console.error("Error sending message:", error);
 				Toast().fire({
@@ -9,6 +9,7 @@ import "react-loading-skeleton/dist/skeleton.css";
 import UserData from "../plugins/UserData";
 import useAxios from "../../utils/useAxios";
 import { ProfileContext } from "../plugins/Context";
+import { fetchAllPages } from "../../utils/pagination";
 
 export default function Dashboard() {
 	const [courses, setCourses] = useState([]);
@@ -28,13 +29,12 @@ export default function Dashboard() {
 				console.log(stats);
 			});
 
-		useAxios()
-			.get(`student/course-list/${UserData()?.user_id}/`)
-			.then((res) => {
-				console.log(res.data);
-				setCourses(res.data);
+		fetchAllPages(useAxios(), `student/course-list/${UserData()?.user_id}/`).then(
+			(rows) => {
+				setCourses(rows);
 				setFetching(false);
-			});
+			}
+		);
 	};
 
 	useEffect(() => {
@@ -229,29 +229,23 @@ export default function Dashboard() {
 											{moment(c.date).format("DD MMM YYYY")}
 										</td>
 										<td className="px-6 py-4 whitespace-nowrap text-center text-sm text-gray-500 dark:text-gray-400">
-											{c.lectures?.length}
+											{c.lecture_count}
 										</td>
 										<td className="px-6 py-4 text-center whitespace-nowrap text-sm text-gray-500 dark:text-gray-400">
-											{c.completed_lesson?.length}
+											{c.completed_lessons}
 										</td>
 										<td className="px-6 py-4 whitespace-nowrap">
 											<div className="w-full bg-gray-200 rounded-full h-2.5 dark:bg-gray-700">
 												<div
 													className="bg-purple-600 h-2.5 rounded-full dark:bg-purple-500"
 													style={{
-														width: `${
-															c.lectures?.length > 0
-																? (c.completed_lesson?.length /
-																		c.lectures?.length) *
-																	100
-																: 0
-														}%`,
+														width: `${c.progress}%`,
 													}}
 												></div>
 											</div>
 										</td>
 										<td className="px-6 py-4 whitespace-nowrap text-left text-sm font-medium">
-											{c.completed_lesson?.length < 1 && (
+											{c.completed_lessons < 1 && (
 												<Link
 													to={`/student/courses/${c.enrollment_id}/`}
 													className="text-purple-600 hover:text-purple-900 dark:text-purple-400 dark:hover:text-purple-300"
@@ -259,7 +253,7 @@ export default function Dashboard() {
 													Start
 												</Link>
 											)}
-											{c.completed_lesson?.length > 0 && (
+											{c.completed_lessons > 0 && (
 												<Link
 													to={`/student/courses/${c.enrollment_id}/`}
 													className="text-purple-600 hover:text-purple-900 dark:text-purple-400 dark:hover:text-purple-300"
@@ -1,58 +1,130 @@
-import { useState, useEffect, useContext } from "react";
+import { useState, useEffect, useContext, useRef } from "react";
 
 import { Link } from "react-router-dom";
 
 import useAxios from "../../utils/useAxios";
+import useDebouncedValue from "../../utils/useDebouncedValue";
 import { CartContext } from "../plugins/Context";
 import CartId from "../plugins/CartId";
 import GetCurrentAddress from "../plugins/UserCountry";
 import UserData from "../plugins/UserData";
 import Toast from "../plugins/Toast";
 import apiInstance from "../../utils/axios";
+import { fetchCartCount, fetchCourseMembership } from "../../utils/pagination";
+
+const PAGE_SIZE = 8;
+const LEVELS = ["Beginner", "Intermediate", "Advanced"];
+const LANGUAGES = ["English", "Spanish", "French"];
 
 export default function DiscoverPage() {
 	const [courses, setCourses] = useState([]);
+	const [nextPage, setNextPage] = useState(null);
+	const [facets, setFacets] = useState({});
+	const [categories, setCategories] = useState([]);
 	const [wishlist, setWishlist] = useState([]);
 	const [isLoading, setIsLoading] = useState(true);
+	const [isLoadingMore, setIsLoadingMore] = useState(false);
 	const [searchQuery, setSearchQuery] = useState("");
 	const [selectedLevel, setSelectedLevel] = useState("All");
 	const [selectedLanguage, setSelectedLanguage] = useState("All");
+	const [selectedCategory, setSelectedCategory] = useState("All");
 	const [cartCount, setCartCount] = useContext(CartContext);
 
 	const country = GetCurrentAddress().country;
 	const userId = UserData()?.user_id;
 	const cartId = CartId();
 
-	// Pagination state
-	const itemsPerPage = 4;
-	const [currentPage, setCurrentPage] = useState(1);
+	const debouncedQuery = useDebouncedValue(searchQuery.trim());
+	const latestRequest = useRef(0);
+
+	// Search, filters and facets all run on the server; the page only holds
+	// the rows loaded so far and the cursor for the next ones.
+	const catalogUrl = () => {
+		const params = new URLSearchParams({ page_size: PAGE_SIZE });
+		if (debouncedQuery) params.set("query", debouncedQuery);
+		if (selectedLevel !== "All") params.set("level", selectedLevel);
+		if (selectedLanguage !== "All") params.set("language", selectedLanguage);
+		if (selectedCategory !== "All") params.set("category", selectedCategory);
+		return `course/course-list/?${params}`;
+	};
 
 	const fetchCourse = async () => {
+		const request = ++latestRequest.current;
 		setIsLoading(true);
 		try {
-			const res = await useAxios().get(`/course/course-list/`);
-			setCourses(res.data);
+			const res = await useAxios().get(catalogUrl());
+			// Filters change while a request is in flight; only the latest may land
+			if (request !== latestRequest.current) return;
+			setCourses(res.data.results);
+			setNextPage(res.data.next);
+			setFacets(res.data.facets || {});
 			setIsLoading(false);
+			const wishlisted = await fetchWishlisted(res.data.results);
+			if (request === latestRequest.current) setWishlist(wishlisted);
 		} catch (error) {
 			console.log(error);
 			setIsLoading(false);
 		}
 	};
 
-	const fetchWishlist = async () => {
+	const loadMore = async () => {
+		const request = latestRequest.current;
+		setIsLoadingMore(true);
+		try {
+			const res = await useAxios().get(nextPage);
+			if (request !== latestRequest.current) return;
+			setCourses((prev) => [...prev, ...res.data.results]);
+			setNextPage(res.data.next);
+			const wishlisted = await fetchWishlisted(res.data.results);
+			if (request === latestRequest.current) {
+				setWishlist((prev) => [...prev, ...wishlisted]);
+			}
+		} catch (error) {
+			console.log(error);
+		} finally {
+			setIsLoadingMore(false);
+		}
+	};
+
+	const fetchCategories = async () => {
 		try {
-			const res = await useAxios().get(`student/wishlist/${userId}/`);
-			setWishlist(res.data.map((item) => item.course.id));
+			const res = await apiInstance.get(`course/category/`);
+			setCategories(res.data);
+		} catch (error) {
+			console.log(error);
+		}
+	};
+
+	// Only the courses on screen are checked against the wishlist
+	const fetchWishlisted = async (rows) => {
+		if (!userId) return [];
+		try {
+			return await fetchCourseMembership(
+				useAxios(),
+				`student/wishlist-contains/${userId}/`,
+				rows.map((course) => course.id)
+			);
 		} catch (error) {
 			console.error("Error fetching wishlist:", error);
+			return [];
 		}
 	};
 
 	useEffect(() => {
-		fetchCourse();
-		fetchWishlist();
+		fetchCategories();
 	}, []);
 
+	useEffect(() => {
+		fetchCourse();
+	}, [debouncedQuery, selectedLevel, selectedLanguage, selectedCategory]);
+
+	// Facet counts describe the current result set, so a facet only shows
+	// counts while it isn't itself narrowing the results
+	const facetLabel = (facet, selected, value, label = value) => {
+		const count = facets[facet]?.[value] || 0;
+		return selected === "All" ? `${label} (${count})` : label;
+	};
+
 	const addToCart = async (courseId, userId, price, country, cartId, event) => {
 		event.preventDefault();
 		event.stopPropagation();
@@ -66,8 +138,7 @@ export default function DiscoverPage() {
 		try {
 			await useAxios().post(`course/cart/`, formdata);
 			Toast().fire({ icon: "success", title: "Added to Cart" });
-			const res = await apiInstance.get(`course/cart-list/${CartId()}/`);
-			setCartCount(res.data?.length);
+			setCartCount(await fetchCartCount(apiInstance, CartId()));
 		} catch (error) {
 			console.log(error);
 		}
@@ -81,36 +152,18 @@ export default function DiscoverPage() {
 		formdata.append("user_id", userId);
 
 		try {
-			await useAxios().post(`student/wishlist/${userId}/`, formdata);
-			fetchWishlist();
+			const res = await useAxios().post(`student/wishlist/${userId}/`, formdata);
+			setWishlist((prev) =>
+				res.status === 201
+					? [...prev, courseId]
+					: prev.filter((id) => id !== courseId)
+			);
 			Toast().fire({ icon: "success", title: "Wishlist updated" });
 		} catch (error) {
 			console.error("Error updating wishlist:", error);
 		}
 	};
 
-	// Filter courses based on search, level, and language
-	const filteredCourses = courses.filter((course) => {
-		const matchesSearch = course.title
-			.toLowerCase()
-			.includes(searchQuery.toLowerCase());
-		const matchesLevel =
-			selectedLevel === "All" || course.level === selectedLevel;
-		const matchesLanguage =
-			selectedLanguage === "All" || course.language === selectedLanguage;
-		return matchesSearch && matchesLevel && matchesLanguage;
-	});
-
-	// Calculate pagination
-	const indexOfLastItem = currentPage * itemsPerPage;
-	const indexOfFirstItem = indexOfLastItem - itemsPerPage;
-	const currentItems = filteredCourses.slice(indexOfFirstItem, indexOfLastItem);
-	const totalPages = Math.ceil(filteredCourses.length / itemsPerPage);
-	const PageNumbers = Array.from(
-		{ length: totalPages },
-		(_, index) => index + 1
-	);
-
 	// Loading skeleton component
 	const CourseSkeleton = () => (
 		<div className="bg-white rounded-lg shadow-md p-4 animate-pulse">
@@ -158,15 +211,29 @@ export default function DiscoverPage() {
 						</svg>
 					</div>
 					<div className="flex gap-4">
+						<select
+							value={selectedCategory}
+							onChange={(e) => setSelectedCategory(e.target.value)}
+							className="px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-transparent"
+						>
+							<option value="All">All Categories</option>
+							{categories.map((category) => (
+								<option key={category.slug} value={category.slug}>
+									{facetLabel("category", selectedCategory, category.slug, category.title)}
+								</option>
+							))}
+						</select>
 						<select
 							value={selectedLevel}
 							onChange={(e) => setSelectedLevel(e.target.value)}
 							className="px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-transparent"
 						>
 							<option value="All">All Levels</option>
-							<option value="Beginner">Beginner</option>
-							<option value="Intermediate">Intermediate</option>
-							<option value="Advanced">Advanced</option>
+							{LEVELS.map((level) => (
+								<option key={level} value={level}>
+									{facetLabel("level", selectedLevel, level)}
+								</option>
+							))}
 						</select>
 						<select
 							value={selectedLanguage}
@@ -174,8 +241,11 @@ export default function DiscoverPage() {
 							className="px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-transparent"
 						>
 							<option value="All">All Languages</option>
-							<option value="English">English</option>
-							<option value="Spanish">Spanish</option>
+							{LANGUAGES.map((language) => (
+								<option key={language} value={language}>
+									{facetLabel("language", selectedLanguage, language)}
+								</option>
+							))}
 						</select>
 					</div>
 				</div>
@@ -189,9 +259,9 @@ export default function DiscoverPage() {
 					</div>
 				) : (
 					<div className="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-4 gap-6">
-						{currentItems.map((course, index) => (
+						{courses.map((course, index) => (
 							<div
-								key={index}
+								key={course.id}
 								className="bg-white rounded-lg shadow-md overflow-hidden hover:shadow-xl transition-all duration-300 ease-in-out flex flex-col"
 							>
 								<Link
@@ -263,7 +333,7 @@ export default function DiscoverPage() {
 											>
 												<path d="M9 4.804A7.968 7.968 0 005.5 4c-1.255 0-2.443.29-3.5.804v10A7.969 7.969 0 015.5 14c1.669 0 3.218.51 4.5 1.385A7.962 7.962 0 0114.5 14c1.255 0 2.443.29 3.5.804v-10A7.968 7.968 0 0014.5 4c-1.255 0-2.443.29-3.5.804V12a1 1 0 11-2 0V4.804z" />
 											</svg>
-											<span>{course.lessons_count || "24"} lessons</span>
+											<span>{course.lecture_count || "24"} lessons</span>
 										</div>
 										<div className="mt-auto flex items-center justify-between">
 											<div className="flex items-center">
@@ -283,7 +353,7 @@ export default function DiscoverPage() {
 													</svg>
 												))}
 												<span className="ml-2 text-sm text-gray-600">
-													({course.reviews?.length || 0})
+													({course.rating_count || 0})
 												</span>
 											</div>
 											<div className="flex items-center text-sm text-gray-600">
@@ -296,7 +366,7 @@ export default function DiscoverPage() {
 												>
 													<path d="M13 6a3 3 0 11-6 0 3 3 0 016 0zM18 8a2 2 0 11-4 0 2 2 0 014 0zM14 15a4 4 0 00-8 0v3h8v-3zM6 8a2 2 0 11-4 0 2 2 0 014 0zM16 18v-3a5.972 5.972 0 00-.75-2.906A3.005 3.005 0 0119 15v3h-3zM4.75 12.094A5.973 5.973 0 004 15v3H1v-3a3 3 0 013.75-2.906z" />
 												</svg>
-												{course.students?.length || 0}
+												{course.enrollment_count || 0}
 											</div>
 										</div>
 										<button
@@ -330,60 +400,19 @@ export default function DiscoverPage() {
 				)}
 
 				{/* Pagination */}
-				{!isLoading && totalPages > 1 && (
-					<div className="mt-4 flex justify-center gap-2">
-						<button
-							onClick={() => setCurrentPage((prev) => Math.max(prev - 1, 1))}
-							disabled={currentPage === 1}
-							className="flex items-center px-4 py-2 text-sm font-medium text-gray-700 bg-white border border-gray-300 rounded-md hover:bg-gray-50 disabled:opacity-50 disabled:cursor-not-allowed"
-						>
-							<svg
-								xmlns="http://www.w3.org/2000/svg"
-								className="h-4 w-4 mr-1"
-								viewBox="0 0 20 20"
-								fill="currentColor"
-							>
-								<path
-									fillRule="evenodd"
-									d="M12.707 5.293a1 1 0 010 1.414L9.414 10l3.293 3.293a1 1 0 01-1.414 1.414l-4-4a1 1 0 010-1.414l4-4a1 1 0 011.414 0z"
-									clipRule="evenodd"
-								/>
-							</svg>
-							Previous
-						</button>
-						{PageNumbers.map((number) => (
-							<button
-								key={number}
-								onClick={() => setCurrentPage(number)}
-								className={`px-4 py-2 text-sm font-medium rounded-md ${
-									currentPage === number
-										? "bg-blue-600 text-white"
-										: "text-gray-700 bg-white border border-gray-300 hover:bg-gray-50"
-								}`}
-							>
-								{number}
-							</button>
-						))}
+				{!isLoading && courses.length === 0 && (
+					<p className="mt-8 text-center text-gray-600">
+						No courses match these filters.
+					</p>
+				)}
+				{!isLoading && nextPage && (
+					<div className="mt-6 flex justify-center">
 						<button
-							onClick={() =>
-								setCurrentPage((prev) => Math.min(prev + 1, totalPages))
-							}
-							disabled={currentPage === totalPages}
-							className="flex items-center px-4 py-2 text-sm font-medium text-gray-700 bg-white border border-gray-300 rounded-md hover:bg-gray-50 disabled:opacity-50 disabled:cursor-not-allowed"
+							onClick={loadMore}
+							disabled={isLoadingMore}
+							className="px-6 py-2 text-sm font-medium text-gray-700 bg-white border border-gray-300 rounded-md hover:bg-gray-50 disabled:opacity-50 disabled:cursor-not-allowed"
 						>
-							Next
-							<svg
-								xmlns="http://www.w3.org/2000/svg"
-								className="h-4 w-4 ml-1"
-								viewBox="0 0 20 20"
-								fill="currentColor"
-							>
-								<path
-									fillRule="evenodd"
-									d="M7.293 14.707a1 1 0 010-1.414L10.586 10 7.293 6.707a1 1 0 011.414-1.414l4 4a1 1 0 010 1.414l-4 4a1 1 0 01-1.414 0z"
-									clipRule="evenodd"
-								/>
-							</svg>
+							{isLoadingMore ? "Loading..." : "Load more"}
 						</button>
 					</div>
 				)}
@@ -8,9 +8,12 @@ import { CartContext } from "../plugins/Context";
 import GetCurrentAddress from "../plugins/UserCountry";
 import CartId from "../plugins/CartId";
 import apiInstance from "../../utils/axios";
+import { fetchCartCount } from "../../utils/pagination";
 
 export default function WishlistPage() {
 	const [wishlistItems, setWishlistItems] = useState([]);
+	const [nextPage, setNextPage] = useState(null);
+	const [isLoadingMore, setIsLoadingMore] = useState(false);
 	const [isLoading, setIsLoading] = useState(true);
 	const [cartCount, setCartCount] = useContext(CartContext);
 
@@ -22,7 +25,8 @@ export default function WishlistPage() {
 		setIsLoading(true);
 		try {
 			const res = await useAxios().get(`student/wishlist/${userId}/`);
-			setWishlistItems(res.data);
+			setWishlistItems(res.data.results);
+			setNextPage(res.data.next);
 			setIsLoading(false);
 		} catch (error) {
 			console.error("Error fetching wishlist:", error);
@@ -30,6 +34,19 @@ export default function WishlistPage() {
 		}
 	};
 
+	const loadMore = async () => {
+		setIsLoadingMore(true);
+		try {
+			const res = await useAxios().get(nextPage);
+			setWishlistItems((prev) => [...prev, ...res.data.results]);
+			setNextPage(res.data.next);
+		} catch (error) {
+			console.error("Error fetching wishlist:", error);
+		} finally {
+			setIsLoadingMore(false);
+		}
+	};
+
 	useEffect(() => {
 		fetchWishlist();
 	}, []);
@@ -43,7 +60,8 @@ export default function WishlistPage() {
 
 		try {
 			await useAxios().post(`student/wishlist/${userId}/`, formdata);
-			fetchWishlist();
+			// Toggling from this page always removes; drop the card rather than reload every page
+			setWishlistItems((prev) => prev.filter((item) => item.course.id !== courseId));
 			showToast("Wishlist updated", "success");
 		} catch (error) {
 			console.error("Error updating wishlist:", error);
@@ -64,8 +82,7 @@ export default function WishlistPage() {
 		try {
 			await useAxios().post(`course/cart/`, formdata);
 			showToast("Added to Cart", "success");
-			const res = await apiInstance.get(`course/cart-list/${cartId}/`);
-			setCartCount(res.data?.length);
+			setCartCount(await fetchCartCount(apiInstance, cartId));
 		} catch (error) {
 			console.error("Error adding to cart:", error);
 			showToast("Failed to add to cart", "error");
@@ -201,7 +218,7 @@ export default function WishlistPage() {
 											>
 												<path d="M9 4.804A7.968 7.968 0 005.5 4c-1.255 0-2.443.29-3.5.804v10A7.969 7.969 0 015.5 14c1.669 0 3.218.51 4.5 1.385A7.962 7.962 0 0114.5 14c1.255 0 2.443.29 3.5.804v-10A7.968 7.968 0 0014.5 4c-1.255 0-2.443.29-3.5.804V12a1 1 0 11-2 0V4.804z" />
 											</svg>
-											<span>{course.course.lessons_count || "24"} lessons</span>
+											<span>{course.course.lecture_count || "24"} lessons</span>
 										</div>
 										<div className="mt-auto flex items-center justify-between">
 											<div className="flex items-center">
@@ -210,7 +227,7 @@ export default function WishlistPage() {
 														key={star}
 														xmlns="http://www.w3.org/2000/svg"
 														className={`h-4 w-4 ${
-															star <= Math.round(course.average_rating)
+															star <= Math.round(course.course.average_rating)
 																? "text-yellow-400"
 																: "text-gray-300"
 														}`}
@@ -221,7 +238,7 @@ export default function WishlistPage() {
 													</svg>
 												))}
 												<span className="ml-2 text-sm text-gray-600">
-													({course.course.reviews?.length || 0})
+													({course.course.rating_count || 0})
 												</span>
 											</div>
 											<div className="flex items-center text-sm text-gray-600">
@@ -233,7 +250,7 @@ export default function WishlistPage() {
 												>
 													<path d="M13 6a3 3 0 11-6 0 3 3 0 016 0zM18 8a2 2 0 11-4 0 2 2 0 014 0zM14 15a4 4 0 00-8 0v3h8v-3zM6 8a2 2 0 11-4 0 2 2 0 014 0zM16 18v-3a5.972 5.972 0 00-.75-2.906A3.005 3.005 0 0119 15v3h-3zM4.75 12.094A5.973 5.973 0 004 15v3H1v-3a3 3 0 013.75-2.906z" />
 												</svg>
-												{course.course.students?.length || 0}
+												{course.course.enrollment_count || 0}
 											</div>
 										</div>
 										<button
@@ -265,6 +282,18 @@ export default function WishlistPage() {
 						))}
 					</div>
 				)}
+
+				{!isLoading && nextPage && (
+					<div className="mt-6 flex justify-center">
+						<button
+							onClick={loadMore}
+							disabled={isLoadingMore}
+							className="px-6 py-2 text-sm font-medium text-gray-700 bg-white border border-gray-300 rounded-md hover:bg-gray-50 disabled:opacity-50 disabled:cursor-not-allowed"
+						>
+							{isLoadingMore ? "Loading..." : "Load more"}
+						</button>
+					</div>
+				)}
 			</div>
 		</main>
 	);